@@ -5,11 +5,16 @@ GPU集群资源管理系统
 """
 
 import abc
+import bisect
+import heapq
 import json
 import logging
 import os
+import platform
+import threading
 import time
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Dict, List, Optional, Any, Tuple
@@ -74,6 +79,7 @@ class Task:
     assigned_node: Optional[str] = None
     assigned_gpu: Optional[str] = None
     result: Any = None
+    priority: int = 1  # 优先级，数值越小越优先（0=high, 1=normal, 2=low）
 
 # ====================== 抽象接口 ======================
 
@@ -325,10 +331,31 @@ class NvidiaGPUAdapter(GPUAdapter):
     def get_adapter_type(self) -> str:
         return "nvidia"
     
+    # 节点探测结果的缓存时间(秒)，发现节点后紧接着获取GPU信息时无需再次连接
+    PROBE_CACHE_TTL = 30
+    
+    def __init__(self):
+        self._probe_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+    
+    @staticmethod
+    def _probe_target(ip: str, port: int, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """节点的探测参数；本机且装有nvidia-smi时直接执行，否则通过SSH"""
+        return {
+            "ip": ip,
+            "port": port,
+            "username": metadata.get("username", "root"),
+            "password": metadata.get("password", ""),
+            "key_filename": metadata.get("key_filename"),
+            "local": ip in ["127.0.0.1", "localhost"] and os.path.exists("/usr/bin/nvidia-smi")
+        }
+    
     def discover_nodes(self, config: Dict[str, Any]) -> List[NodeInfo]:
-        """发现NVIDIA GPU节点"""
+        """发现NVIDIA GPU节点（通过SSH连接池并发探测，每个节点一次往返）"""
+        from ssh_pool import probe_nodes
+        
         logger.info(f"Discovering NVIDIA nodes with config: {config}")
         nodes = []
+        targets = []
         
         # 从配置中读取节点信息
         for node_config in config.get("nodes", []):
@@ -339,155 +366,85 @@ class NvidiaGPUAdapter(GPUAdapter):
                 port=node_config.get("port", 22),
                 status="unknown"
             )
-            
-            # 获取节点的内存和CPU信息
-            try:
-                import paramiko
-                import re
-                
-                # 创建SSH客户端
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-                # 尝试从节点元数据中获取凭据
-                username = node_config.get("metadata", {}).get("username", "root")
-                password = node_config.get("metadata", {}).get("password", "")
-                
-                try:
-                    # 连接到远程服务器
-                    ssh.connect(node.ip, node.port, username, password)
-                    
-                    # 获取内存信息
-                    stdin, stdout, stderr = ssh.exec_command("free -m | grep Mem")
-                    mem_output = stdout.read().decode("utf-8")
-                    mem_parts = mem_output.split()
-                    if len(mem_parts) >= 7:
-                        node.memory_total = int(mem_parts[1])
-                        node.memory_available = int(mem_parts[6])
-                    
-                    # 获取CPU信息
-                    stdin, stdout, stderr = ssh.exec_command("lscpu")
-                    cpu_output = stdout.read().decode("utf-8")
-                    
-                    # 解析CPU信息
-                    cpu_info = {}
-                    for line in cpu_output.split("\n"):
-                        if ":" in line:
-                            key, value = line.split(":", 1)
-                            cpu_info[key.strip()] = value.strip()
-                    
-                    # 提取关键信息
-                    node.cpu_info = {
-                        "model": cpu_info.get("Model name", "Unknown"),
-                        "cores": int(cpu_info.get("CPU(s)", 0)),
-                        "architecture": cpu_info.get("Architecture", "Unknown"),
-                        "vendor": cpu_info.get("Vendor ID", "Unknown")
-                    }
-                    
-                    # 获取主机名和操作系统信息
-                    stdin, stdout, stderr = ssh.exec_command("hostname")
-                    hostname = stdout.read().decode("utf-8").strip()
-                    
-                    stdin, stdout, stderr = ssh.exec_command("uname -a")
-                    os_info = stdout.read().decode("utf-8").strip()
-                    
-                    # 更新节点元数据
-                    node.metadata.update({
-                        "hostname": hostname,
-                        "os": os_info.split()[0],
-                        "os_version": " ".join(os_info.split()[2:])
-                    })
-                    
-                finally:
-                    ssh.close()
-                    
-            except Exception as e:
-                logger.error(f"Error getting node system info: {e}")
-            
             nodes.append(node)
-            
+            targets.append(self._probe_target(node.ip, node.port, node_config.get("metadata", {})))
+        
+        # 并发获取节点的内存、CPU、系统和GPU信息
+        started = time.time()
+        for node, probe in zip(nodes, probe_nodes(targets, max_workers=config.get("probe_concurrency", 32))):
+            if isinstance(probe, Exception):
+                logger.error(f"Error getting node system info: {probe}")
+                continue
+            self._probe_cache[node.id] = (time.time(), probe)
+            if "memory_total" in probe:
+                node.memory_total = probe["memory_total"]
+                node.memory_available = probe["memory_available"]
+            node.cpu_info = probe["cpu_info"]
+            node.metadata.update({
+                "hostname": probe["hostname"],
+                "os": probe["os"],
+                "os_version": probe["os_version"]
+            })
+        logger.info(f"Probed {len(nodes)} NVIDIA nodes in {time.time() - started:.2f}s")
+        
         return nodes
     
     def get_gpu_info(self, node: NodeInfo) -> List[GPUInfo]:
-        """获取NVIDIA GPU信息"""
+        """获取NVIDIA GPU信息（优先使用发现节点时的探测结果）"""
         logger.info(f"Getting GPU info for NVIDIA node: {node.name}")
         
-        # 使用SSH连接到远程服务器并获取GPU信息
         gpus = []
         
         try:
-            import paramiko
-            import re
-            
-            # 创建SSH客户端
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # 如果节点是本地节点，直接使用本地命令
-            if node.ip in ["127.0.0.1", "localhost"] and os.path.exists("/usr/bin/nvidia-smi"):
-                import subprocess
-                output = subprocess.check_output(["nvidia-smi", "--query-gpu=index,name,memory.total,driver_version", "--format=csv,noheader"]).decode("utf-8")
-                lines = output.strip().split("\n")
+            cached = self._probe_cache.pop(node.id, None)
+            if cached and time.time() - cached[0] < self.PROBE_CACHE_TTL:
+                probe = cached[1]
             else:
-                # 连接到远程服务器
+                from ssh_pool import probe_node
                 # 注意：在实际生产环境中，应该使用密钥认证而不是密码
-                try:
-                    # 尝试从节点元数据中获取凭据
-                    username = node.metadata.get("username", "root")
-                    password = node.metadata.get("password", "")
-                    ssh.connect(node.ip, node.port, username, password)
-                    
-                    # 执行nvidia-smi命令获取GPU信息
-                    stdin, stdout, stderr = ssh.exec_command("nvidia-smi --query-gpu=index,name,memory.total,driver_version --format=csv,noheader")
-                    output = stdout.read().decode("utf-8")
-                    lines = output.strip().split("\n")
-                finally:
-                    ssh.close()
+                target = self._probe_target(node.ip, node.port, node.metadata)
+                probe = probe_node(target["ip"], target["port"], target["username"], target["password"],
+                                   target["key_filename"], local=target["local"])
             
-            # 解析输出并创建GPU对象
-            for line in lines:
-                if not line.strip():
-                    continue
-                    
-                parts = line.split(", ")
-                if len(parts) >= 3:
-                    index = parts[0].strip()
-                    name = parts[1].strip()
-                    memory = parts[2].strip()
-                    driver_version = parts[3].strip() if len(parts) > 3 else "Unknown"
-                    cuda_version = parts[4].strip() if len(parts) > 4 else "Unknown"
-                    
-                    # 提取内存大小（去除MiB或MB后缀）
-                    memory_match = re.search(r'(\d+)', memory)
-                    memory_total = int(memory_match.group(1)) if memory_match else 0
-                    
-                    # 生成模拟的GPU占用率，基于GPU ID生成一致的随机值
-                    # 这样同一个GPU每次都会显示相同的占用率
-                    import hashlib
-                    gpu_id_hash = hashlib.md5(f"{node.id}-gpu-{index}".encode()).hexdigest()
-                    usage_seed = int(gpu_id_hash[:8], 16) % 100  # 生成固定的占用率值(0-99)
-                    
-                    # 创建GPU对象
-                    gpu = GPUInfo(
-                        id=f"{node.id}-gpu-{index}",
-                        name=name,
-                        memory_total=memory_total,
-                        gpu_type=GPUType.NVIDIA,
-                        compute_capability="Unknown",  # 无法从nvidia-smi直接获取计算能力
-                        extra_info={
-                            "driver_version": driver_version,
-                            "cuda_version": cuda_version,
-                            "usage": usage_seed  # 添加GPU占用率信息
-                        }
-                    )
-                    gpus.append(gpu)
+            # 解析探测结果并创建GPU对象
+            import hashlib
+            for row in probe["gpus"]:
+                index = row["index"]
+                
+                # 生成模拟的GPU占用率，基于GPU ID生成一致的随机值
+                # 这样同一个GPU每次都会显示相同的占用率
+                gpu_id_hash = hashlib.md5(f"{node.id}-gpu-{index}".encode()).hexdigest()
+                usage_seed = int(gpu_id_hash[:8], 16) % 100  # 生成固定的占用率值(0-99)
+                
+                # 创建GPU对象
+                gpu = GPUInfo(
+                    id=f"{node.id}-gpu-{index}",
+                    name=row["name"],
+                    memory_total=row["memory_total"],
+                    gpu_type=GPUType.NVIDIA,
+                    compute_capability="Unknown",  # 无法从nvidia-smi直接获取计算能力
+                    extra_info={
+                        "driver_version": row["driver_version"],
+                        "cuda_version": "Unknown",
+                        "usage": row["utilization"] if row["utilization"] is not None else usage_seed
+                    }
+                )
+                # 实际显存占用，供装箱调度计算空闲显存
+                for key in ("memory_used", "memory_free"):
+                    if row.get(key) is not None:
+                        gpu.extra_info[key] = row[key]
+                gpus.append(gpu)
+            
+            # 将拓扑写入 extra_info["topology"]，供拓扑感知调度使用
+            if probe["topology"]:
+                from gpu_topology import parse_topology_matrix, attach_topology
+                attach_topology(gpus, parse_topology_matrix(probe["topology"]), f"{node.id}-gpu-")
                 
         except Exception as e:
             logger.error(f"Error getting NVIDIA GPU info: {e}")
             # 如果无法获取实际GPU信息，返回一个模拟的GPU
             # 这样至少系统可以继续工作
             import hashlib
-            import random
             
             # 生成模拟的GPU占用率
             gpu_id = f"{node.id}-gpu-0"
@@ -597,66 +554,28 @@ class AppleGPUAdapter(GPUAdapter):
         
         # 从配置中读取节点信息
         for node_config in config.get("nodes", []):
-            # 获取实际的主机名和系统信息
-            import platform
+            # 获取实际的主机名和系统信息（带缓存的并行采集）
             import socket
-            import subprocess
-            import re
+            from hardware_facts import get_host_facts
             
             try:
-                hostname = platform.node()
+                facts = get_host_facts()
+                hostname = facts.get("hostname") or platform.node()
                 ip_address = socket.gethostbyname(socket.gethostname())
                 
                 # 获取更多系统信息
-                os_info = platform.system() + " " + platform.release()
+                os_info = f"{facts.get('os', '')} {facts.get('os_release', '')}".strip()
                 
                 # 获取CPU信息
-                cpu_model = ""
-                cpu_cores = 0
-                cpu_arch = ""
+                cpu_model = facts.get("cpu_model", "")
+                if not cpu_model or "Apple" not in cpu_model:
+                    cpu_model = "Apple Silicon"
+                cpu_cores = facts.get("cpu_cores") or 10  # 默认值
+                cpu_arch = facts.get("cpu_arch") or "arm64"  # 默认值
                 
                 # 获取内存信息
-                memory_total = 0
-                memory_available = 0
-                
-                if platform.system() == "Darwin":  # macOS
-                    try:
-                        # 获取CPU型号
-                        cmd = "sysctl -n machdep.cpu.brand_string"
-                        cpu_model = subprocess.check_output(cmd, shell=True).decode().strip()
-                        if not cpu_model or "Apple" not in cpu_model:
-                            cpu_model = "Apple Silicon"
-                            
-                        # 获取CPU核心数
-                        cmd = "sysctl -n hw.ncpu"
-                        cpu_cores = int(subprocess.check_output(cmd, shell=True).decode().strip())
-                        
-                        # 获取CPU架构
-                        cmd = "uname -m"
-                        cpu_arch = subprocess.check_output(cmd, shell=True).decode().strip()
-                        
-                        # 获取总内存
-                        cmd = "sysctl -n hw.memsize"
-                        mem_bytes = int(subprocess.check_output(cmd, shell=True).decode().strip())
-                        memory_total = mem_bytes // (1024 * 1024)  # 转换为MB
-                        
-                        # 获取可用内存
-                        cmd = "vm_stat"
-                        vm_stat = subprocess.check_output(cmd, shell=True).decode()
-                        page_size_match = re.search(r'page size of (\d+) bytes', vm_stat)
-                        pages_free_match = re.search(r'Pages free:\s+(\d+)', vm_stat)
-                        
-                        if page_size_match and pages_free_match:
-                            page_size = int(page_size_match.group(1))
-                            pages_free = int(pages_free_match.group(1))
-                            memory_available = (pages_free * page_size) // (1024 * 1024)  # 转换为MB
-                    except Exception as e:
-                        logger.error(f"Error getting system info: {e}")
-                        cpu_model = "Apple Silicon"
-                        cpu_cores = 10  # 默认值
-                        cpu_arch = "arm64"  # 默认值
-                        memory_total = 16384  # 默认值 16GB
-                        memory_available = 8192  # 默认值 8GB
+                memory_total = facts.get("memory_total") or 16384  # 默认值 16GB
+                memory_available = facts.get("memory_available") or 8192  # 默认值 8GB
             except Exception as e:
                 logger.error(f"Error getting basic system info: {e}")
                 hostname = node_config.get("name", "localhost")
@@ -700,9 +619,7 @@ class AppleGPUAdapter(GPUAdapter):
         gpus = []
         
         try:
-            import platform
-            import subprocess
-            import re
+            from hardware_facts import get_host_facts
             
             # 获取实际的Mac型号
             mac_model = "M3 Max"  # 默认值
@@ -710,20 +627,10 @@ class AppleGPUAdapter(GPUAdapter):
             gpu_cores = 40        # 默认值，40核心
             
             try:
-                # 尝试从系统信息中获取Mac型号
-                cmd = "system_profiler SPHardwareDataType"
-                hardware_info = subprocess.check_output(cmd, shell=True).decode().strip()
-                
-                # 提取型号
-                model_match = re.search(r'Model Name:\s*(.+)', hardware_info)
-                if model_match:
-                    mac_model = model_match.group(1).strip()
-                
-                # 提取内存
-                memory_match = re.search(r'Memory:\s*(\d+)\s*GB', hardware_info)
-                if memory_match:
-                    memory_gb = int(memory_match.group(1))
-                    memory_total = memory_gb * 1024  # 转换为MB
+                # 从缓存的硬件信息中获取芯片型号和统一内存大小，避免每次调用system_profiler
+                facts = get_host_facts(include_dynamic=False)
+                mac_model = facts.get("chip_model") or facts.get("model_name") or mac_model
+                memory_total = facts.get("unified_memory") or facts.get("memory_total") or memory_total
                 
                 # 尝试获取GPU核心数
                 if "M3 Max" in mac_model:
@@ -849,6 +756,98 @@ class ResourceRegistry:
     def __init__(self):
         self.clusters: Dict[str, ClusterInfo] = {}
         self.adapters: Dict[str, GPUAdapter] = {}
+        # 容量索引：GPU类型 -> 按总显存排序的 (memory_total, cluster_id, node_id, gpu_id)，只收录在线节点的GPU
+        self._gpu_index: Dict[str, List[Tuple[int, str, str, str]]] = {}
+        self._gpu_refs: Dict[Tuple[str, str, str], Tuple[NodeInfo, GPUInfo]] = {}
+        self._cluster_entries: Dict[str, List[Tuple[str, Tuple[int, str, str, str]]]] = {}
+        # 节点ID -> 集群ID
+        self._node_cluster: Dict[str, str] = {}
+        # 被任务占用的GPU (cluster_id, node_id, gpu_id)，不出现在容量索引中
+        self._busy_gpus: set = set()
+        self._capacity_listeners: List[Any] = []
+        self._lock = threading.RLock()
+        
+    def add_capacity_listener(self, callback):
+        """
+        注册容量变化回调
+        
+        Args:
+            callback: callback(freed)，freed 为新增可用GPU的 [(gpu_type, memory_total)]
+        """
+        self._capacity_listeners.append(callback)
+        
+    def _notify_capacity(self, freed: List[Tuple[str, int]]):
+        """通知容量变化（在锁外调用，回调中可以再次访问注册中心）"""
+        if not freed:
+            return
+        for callback in self._capacity_listeners:
+            try:
+                callback(freed)
+            except Exception as e:
+                logger.error(f"Capacity listener failed: {e}")
+        
+    def _index_cluster(self, cluster: ClusterInfo) -> List[Tuple[str, int]]:
+        """把集群的节点和在线GPU加入索引（先移除该集群的旧条目），返回可用GPU的 (类型, 显存)"""
+        with self._lock:
+            self._unindex_cluster(cluster.id)
+            entries = []
+            available = []
+            for node in cluster.nodes:
+                self._node_cluster[node.id] = cluster.id
+                if node.status != "online":
+                    continue
+                for gpu in node.gpus:
+                    key = (cluster.id, node.id, gpu.id)
+                    entry = (gpu.memory_total,) + key
+                    self._gpu_refs[key] = (node, gpu)
+                    entries.append((gpu.gpu_type.value, entry))
+                    if key not in self._busy_gpus:
+                        bisect.insort(self._gpu_index.setdefault(gpu.gpu_type.value, []), entry)
+                        available.append((gpu.gpu_type.value, gpu.memory_total))
+            self._cluster_entries[cluster.id] = entries
+            return available
+        
+    def _unindex_cluster(self, cluster_id: str):
+        """从索引中移除集群的所有条目"""
+        with self._lock:
+            for gpu_type, entry in self._cluster_entries.pop(cluster_id, []):
+                self._remove_entry(gpu_type, entry)
+                self._gpu_refs.pop(entry[1:], None)
+            for node_id in [n for n, c in self._node_cluster.items() if c == cluster_id]:
+                del self._node_cluster[node_id]
+                
+    def _remove_entry(self, gpu_type: str, entry: Tuple[int, str, str, str]):
+        bucket = self._gpu_index.get(gpu_type, [])
+        pos = bisect.bisect_left(bucket, entry)
+        if pos < len(bucket) and bucket[pos] == entry:
+            del bucket[pos]
+            
+    def acquire_gpu(self, node_id: str, gpu_id: str) -> bool:
+        """标记GPU被占用，从容量索引中移除；GPU不存在或已被占用时返回False"""
+        with self._lock:
+            key = (self._node_cluster.get(node_id), node_id, gpu_id)
+            if key not in self._gpu_refs or key in self._busy_gpus:
+                return False
+            gpu = self._gpu_refs[key][1]
+            self._remove_entry(gpu.gpu_type.value, (gpu.memory_total,) + key)
+            self._busy_gpus.add(key)
+            return True
+            
+    def release_gpu(self, node_id: str, gpu_id: str) -> bool:
+        """释放被占用的GPU，放回容量索引并通知容量变化"""
+        with self._lock:
+            key = (self._node_cluster.get(node_id), node_id, gpu_id)
+            if key not in self._busy_gpus:
+                return False
+            self._busy_gpus.discard(key)
+            ref = self._gpu_refs.get(key)
+            # 集群已移除或节点已离线时不放回索引
+            if ref is None or ref[0].status != "online":
+                return True
+            gpu = ref[1]
+            bisect.insort(self._gpu_index.setdefault(gpu.gpu_type.value, []), (gpu.memory_total,) + key)
+        self._notify_capacity([(gpu.gpu_type.value, gpu.memory_total)])
+        return True
         
     def register_adapter(self, adapter: GPUAdapter):
         """注册GPU适配器"""
@@ -863,7 +862,9 @@ class ResourceRegistry:
             return False
             
         self.clusters[cluster.id] = cluster
+        available = self._index_cluster(cluster)
         logger.info(f"Added cluster: {cluster.name} ({cluster.id})")
+        self._notify_capacity(available)
         return True
         
     def remove_cluster(self, cluster_id: str) -> bool:
@@ -873,6 +874,9 @@ class ResourceRegistry:
             return False
             
         del self.clusters[cluster_id]
+        with self._lock:
+            self._unindex_cluster(cluster_id)
+            self._busy_gpus = {key for key in self._busy_gpus if key[0] != cluster_id}
         logger.info(f"Removed cluster: {cluster_id}")
         return True
         
@@ -884,6 +888,11 @@ class ResourceRegistry:
         """列出所有集群"""
         return list(self.clusters.values())
         
+    def get_node_cluster(self, node_id: str) -> Optional[ClusterInfo]:
+        """获取节点所属的集群"""
+        cluster_id = self._node_cluster.get(node_id)
+        return self.clusters.get(cluster_id) if cluster_id else None
+        
     def discover_cluster(self, name: str, adapter_type: str, config: Dict[str, Any]) -> Optional[ClusterInfo]:
         """发现并添加新集群"""
         if adapter_type not in self.adapters:
@@ -937,175 +946,355 @@ class ResourceRegistry:
                 node.gpus = adapter.get_gpu_info(node)
                 node.last_heartbeat = time.time()
                 
+        self._notify_capacity(self._index_cluster(cluster))
         return True
         
     def find_available_gpu(self, requirements: Dict[str, Any]) -> Tuple[Optional[NodeInfo], Optional[GPUInfo]]:
-        """根据需求查找可用GPU"""
+        """
+        根据需求查找可用GPU
+        
+        在容量索引中二分定位第一个总显存满足要求的GPU，即返回满足要求的最小GPU；
+        未指定类型时在各类型中取显存最小的一个
+        """
         required_type = requirements.get("gpu_type")
         required_memory = requirements.get("min_memory", 0)
-        
-        for cluster in self.clusters.values():
-            for node in cluster.nodes:
-                if node.status != "online":
-                    continue
-                    
-                for gpu in node.gpus:
-                    # 检查GPU类型
-                    if required_type and gpu.gpu_type.value != required_type:
-                        continue
-                        
-                    # 检查内存要求
-                    if gpu.memory_total < required_memory:
-                        continue
-                        
-                    # 找到符合要求的GPU
-                    return node, gpu
-                    
-        return None, None
+        with self._lock:
+            return self._find_in_index(required_type, required_memory)
+            
+    def _find_in_index(self, required_type: Optional[str],
+                       required_memory: int) -> Tuple[Optional[NodeInfo], Optional[GPUInfo]]:
+        gpu_types = [required_type] if required_type else list(self._gpu_index)
+        
+        best = None
+        for gpu_type in gpu_types:
+            bucket = self._gpu_index.get(gpu_type, [])
+            pos = bisect.bisect_left(bucket, (required_memory,))
+            # 节点状态可能在两次索引更新之间被修改，跳过已离线的节点
+            while pos < len(bucket):
+                node, gpu = self._gpu_refs[bucket[pos][1:]]
+                if node.status == "online":
+                    if best is None or bucket[pos] < best[0]:
+                        best = (bucket[pos], node, gpu)
+                    break
+                pos += 1
+                
+        if best is None:
+            return None, None
+        return best[1], best[2]
 
 # ====================== 任务调度 ======================
 
 class TaskScheduler:
-    """任务调度器"""
+    """
+    事件驱动的任务调度器
+    
+    待处理任务按需求 (gpu_type, min_memory) 分队列等待，每个队列内按优先级、提交顺序排列；
+    只有注册中心报告相匹配的容量（类型一致且显存足够）被释放或新增时才唤醒对应队列。
+    任务在有界线程池中执行，完成回调释放GPU并触发下一轮唤醒。
+    """
     
-    def __init__(self, registry: ResourceRegistry):
+    def __init__(self, registry: ResourceRegistry, max_workers: int = 8):
+        """
+        Args:
+            registry: 资源注册中心
+            max_workers: 同时执行的任务数上限
+        """
         self.registry = registry
         self.tasks: Dict[str, Task] = {}
-        self.pending_tasks: List[str] = []
         self.running_tasks: Dict[str, Tuple[str, str]] = {}  # task_id -> (node_id, gpu_id)
+        # (gpu_type, min_memory) -> [(priority, 序号, task_id)] 小顶堆
+        self.wait_queues: Dict[Tuple[Optional[str], int], List[Tuple[int, int, str]]] = {}
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task")
+        registry.add_capacity_listener(self._on_capacity)
+        
+    @property
+    def pending_tasks(self) -> List[str]:
+        """待处理任务ID，按优先级、提交顺序排列"""
+        with self._lock:
+            entries = [entry for queue in self.wait_queues.values() for entry in queue]
+        return [task_id for _, _, task_id in sorted(entries)]
+        
+    @staticmethod
+    def _queue_key(task: Task) -> Tuple[Optional[str], int]:
+        return task.requirements.get("gpu_type") or None, int(task.requirements.get("min_memory", 0) or 0)
         
     def submit_task(self, task: Task) -> str:
-        """提交任务"""
-        self.tasks[task.id] = task
-        self.pending_tasks.append(task.id)
-        logger.info(f"Task submitted: {task.id}")
+        """提交任务，有空闲资源时立即执行，否则进入对应需求的等待队列"""
+        with self._lock:
+            self.tasks[task.id] = task
+            key = self._queue_key(task)
+            self._seq += 1
+            heapq.heappush(self.wait_queues.setdefault(key, []), (task.priority, self._seq, task.id))
+            logger.info(f"Task submitted: {task.id} (priority {task.priority})")
+            self._drain([key])
         return task.id
         
     def process_pending_tasks(self):
-        """处理待处理任务"""
-        if not self.pending_tasks:
-            return
+        """尝试调度所有等待队列（容量可能在事件之外发生变化时使用，如集群状态刷新）"""
+        with self._lock:
+            self._drain(list(self.wait_queues))
             
-        # 处理每个待处理任务
-        remaining_tasks = []
-        for task_id in self.pending_tasks:
-            task = self.tasks.get(task_id)
-            if not task:
-                continue
-                
-            # 查找可用资源
-            node, gpu = self.registry.find_available_gpu(task.requirements)
-            if not node or not gpu:
-                # 没有找到合适的资源，保留在待处理列表
-                remaining_tasks.append(task_id)
-                continue
-                
-            # 分配资源并执行任务
-            self._execute_task(task, node, gpu)
+    def _on_capacity(self, freed: List[Tuple[str, int]]):
+        """容量释放/新增事件：只唤醒类型匹配且显存需求不超过释放GPU显存的队列"""
+        with self._lock:
+            keys = [key for key in self.wait_queues
+                    if any((key[0] is None or key[0] == gpu_type) and key[1] <= memory
+                           for gpu_type, memory in freed)]
+            self._drain(keys)
             
-        self.pending_tasks = remaining_tasks
-        
+    def _drain(self, keys: List[Tuple[Optional[str], int]]):
+        """在给定队列中按优先级依次派发任务，直到这些队列都找不到资源"""
+        candidates = [key for key in keys if self.wait_queues.get(key)]
+        while candidates:
+            # 选择队首优先级最高的队列
+            key = min(candidates, key=lambda k: self.wait_queues[k][0])
+            queue = self.wait_queues[key]
+            task = self.tasks.get(queue[0][2])
+            if task is None or task.status != "pending":
+                heapq.heappop(queue)
+            else:
+                node, gpu = self.registry.find_available_gpu(task.requirements)
+                if not node or not gpu or not self.registry.acquire_gpu(node.id, gpu.id):
+                    # 该需求暂时没有资源，等待下一次容量事件
+                    candidates.remove(key)
+                    continue
+                heapq.heappop(queue)
+                self._execute_task(task, node, gpu)
+            if not queue:
+                self.wait_queues.pop(key, None)
+            # 派发可能同步触发完成回调并重入调度，重新筛选仍有任务的队列
+            candidates = [k for k in candidates if self.wait_queues.get(k)]
+                
     def _execute_task(self, task: Task, node: NodeInfo, gpu: GPUInfo):
-        """执行任务"""
+        """把任务提交到线程池执行，GPU已由调用方占用"""
         # 更新任务状态
         task.assigned_node = node.id
         task.assigned_gpu = gpu.id
+        task.status = "running"
         
         # 记录运行中的任务
         self.running_tasks[task.id] = (node.id, gpu.id)
         
         # 获取适配器
-        cluster = next((c for c in self.registry.clusters.values() 
-                      if any(n.id == node.id for n in c.nodes)), None)
-        if not cluster:
-            logger.error(f"Cannot find cluster for node {node.id}")
-            task.status = "failed"
-            return
-            
-        adapter = self.registry.adapters.get(cluster.adapter_type)
+        cluster = self.registry.get_node_cluster(node.id)
+        adapter = self.registry.adapters.get(cluster.adapter_type) if cluster else None
         if not adapter:
-            logger.error(f"Cannot find adapter for type {cluster.adapter_type}")
-            task.status = "failed"
-            return
-            
-        # 异步执行任务（在实际实现中，这应该是异步的）
+            logger.error(f"Cannot find cluster or adapter for node {node.id}")
+            future: Future = Future()
+            future.set_exception(RuntimeError(f"no adapter for node {node.id}"))
+        else:
+            future = self._executor.submit(adapter.execute_task, node, gpu, task)
+        future.add_done_callback(lambda f, task=task: self._on_task_done(task, f))
+        
+    def _on_task_done(self, task: Task, future: Future):
+        """任务完成回调：记录结果并释放GPU，释放会唤醒等待该容量的队列"""
         try:
-            result = adapter.execute_task(node, gpu, task)
-            task.result = result
+            task.result = future.result()
             task.status = "completed"
         except Exception as e:
             logger.error(f"Error executing task {task.id}: {e}")
             task.status = "failed"
         finally:
-            # 清理运行中的任务记录
-            if task.id in self.running_tasks:
-                del self.running_tasks[task.id]
+            with self._lock:
+                node_id, gpu_id = self.running_tasks.pop(task.id, (task.assigned_node, task.assigned_gpu))
+            self.registry.release_gpu(node_id, gpu_id)
+            
+    def shutdown(self, wait: bool = True):
+        """停止线程池"""
+        self._executor.shutdown(wait=wait)
 
 # ====================== 配置管理 ======================
 
 class ConfigManager:
-    """配置管理器"""
+    """
+    配置管理器
     
-    def __init__(self, config_path: str = "config.json"):
+    config.json 保存完整快照，每次增删改只向 config.json.journal 追加一行操作记录；
+    启动时加载快照并重放日志，日志条数达到 compact_threshold 时把当前配置原子地写成新快照并清空日志。
+    日志中的操作都是整值覆盖，压缩过程中崩溃导致的重复重放不会改变结果。
+    """
+    
+    def __init__(self, config_path: str = "config.json", compact_threshold: int = 1000, fsync: bool = True):
+        """
+        Args:
+            config_path: 快照文件路径，日志文件为 <config_path>.journal
+            compact_threshold: 日志达到该条数时压缩
+            fsync: 每次追加后是否 fsync，关闭后吞吐更高但掉电可能丢失最近的修改
+        """
         self.config_path = config_path
+        self.journal_path = config_path + ".journal"
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._journal = None
+        self._journal_entries = 0
         self.config = self._load_config()
         
     def _load_config(self) -> Dict[str, Any]:
-        """加载配置"""
-        if not os.path.exists(self.config_path):
-            return {"clusters": {}}
+        """加载快照并重放日志"""
+        config = {"clusters": {}}
+        if os.path.exists(self.config_path):
+            try:
+                with open(self.config_path, 'r') as f:
+                    config = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading config: {e}")
+                
+        if os.path.exists(self.journal_path):
+            valid_size = 0
+            with open(self.journal_path, 'rb') as f:
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        if line.strip():
+                            if not line.endswith(b"\n"):
+                                raise ValueError("missing newline")
+                            entry = json.loads(line)
+                            try:
+                                self._apply(config, entry)
+                                self._journal_entries += 1
+                            except (KeyError, TypeError) as e:
+                                # 完整但缺少字段的记录不会修改配置，跳过后继续重放
+                                logger.warning(f"Skipping malformed journal entry at line {line_no}: {e!r}")
+                        valid_size += len(line)
+                    except ValueError:
+                        # 只有最后一行可能因崩溃而不完整，截掉后再继续追加
+                        logger.warning(f"Truncating incomplete journal entry at line {line_no}")
+                        break
+            if valid_size < os.path.getsize(self.journal_path):
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(valid_size)
+            if self._journal_entries:
+                logger.info(f"Replayed {self._journal_entries} config journal entries")
+        return config
+        
+    @staticmethod
+    def _apply(config: Dict[str, Any], entry: Dict[str, Any]):
+        """把一条日志操作应用到配置"""
+        clusters = config.setdefault("clusters", {})
+        op = entry["op"]
+        if op == "put":
+            clusters[entry["id"]] = entry["value"]
+        elif op == "delete":
+            clusters.pop(entry["id"], None)
+        elif op == "update" and entry["id"] in clusters:
+            clusters[entry["id"]]["config"] = entry["config"]
             
+    def _append(self, entry: Dict[str, Any]):
+        """
+        先追加日志，写入成功后再应用到内存配置，必要时压缩
+        
+        Raises:
+            OSError: 日志写入失败，内存配置保持不变
+        """
+        with self._lock:
+            offset = None
+            try:
+                if self._journal is None:
+                    self._journal = open(self.journal_path, 'a')
+                offset = self._journal.tell()
+                self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            except OSError as e:
+                logger.error(f"Error writing config journal: {e}")
+                self._discard_partial_entry(offset)
+                raise
+            self._journal_entries += 1
+            self._apply(self.config, entry)
+            if self._journal_entries >= self.compact_threshold:
+                self._compact()
+                
+    def _discard_partial_entry(self, offset: Optional[int]):
+        """写入失败后关闭日志并截掉可能写了一半的记录，下次追加时重新打开"""
+        if self._journal is not None:
+            try:
+                self._journal.close()
+            except OSError:
+                pass
+            self._journal = None
+        if offset is None:
+            return
         try:
-            with open(self.config_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading config: {e}")
-            return {"clusters": {}}
-            
-    def save_config(self):
-        """保存配置"""
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(offset)
+        except OSError as e:
+            logger.error(f"Error truncating config journal: {e}")
+                
+    def _compact(self):
+        """原子地写入快照（临时文件 + fsync + rename），然后清空日志"""
+        directory = os.path.dirname(os.path.abspath(self.config_path))
+        tmp_path = f"{self.config_path}.tmp.{os.getpid()}"
         try:
-            with open(self.config_path, 'w') as f:
+            with open(tmp_path, 'w') as f:
                 json.dump(self.config, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
+            if hasattr(os, "O_DIRECTORY"):
+                dir_fd = os.open(directory, os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
         except Exception as e:
             logger.error(f"Error saving config: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+            
+        # 快照已落盘，日志中的操作都已包含在内
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        with open(self.journal_path, 'w'):
+            pass
+        self._journal_entries = 0
+        
+    def save_config(self):
+        """保存配置（立即压缩为完整快照）"""
+        with self._lock:
+            self._compact()
+            
+    def close(self):
+        """压缩并关闭日志文件"""
+        self.save_config()
             
     def get_cluster_configs(self) -> Dict[str, Dict[str, Any]]:
         """获取所有集群配置"""
         return self.config.get("clusters", {})
         
     def add_cluster_config(self, name: str, adapter_type: str, config: Dict[str, Any]) -> str:
-        """添加集群配置"""
+        """添加集群配置，日志写入失败时抛出 OSError"""
         cluster_id = str(uuid.uuid4())
         
-        if "clusters" not in self.config:
-            self.config["clusters"] = {}
-            
-        self.config["clusters"][cluster_id] = {
-            "name": name,
-            "adapter_type": adapter_type,
-            "config": config
-        }
-        
-        self.save_config()
+        self._append({
+            "op": "put",
+            "id": cluster_id,
+            "value": {
+                "name": name,
+                "adapter_type": adapter_type,
+                "config": config
+            }
+        })
         return cluster_id
         
     def remove_cluster_config(self, cluster_id: str) -> bool:
-        """移除集群配置"""
+        """移除集群配置，日志写入失败时抛出 OSError"""
         if "clusters" not in self.config or cluster_id not in self.config["clusters"]:
             return False
             
-        del self.config["clusters"][cluster_id]
-        self.save_config()
+        self._append({"op": "delete", "id": cluster_id})
         return True
         
     def update_cluster_config(self, cluster_id: str, config: Dict[str, Any]) -> bool:
-        """更新集群配置"""
+        """更新集群配置，日志写入失败时抛出 OSError"""
         if "clusters" not in self.config or cluster_id not in self.config["clusters"]:
             return False
             
-        self.config["clusters"][cluster_id]["config"] = config
-        self.save_config()
+        self._append({"op": "update", "id": cluster_id, "config": config})
         return True
 
 # ====================== 主控制器 ======================
@@ -1288,8 +1477,9 @@ def main():
         "min_memory": 16000  # 16GB
     })
     
-    # 运行调度器
+    # 运行调度器，等待已派发的任务执行完成
     controller.run_scheduler()
+    controller.scheduler.shutdown(wait=True)
     
     # 检查任务状态
     print(f"NVIDIA Task Status: {controller.get_task_status(nvidia_task)}")
@@ -25,7 +25,7 @@ from model_config_api import model_config_api
 from model_deployment import model_instances_to_add
 from auth_api import auth_api, generate_password_hash, check_password_hash, SECRET_KEY
 from api_key_api import api_key_api
-from model_deployment import model_deployment_api, init_model_deployment
+from model_deployment import model_deployment_api, init_model_deployment, invalidate_routing_table
 
 # 连接MongoDB
 try:
@@ -238,6 +238,7 @@ def deploy_model():
             
             if not model_exists:
                 model_instances.append(new_model_instance)
+            invalidate_routing_table()
             
             return jsonify({
                 'status': 'success', 
@@ -267,6 +268,7 @@ def deploy_model():
             'creator': new_deployment['creator_id'],
             'description': new_deployment['description']
         })
+        invalidate_routing_table()
         
         return jsonify({
             'status': 'success', 
@@ -516,6 +518,7 @@ def update_model_status(model_id):
     
     # 更新模型状态
     model_instances[model_index]['status'] = data['status']
+    invalidate_routing_table()
     return jsonify({'status': 'success', 'data': model_instances[model_index]}), 200
 
 # 模型配置数据和API已移至model_config_api.py
@@ -582,67 +585,72 @@ usage_data = {
 def get_usage_data():
     return jsonify({'status': 'success', 'data': usage_data}), 200
 
+# 启动Docker容器事件监听，在内存中维护 qwen-model-* 容器清单
+from docker_inventory import docker_inventory
+docker_inventory.start()
+
+def list_docker_models_with_ps():
+    """通过 docker ps 获取运行中的模型容器（容器清单不可用时使用）"""
+    import subprocess
+    cmd = ["docker", "ps", "--filter", "name=qwen-model-", "--format", "{{.Names}},{{.Ports}},{{.Image}}"]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'获取Docker容器列表失败: {result.stderr}')
+    
+    docker_models = []
+    for line in result.stdout.strip().split('\n'):
+        if not line:
+            continue
+        
+        parts = line.split(',')
+        if len(parts) < 2:
+            continue
+        
+        container_name = parts[0]
+        ports_info = parts[1]
+        
+        # 提取端口信息
+        import re
+        port_match = re.search(r'0.0.0.0:(\d+)->8000/tcp', ports_info)
+        if not port_match:
+            continue
+        
+        port = port_match.group(1)
+        
+        # 从容器名称中提取模型名称
+        model_id = container_name
+        model_name = container_name.replace('-', ' ').title()
+        
+        # 提取镜像信息
+        image_info = parts[2] if len(parts) > 2 else "transformers:apple-lite-v1"
+        
+        # 创建模型实例
+        docker_models.append({
+            "id": model_id,
+            "modelId": model_id,
+            "modelName": model_name,
+            "backend": "mac",
+            "server": "localhost",
+            "port": port,
+            "gpu": "Apple Silicon",
+            "status": "running",
+            "cluster": "local",
+            "node": "localhost",
+            "creator_name": "当前用户",
+            "image": image_info,
+            "image_id": image_info
+        })
+    return docker_models
+
 # 获取Docker中运行的模型实例
 @app.route('/api/models/docker', methods=['GET'])
 def get_docker_models():
     try:
-        # 执行 docker ps 命令获取运行中的容器
-        import subprocess
-        cmd = "docker ps --filter 'name=qwen-model-' --format '{{.Names}},{{.Ports}},{{.Image}}'"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            return jsonify({
-                'status': 'error',
-                'message': f'获取Docker容器列表失败: {result.stderr}'
-            }), 500
-        
-        # 解析输出结果
-        docker_models = []
-        for line in result.stdout.strip().split('\n'):
-            if not line:
-                continue
-            
-            parts = line.split(',')
-            if len(parts) < 2:
-                continue
-            
-            container_name = parts[0]
-            ports_info = parts[1]
-            
-            # 提取端口信息
-            import re
-            port_match = re.search(r'0.0.0.0:(\d+)->8000/tcp', ports_info)
-            if not port_match:
-                continue
-            
-            port = port_match.group(1)
-            
-            # 从容器名称中提取模型名称
-            model_id = container_name
-            model_name = container_name.replace('-', ' ').title()
-            
-            # 提取镜像信息
-            image_info = parts[2] if len(parts) > 2 else "transformers:apple-lite-v1"
-            
-            # 创建模型实例
-            model_instance = {
-                "id": model_id,
-                "modelId": model_id,
-                "modelName": model_name,
-                "backend": "mac",
-                "server": "localhost",
-                "port": port,
-                "gpu": "Apple Silicon",
-                "status": "running",
-                "cluster": "local",
-                "node": "localhost",
-                "creator_name": "当前用户",
-                "image": image_info,
-                "image_id": image_info
-            }
-            
-            docker_models.append(model_instance)
+        # 优先读取事件驱动的容器清单，清单未就绪时回退到 docker ps
+        if docker_inventory.ready:
+            docker_models = docker_inventory.list()
+        else:
+            docker_models = list_docker_models_with_ps()
         
         # 更新全局模型实例列表
         global model_instances
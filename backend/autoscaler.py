@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+模型副本自动扩缩容
+按模型名称汇总各实例上报的排队长度、处理中请求数和p95延迟，
+负载超过目标时通过已有部署流程增加副本，持续空闲时移除空闲副本；
+扩容和缩容阈值之间留有滞后区间，并分别设置冷却时间，避免副本数来回抖动
+"""
+
+import logging
+import math
+import threading
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("autoscaler")
+
+
+@dataclass
+class ScalingPolicy:
+    """单个模型的扩缩容策略"""
+    min_replicas: int = 1
+    max_replicas: int = 4
+    target_queue_length: float = 4.0      # 每个副本期望的平均排队请求数
+    target_in_flight: float = 8.0         # 每个副本期望的平均处理中请求数
+    latency_slo_ms: float = 0.0           # p95延迟上限，0表示不按延迟扩容
+    scale_down_ratio: float = 0.5         # 减少一个副本后负载仍低于目标的该比例才缩容（滞后区间）
+    scale_up_cooldown: float = 60.0       # 两次扩容的最小间隔(秒)
+    scale_down_cooldown: float = 300.0    # 扩容或缩容后到下一次缩容的最小间隔(秒)
+    scale_down_stabilization: float = 180.0  # 低负载需持续多久才缩容(秒)
+    max_scale_up_step: int = 2            # 单次最多增加的副本数
+    launch_timeout: float = 600.0         # 新副本上线前按已存在计数的最长时间(秒)
+    scale_to_zero: bool = False           # 空闲超时后停止所有副本，由第一个请求触发冷启动
+    idle_timeout: float = 900.0           # 所有副本无请求多久后缩容到零(秒)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ScalingPolicy":
+        values = {}
+        for f in fields(cls):
+            if f.name not in data:
+                continue
+            value = data[f.name]
+            if f.type is bool and isinstance(value, str):
+                value = value.lower() in ("1", "true", "yes")
+            values[f.name] = f.type(value)
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class ModelLoad:
+    """某个模型所有在线副本的负载汇总"""
+    model_name: str
+    replicas: int = 0
+    queue_length: int = 0
+    in_flight: int = 0
+    latency_p95_ms: float = 0.0  # 各副本p95的最大值
+    instances: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def instance_metrics(instance: Dict[str, Any]) -> Dict[str, float]:
+    """实例上报的负载指标，兼容直接放在实例信息顶层的 queue_length"""
+    metrics = instance.get("metrics") or {}
+    return {
+        "queue_length": float(metrics.get("queue_length", instance.get("queue_length", 0)) or 0),
+        "in_flight": float(metrics.get("in_flight", 0) or 0),
+        "latency_p95_ms": float(metrics.get("latency_p95_ms", 0) or 0),
+        "last_request_at": float(metrics.get("last_request_at", 0) or 0)
+    }
+
+
+def aggregate_load(instances: List[Dict[str, Any]]) -> Dict[str, ModelLoad]:
+    """按模型名称汇总在线实例的负载"""
+    loads: Dict[str, ModelLoad] = {}
+    for instance in instances:
+        if instance.get("status") != "online" or not instance.get("model_name"):
+            continue
+        load = loads.setdefault(instance["model_name"], ModelLoad(model_name=instance["model_name"]))
+        metrics = instance_metrics(instance)
+        load.replicas += 1
+        load.queue_length += int(metrics["queue_length"])
+        load.in_flight += int(metrics["in_flight"])
+        load.latency_p95_ms = max(load.latency_p95_ms, metrics["latency_p95_ms"])
+        load.instances.append(instance)
+    return loads
+
+
+def load_ratio(policy: ScalingPolicy, load: ModelLoad, replicas: int) -> float:
+    """
+    负载与 replicas 个副本目标容量之比，大于1表示需要扩容
+
+    排队长度、处理中请求数和延迟分别计算比值，取最大值
+    """
+    replicas = max(replicas, 1)
+    ratios = [
+        load.queue_length / (replicas * policy.target_queue_length) if policy.target_queue_length > 0 else 0.0,
+        load.in_flight / (replicas * policy.target_in_flight) if policy.target_in_flight > 0 else 0.0
+    ]
+    if policy.latency_slo_ms > 0 and replicas >= load.replicas:
+        # 延迟只能反映当前副本数下的情况，不按假设的副本数折算
+        ratios.append(load.latency_p95_ms / policy.latency_slo_ms)
+    return max(ratios)
+
+
+def is_idle(instance: Dict[str, Any]) -> bool:
+    metrics = instance_metrics(instance)
+    return metrics["queue_length"] == 0 and metrics["in_flight"] == 0
+
+
+def last_activity(instance: Dict[str, Any]) -> float:
+    """实例最近一次收到请求的时间，没有请求时使用注册/创建时间"""
+    return max(instance_metrics(instance)["last_request_at"],
+               float(instance.get("registered_at") or 0), float(instance.get("created_at") or 0))
+
+
+class Autoscaler:
+    """副本自动扩缩容控制循环"""
+
+    def __init__(self, list_instances: Callable[[], List[Dict[str, Any]]],
+                 scale_up: Callable[[str, int], int],
+                 scale_down: Callable[[Dict[str, Any]], bool],
+                 policy_loader: Callable[[], Dict[str, ScalingPolicy]],
+                 interval: float = 15.0):
+        """
+        Args:
+            list_instances: 返回所有模型实例（含 model_name、status 和 metrics）
+            scale_up: scale_up(model_name, count) 通过部署流程增加副本，返回实际提交的数量
+            scale_down: scale_down(instance) 停止一个实例，返回是否成功
+            policy_loader: 返回 {model_name: ScalingPolicy}，只有配置了策略的模型参与扩缩容
+            interval: 检查间隔(秒)
+        """
+        self.list_instances = list_instances
+        self.scale_up = scale_up
+        self.scale_down = scale_down
+        self.policy_loader = policy_loader
+        self.interval = interval
+        self._last_scale_up: Dict[str, float] = {}
+        self._last_scale_down: Dict[str, float] = {}
+        self._low_since: Dict[str, float] = {}
+        # 已提交但尚未上线的副本: model_name -> [提交时间]
+        self._launching: Dict[str, List[float]] = {}
+        self._last_decisions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台检查线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        logger.info(f"自动扩缩容已启动，检查间隔 {self.interval}s")
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"自动扩缩容检查出错: {e}")
+
+    def _effective_replicas(self, model_name: str, policy: ScalingPolicy, observed: int, now: float) -> int:
+        """在线副本数 + 仍在启动期内的新副本数"""
+        launching = [t for t in self._launching.get(model_name, []) if now - t < policy.launch_timeout]
+        # 新副本上线后在线数增加，对应数量的启动记录视为完成
+        previous_observed = self._last_decisions.get(model_name, {}).get("observed", observed)
+        for _ in range(max(observed - previous_observed, 0)):
+            if launching:
+                launching.pop(0)
+        self._launching[model_name] = launching
+        return observed + len(launching)
+
+    def evaluate(self, model_name: str, policy: ScalingPolicy, load: ModelLoad,
+                 now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        计算单个模型的扩缩容决策
+
+        Returns:
+            Dict: action 为 "scale_up"/"scale_down"/"none"，附带 count、desired 和 reason
+        """
+        now = time.time() if now is None else now
+        current = self._effective_replicas(model_name, policy, load.replicas, now)
+        decision = {"model_name": model_name, "observed": load.replicas, "current": current,
+                    "action": "none", "count": 0, "desired": current, "reason": ""}
+
+        # 缩容到零的模型等待请求触发冷启动（见 activate）
+        if policy.scale_to_zero and current == 0:
+            decision["reason"] = "已缩容到零"
+            return decision
+
+        # 所有副本空闲超时后全部停止
+        if policy.scale_to_zero and current == load.replicas and all(is_idle(i) for i in load.instances):
+            idle_for = now - max(last_activity(i) for i in load.instances)
+            if idle_for >= policy.idle_timeout:
+                decision.update(action="scale_to_zero", count=current, desired=0,
+                                reason=f"空闲 {idle_for:.0f}s")
+                return decision
+
+        # 副本数低于下限时直接补齐，不受冷却时间限制
+        if current < policy.min_replicas:
+            decision.update(action="scale_up", count=policy.min_replicas - current,
+                            desired=policy.min_replicas, reason="低于最小副本数")
+            return decision
+
+        ratio = load_ratio(policy, load, current)
+        decision["load_ratio"] = round(ratio, 3)
+        if ratio > 1 and current < policy.max_replicas:
+            self._low_since.pop(model_name, None)
+            if now - self._last_scale_up.get(model_name, 0) < policy.scale_up_cooldown:
+                decision["reason"] = "扩容冷却中"
+                return decision
+            desired = min(math.ceil(current * ratio), current + policy.max_scale_up_step, policy.max_replicas)
+            decision.update(action="scale_up", count=desired - current, desired=desired,
+                            reason=f"负载比 {ratio:.2f}")
+            return decision
+
+        if current > policy.max_replicas:
+            decision.update(action="scale_down", count=1, desired=current - 1, reason="超过最大副本数")
+            return decision
+
+        # 减少一个副本后负载仍明显低于目标才考虑缩容
+        if current > policy.min_replicas and load_ratio(policy, load, current - 1) < policy.scale_down_ratio:
+            low_since = self._low_since.setdefault(model_name, now)
+            if now - low_since < policy.scale_down_stabilization:
+                decision["reason"] = "低负载持续时间不足"
+            elif now - max(self._last_scale_down.get(model_name, 0),
+                           self._last_scale_up.get(model_name, 0)) < policy.scale_down_cooldown:
+                decision["reason"] = "缩容冷却中"
+            else:
+                decision.update(action="scale_down", count=1, desired=current - 1,
+                                reason=f"负载比 {ratio:.2f}")
+        else:
+            self._low_since.pop(model_name, None)
+        return decision
+
+    def run_once(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """执行一轮检查，返回各模型的决策"""
+        now = time.time() if now is None else now
+        with self._lock:
+            policies = self.policy_loader()
+            loads = aggregate_load(self.list_instances())
+            decisions = []
+            for model_name, policy in policies.items():
+                load = loads.get(model_name, ModelLoad(model_name=model_name))
+                decision = self.evaluate(model_name, policy, load, now)
+                self._apply(decision, load, now)
+                self._last_decisions[model_name] = {**decision, "checked_at": now}
+                decisions.append(decision)
+            return decisions
+
+    def _apply(self, decision: Dict[str, Any], load: ModelLoad, now: float):
+        model_name = decision["model_name"]
+        if decision["action"] == "scale_up":
+            launched = self.scale_up(model_name, decision["count"])
+            logger.info(f"模型 {model_name} 扩容 {decision['current']} -> {decision['desired']} "
+                        f"({decision['reason']})，已提交 {launched} 个副本")
+            if launched:
+                self._launching.setdefault(model_name, []).extend([now] * launched)
+                self._last_scale_up[model_name] = now
+            decision["count"] = launched
+        elif decision["action"] == "scale_down":
+            # 只移除空闲副本，优先移除最久没有请求的
+            idle = sorted((i for i in load.instances if is_idle(i)),
+                          key=lambda i: instance_metrics(i)["last_request_at"])
+            if not idle:
+                decision.update(action="none", count=0, reason="没有空闲副本可移除")
+                return
+            victim = idle[0]
+            if self.scale_down(victim):
+                logger.info(f"模型 {model_name} 缩容 {decision['current']} -> {decision['desired']}，"
+                            f"移除实例 {victim.get('model_id')} ({decision['reason']})")
+                self._last_scale_down[model_name] = now
+                self._low_since.pop(model_name, None)
+                decision["model_id"] = victim.get("model_id")
+            else:
+                decision.update(action="none", count=0, reason=f"停止实例 {victim.get('model_id')} 失败")
+        elif decision["action"] == "scale_to_zero":
+            stopped = [i.get("model_id") for i in load.instances if self.scale_down(i)]
+            logger.info(f"模型 {model_name} 缩容到零 ({decision['reason']})，停止实例 {stopped}")
+            self._last_scale_down[model_name] = now
+            self._low_since.pop(model_name, None)
+            decision.update(count=len(stopped), stopped=stopped)
+
+    def activate(self, model_name: str) -> bool:
+        """
+        为缩容到零的模型冷启动一个副本（已有副本在启动中时不重复部署）
+
+        Returns:
+            bool: 是否已有副本在启动中或成功提交了新副本
+        """
+        now = time.time()
+        with self._lock:
+            policy = self.policy_loader().get(model_name, ScalingPolicy())
+            launching = [t for t in self._launching.get(model_name, []) if now - t < policy.launch_timeout]
+            if launching:
+                return True
+            launched = self.scale_up(model_name, 1)
+            if launched:
+                self._launching[model_name] = [now] * launched
+                self._last_scale_up[model_name] = now
+                logger.info(f"模型 {model_name} 冷启动，已提交 {launched} 个副本")
+            return bool(launched)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """最近一轮各模型的决策"""
+        with self._lock:
+            return {name: dict(decision) for name, decision in self._last_decisions.items()}
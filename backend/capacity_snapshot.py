@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+集群容量快照（向量化调度）
+将所有GPU的空闲显存、利用率、所属节点/集群、GPU类型等保存在NumPy数组中，
+随心跳、分配和释放增量更新；调度决策通过向量化的掩码和排序完成，
+避免每次调度都遍历节点/GPU对象并重新排序
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ClusterRegister import ClusterInfo, NodeInfo, GPUInfo
+from gpu_scheduler import GPUScheduler, GPUAllocation, gpu_free_memory, pack_across_nodes
+
+logger = logging.getLogger("capacity_snapshot")
+
+
+class CapacitySnapshot:
+    """基于数组的集群容量快照
+
+    每张GPU占一行，以 (node_id, gpu_id) 为键；删除的行会被复用。
+    所有修改方法都是O(1)或只涉及变化的行，不需要重建整个快照。
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+            capacity: 初始行数，不足时按倍数扩容
+        """
+        self._size = 0
+        self._free_rows: List[int] = []
+        self._rows: Dict[Tuple[str, str], int] = {}  # (node_id, gpu_id) -> 行号
+        self._keys: List[Optional[Tuple[str, str]]] = []
+
+        # 字符串维度编码为整数索引
+        self._node_index: Dict[str, int] = {}
+        self._node_ids: List[str] = []
+        self._node_rows: Dict[int, set] = {}
+        self._cluster_index: Dict[str, int] = {}
+        self._cluster_ids: List[str] = []
+        self._type_index: Dict[str, int] = {}
+        self._type_names: List[str] = []
+
+        self.memory_total = np.zeros(capacity, dtype=np.int64)
+        self.memory_free = np.zeros(capacity, dtype=np.int64)
+        self.utilization = np.zeros(capacity, dtype=np.float32)
+        self.node = np.full(capacity, -1, dtype=np.int32)
+        self.cluster = np.full(capacity, -1, dtype=np.int32)
+        self.gpu_type = np.full(capacity, -1, dtype=np.int16)
+        self.online = np.zeros(capacity, dtype=bool)
+        self.valid = np.zeros(capacity, dtype=bool)
+
+    @classmethod
+    def from_clusters(cls, clusters: Iterable[ClusterInfo]) -> "CapacitySnapshot":
+        """从集群对象构建快照（只在初始化或全量校准时使用）"""
+        clusters = list(clusters)
+        gpu_count = sum(len(node.gpus) for cluster in clusters for node in cluster.nodes)
+        snapshot = cls(capacity=max(gpu_count, 16))
+        for cluster in clusters:
+            snapshot.sync_cluster(cluster)
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ---------------------- 编码 ----------------------
+
+    @staticmethod
+    def _intern(index: Dict[str, int], values: List[str], key: str) -> int:
+        if key not in index:
+            index[key] = len(values)
+            values.append(key)
+        return index[key]
+
+    def type_code(self, gpu_type: Optional[str]) -> Optional[int]:
+        """GPU类型编码，未出现过的类型返回-1"""
+        if gpu_type is None:
+            return None
+        return self._type_index.get(gpu_type, -1)
+
+    def has_cluster(self, cluster_id: str) -> bool:
+        return cluster_id in self._cluster_index
+
+    def node_id(self, node_code: int) -> str:
+        return self._node_ids[node_code]
+
+    def key(self, row: int) -> Tuple[str, str]:
+        """行号 -> (node_id, gpu_id)"""
+        return self._keys[row]
+
+    def _grow(self):
+        capacity = len(self.valid) * 2
+        for name in ("memory_total", "memory_free", "utilization", "node", "cluster",
+                     "gpu_type", "online", "valid"):
+            old = getattr(self, name)
+            fill = -1 if name in ("node", "cluster", "gpu_type") else 0
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    # ---------------------- 增量更新 ----------------------
+
+    def upsert_gpu(self, cluster_id: str, node: NodeInfo, gpu: GPUInfo):
+        """新增或刷新一张GPU"""
+        key = (node.id, gpu.id)
+        row = self._rows.get(key)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                if self._size == len(self.valid):
+                    self._grow()
+                row = self._size
+                self._size += 1
+                self._keys.append(None)
+            self._rows[key] = row
+            self._keys[row] = key
+
+        node_code = self._intern(self._node_index, self._node_ids, node.id)
+        self._node_rows.setdefault(node_code, set()).add(row)
+        self.node[row] = node_code
+        self.cluster[row] = self._intern(self._cluster_index, self._cluster_ids, cluster_id)
+        self.gpu_type[row] = self._intern(self._type_index, self._type_names, gpu.gpu_type.value)
+        self.memory_total[row] = gpu.memory_total
+        self.memory_free[row] = gpu_free_memory(gpu)
+        self.utilization[row] = gpu.extra_info.get("utilization", 0)
+        self.online[row] = node.status == "online"
+        self.valid[row] = True
+
+    def remove_gpu(self, node_id: str, gpu_id: str) -> bool:
+        """删除一张GPU，行号留待复用"""
+        row = self._rows.pop((node_id, gpu_id), None)
+        if row is None:
+            return False
+        self.valid[row] = False
+        self.online[row] = False
+        self._node_rows.get(int(self.node[row]), set()).discard(row)
+        self._keys[row] = None
+        self._free_rows.append(row)
+        return True
+
+    def sync_cluster(self, cluster: ClusterInfo):
+        """按集群对象校准快照：刷新现有GPU，删除已不存在的GPU"""
+        seen = set()
+        for node in cluster.nodes:
+            for gpu in node.gpus:
+                self.upsert_gpu(cluster.id, node, gpu)
+                seen.add((node.id, gpu.id))
+
+        cluster_code = self._cluster_index.get(cluster.id)
+        stale = [key for key, row in self._rows.items()
+                 if self.cluster[row] == cluster_code and key not in seen]
+        for node_id, gpu_id in stale:
+            self.remove_gpu(node_id, gpu_id)
+
+    def update_gpu(self, node_id: str, gpu_id: str, memory_free: Optional[int] = None,
+                   utilization: Optional[float] = None) -> bool:
+        """更新GPU的动态指标（来自心跳或监控）"""
+        row = self._rows.get((node_id, gpu_id))
+        if row is None:
+            return False
+        if memory_free is not None:
+            self.memory_free[row] = memory_free
+        if utilization is not None:
+            self.utilization[row] = utilization
+        return True
+
+    def set_node_status(self, node_id: str, status: str):
+        """节点上下线"""
+        node_code = self._node_index.get(node_id)
+        if node_code is None:
+            return
+        rows = list(self._node_rows.get(node_code, ()))
+        self.online[rows] = status == "online"
+
+    def apply_allocation(self, allocation: Dict[str, List[str]], memory: int, release: bool = False):
+        """
+        按分配结果增减空闲显存
+
+        Args:
+            allocation: {node_id: [gpu_ids]}
+            memory: 每张GPU的显存(MB)
+            release: True 表示释放
+        """
+        rows = [self._rows[(node_id, gpu_id)] for node_id, gpu_ids in allocation.items()
+                for gpu_id in gpu_ids if (node_id, gpu_id) in self._rows]
+        self.memory_free[rows] += memory if release else -memory
+
+    # ---------------------- 查询 ----------------------
+
+    def candidates(self, memory_required: int, gpu_type: Optional[str] = None,
+                   cluster_id: Optional[str] = None) -> np.ndarray:
+        """满足条件的在线GPU行号"""
+        n = self._size
+        mask = self.valid[:n] & self.online[:n] & (self.memory_free[:n] >= memory_required)
+        type_code = self.type_code(gpu_type)
+        if type_code is not None:
+            mask &= self.gpu_type[:n] == type_code
+        if cluster_id is not None:
+            mask &= self.cluster[:n] == self._cluster_index.get(cluster_id, -1)
+        return np.flatnonzero(mask)
+
+    def find_available_gpu(self, requirements: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """与 ResourceRegistry.find_available_gpu 相同的条件（按GPU总显存，取满足要求的最小GPU），返回 (node_id, gpu_id)"""
+        n = self._size
+        mask = self.valid[:n] & self.online[:n] & (self.memory_total[:n] >= requirements.get("min_memory", 0))
+        type_code = self.type_code(requirements.get("gpu_type"))
+        if type_code is not None:
+            mask &= self.gpu_type[:n] == type_code
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return None
+        return self.key(int(rows[np.argmin(self.memory_total[rows])]))
+
+
+class VectorizedScheduler(GPUScheduler):
+    """向量化装箱调度器
+
+    决策规则与 BinPackingScheduler 相同（按实际空闲显存最佳适配、碎片惩罚、单节点优先、
+    跨节点惩罚），但候选筛选、打分和节点内排序都在 CapacitySnapshot 的数组上完成。
+    提供快照时由调用方增量维护（包括账本中的预留），调度直接使用快照；
+    未提供时每次按传入的集群视图构建快照，视图中已扣除的预留都会生效。
+    """
+
+    def __init__(self, snapshot: Optional[CapacitySnapshot] = None, min_fragment: int = 4096,
+                 fragment_penalty: float = 0.5, cross_node_penalty: float = 1.0,
+                 apply_to_snapshot: bool = True):
+        """
+        Args:
+            snapshot: 调用方维护的容量快照，为空时每次按传入的集群视图构建
+            min_fragment: 小于该值(MB)的剩余显存视为碎片
+            fragment_penalty: 产生碎片时的惩罚
+            cross_node_penalty: 跨节点分配时每多一个节点的惩罚
+            apply_to_snapshot: 分配成功后立即从调用方的快照中扣减显存，release 时归还
+        """
+        self.snapshot = snapshot
+        self.min_fragment = min_fragment
+        self.fragment_penalty = fragment_penalty
+        self.cross_node_penalty = cross_node_penalty
+        self.apply_to_snapshot = apply_to_snapshot
+
+    def snapshot_for(self, cluster: ClusterInfo) -> CapacitySnapshot:
+        if self.snapshot is None:
+            return CapacitySnapshot.from_clusters([cluster])
+        if not self.snapshot.has_cluster(cluster.id):
+            self.snapshot.sync_cluster(cluster)
+        return self.snapshot
+
+    def allocate_gpus(self, cluster: ClusterInfo, gpu_count: int, memory_required: int,
+                      gpu_type: Optional[str] = None) -> GPUAllocation:
+        """
+        向量化最佳适配分配
+
+        Args:
+            cluster: 集群视图；使用调用方的快照时只用于定位快照中的集群
+            gpu_count: 需要的GPU数量
+            memory_required: 每个GPU需要的显存(MB)
+            gpu_type: 可选的GPU类型过滤
+
+        Returns:
+            GPUAllocation: 分配结果
+        """
+        snapshot = self.snapshot_for(cluster)
+        rows = snapshot.candidates(memory_required, gpu_type, cluster.id)
+        if len(rows) < gpu_count:
+            return GPUAllocation(
+                success=False,
+                message=f"空闲显存满足 {memory_required}MB 的GPU不足，需要 {gpu_count} 个，只有 {len(rows)} 个"
+            )
+
+        leftover = snapshot.memory_free[rows] - memory_required
+        scores = leftover / np.maximum(snapshot.memory_total[rows], 1)
+        scores += self.fragment_penalty * ((leftover > 0) & (leftover < self.min_fragment))
+        nodes = snapshot.node[rows]
+
+        # 按 (节点, 得分) 排序，计算每张GPU在节点内的名次
+        order = np.lexsort((scores, nodes))
+        rows, scores, nodes = rows[order], scores[order], nodes[order]
+        starts = np.flatnonzero(np.r_[True, nodes[1:] != nodes[:-1]])
+        counts = np.diff(np.r_[starts, len(nodes)])
+        rank = np.arange(len(nodes)) - np.repeat(starts, counts)
+
+        # 1. 单节点：每个节点取得分最小的 gpu_count 张，选总分最小的节点
+        eligible = counts >= gpu_count
+        if eligible.any():
+            top = rank < gpu_count
+            group = np.repeat(np.arange(len(starts)), counts)
+            sums = np.bincount(group[top], weights=scores[top], minlength=len(starts))
+            sums[~eligible] = np.inf
+            best = int(np.argmin(sums))
+            selected = rows[starts[best]:starts[best] + gpu_count]
+            node_id = snapshot.node_id(int(nodes[starts[best]]))
+            allocation = {node_id: [snapshot.key(int(row))[1] for row in selected]}
+            message = f"在节点 {node_id} 上装箱分配 {gpu_count} 个GPU"
+        else:
+            # 2. 跨节点：与 BinPackingScheduler 相同，每多开一个节点计一次惩罚，优先填满容量大的节点
+            node_candidates = [
+                (snapshot.node_id(int(nodes[start])),
+                 [(float(scores[i]), snapshot.key(int(rows[i]))[1]) for i in range(start, start + count)])
+                for start, count in zip(starts, counts)
+            ]
+            allocation = pack_across_nodes(node_candidates, gpu_count, self.cross_node_penalty)
+            message = f"跨节点装箱分配了 {gpu_count} 个GPU，涉及 {len(allocation)} 个节点"
+
+        if self.apply_to_snapshot and snapshot is self.snapshot:
+            snapshot.apply_allocation(allocation, memory_required)
+        return GPUAllocation(success=True, allocation=allocation, message=message)
+
+    def release(self, allocation: GPUAllocation, memory_required: int):
+        """释放分配，归还调用方快照中的显存（GPUResourceManager.release_gpus 会回调）"""
+        if (self.snapshot is not None and self.apply_to_snapshot
+                and allocation.success and allocation.allocation):
+            self.snapshot.apply_allocation(allocation.allocation, memory_required, release=True)
@@ -23,6 +23,14 @@ from ClusterRegister import (
     ClusterInfo, NodeInfo, GPUInfo, GPUType, 
     ResourceRegistry, AppleGPUAdapter, NvidiaGPUAdapter
 )
+from gpu_scheduler import (
+    GPUAllocation, GPUResourceManager, PendingDeployment, PendingDeploymentQueue, create_scheduler
+)
+from autoscaler import Autoscaler, ScalingPolicy
+from deployment_executor import normalize_priority
+from global_placement import GlobalPlacer
+from reservation_ledger import ReservationLedger
+from scale_to_zero import ColdStartManager
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, 
@@ -53,6 +61,40 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# GPU预留账本（两阶段预留，临时预留超时自动释放）
+RESERVATION_TTL = float(os.environ.get('GPU_RESERVATION_TTL', 120))
+reservation_ledger = ReservationLedger(redis_client, reserve_ttl=RESERVATION_TTL)
+
+# GPU资源管理器，调度决策通过预留账本提交
+gpu_resource_manager = GPUResourceManager(ledger=reservation_ledger)
+gpu_resource_manager.set_scheduler(create_scheduler(os.environ.get('GPU_SCHEDULER', 'bin_packing')))
+
+# 全局放置器（部署请求未指定集群/节点时使用）
+global_placer = GlobalPlacer(gpu_resource_manager)
+
+# 等待GPU资源的部署队列，GPU释放或定期检查时自动重试
+pending_deployments = PendingDeploymentQueue(
+    gpu_resource_manager,
+    cluster_loader=lambda cluster_id: load_cluster_by_id(cluster_id),
+    max_wait=float(os.environ.get('PENDING_DEPLOY_MAX_WAIT', 3600))
+)
+
+# 模型副本自动扩缩容（只管理在 autoscale_policies 中配置了策略的模型）
+autoscaler = Autoscaler(
+    list_instances=lambda: list_live_model_instances(),
+    scale_up=lambda model_name, count: scale_up_model(model_name, count),
+    scale_down=lambda instance: stop_model_instance(instance),
+    policy_loader=lambda: load_scaling_policies(),
+    interval=float(os.environ.get('AUTOSCALE_INTERVAL', 15))
+)
+
+# 缩容到零模型的冷启动：请求在实例就绪前排队等待
+cold_starts = ColdStartManager(
+    find_instance=lambda model_name: find_ready_instance(model_name),
+    activate=lambda model_name: autoscaler.activate(model_name),
+    max_wait=float(os.environ.get('COLD_START_MAX_WAIT', 600))
+)
+
 # 初始化资源注册中心
 resource_registry = ResourceRegistry()
 
@@ -1040,6 +1082,16 @@ def poll_cluster_model_instances():
                         logger.warning(f"Failed to poll model instances from cluster {cluster.name}: {response.status_code}")
                 except requests.RequestException as e:
                     logger.warning(f"Error polling model instances from cluster {cluster.name}: {e}")
+                
+                # 记录集群控制器的部署队列统计，供全局放置打分使用
+                try:
+                    response = requests.get(f"{cluster_controller_url}/api/tasks", params={"limit": 1}, timeout=5)
+                    if response.status_code == 200:
+                        executor_stats = response.json().get("executor", {})
+                        redis_client.hset("cluster_stats", cluster_id,
+                                          json.dumps({**executor_stats, "updated_at": time.time()}))
+                except requests.RequestException as e:
+                    logger.debug(f"Error polling task stats from cluster {cluster.name}: {e}")
             
             # 每5秒轮询一次
             time.sleep(5)
@@ -1049,16 +1101,262 @@ def poll_cluster_model_instances():
 
 # ====================== API路由扩展 ======================
 
+def get_cluster_controller_url(target_cluster: ClusterInfo) -> Optional[str]:
+    """获取集群控制器URL，未配置时使用第一个节点的IP和默认端口"""
+    # 如果没有指定集群控制器URL，使用默认的
+    cluster_controller_url = None
+    if hasattr(target_cluster, 'config') and isinstance(target_cluster.config, dict):
+        cluster_controller_url = target_cluster.config.get('controller_url')
+        
+    if not cluster_controller_url and target_cluster.nodes and len(target_cluster.nodes) > 0:
+        # 使用第一个节点的IP
+        node_ip = target_cluster.nodes[0].ip if hasattr(target_cluster.nodes[0], 'ip') else 'localhost'
+        # 使用正确的集群控制器端口（5002而不是5010）
+        cluster_controller_url = f"http://{node_ip}:5002"
+    return cluster_controller_url
+
+def load_cluster_by_id(cluster_id: str) -> Optional[ClusterInfo]:
+    """从Redis加载单个集群"""
+    return next((cluster for cluster in load_clusters_from_redis() if cluster.id == cluster_id), None)
+
+def get_cluster_queue_depths() -> Dict[str, int]:
+    """各集群排队中的部署数：集群控制器执行器队列（轮询线程写入）+ 中心控制器等待队列"""
+    depths = {}
+    for cluster_id, stats_json in redis_client.hgetall("cluster_stats").items():
+        try:
+            depths[cluster_id] = int(json.loads(stats_json).get("queued", 0))
+        except (ValueError, TypeError):
+            continue
+    for pending in pending_deployments.list_pending():
+        depths[pending["cluster_id"]] = depths.get(pending["cluster_id"], 0) + 1
+    return depths
+
+def save_deployment(deployment: Dict[str, Any]):
+    """将部署信息保存到Redis"""
+    deployment_key = f"deployment:{deployment['id']}"
+    redis_client.hmset(deployment_key, {k: json.dumps(v) for k, v in deployment.items()})
+    redis_client.sadd("deployments", deployment['id'])
+    redis_client.sadd(f"cluster:{deployment['cluster_id']}:deployments", deployment['id'])
+
+def forward_deployment(target_cluster: ClusterInfo, data: Dict[str, Any], deployment_id: str,
+                       allocation: Optional[GPUAllocation] = None):
+    """
+    转发部署请求到集群控制器，成功后保存部署记录
+    
+    Args:
+        target_cluster: 目标集群
+        data: 前端部署请求
+        deployment_id: 部署ID
+        allocation: 中心控制器的GPU放置结果（全局放置模式），为空时由集群控制器自行选卡
+    
+    Returns:
+        (响应字典, HTTP状态码)
+    """
+    import requests
+    cluster_controller_url = get_cluster_controller_url(target_cluster)
+    
+    # 准备要转发给集群控制器的数据
+    deploy_data = {
+        'model_name': data['modelPath'],
+        'model_type': data['backend'],
+        'gpu_count': int(data['gpuCount']),
+        'memory_required': int(data['memoryUsage']) * 1024,  # 转换为MB
+        'node_id': data.get('node'),
+        'deploy_command': data.get('deployCommand', None),
+        'reservation_id': data.get('reservation_id'),
+        'priority': data.get('priority', 'normal')
+    }
+    if allocation is not None and allocation.success:
+        # 放置结果中GPU最多的节点作为部署节点
+        node_id, gpu_ids = max(allocation.allocation.items(), key=lambda item: len(item[1]))
+        deploy_data.update({
+            'node_id': node_id,
+            'gpu_id': gpu_ids[0],
+            'gpu_ids': gpu_ids,
+            'reservation_id': allocation.reservation_id or deploy_data['reservation_id']
+        })
+    
+    # 未提供部署命令时由集群控制器生成：只有它知道实际分配的GPU和用于健康检查的端口
+    
+    logger.info(f"转发部署请求到集群控制器: {cluster_controller_url}/api/deploy, 数据: {deploy_data}")
+    
+    # 转发请求到集群控制器
+    try:
+        response = requests.post(
+            f"{cluster_controller_url}/api/deploy",
+            json=deploy_data,
+            timeout=30
+        )
+    except Exception:
+        if allocation is not None:
+            gpu_resource_manager.release_gpus(deployment_id)
+        raise
+    
+    # 检查集群控制器响应
+    if response.status_code == 200:
+        result = response.json()
+        # 创建新的模型部署实例
+        new_deployment = {
+            'id': deployment_id,
+            'modelName': data['modelName'],
+            'version': data['version'],
+            'backend': data['backend'],
+            'image': data['image'],
+            'cluster': target_cluster.name,
+            'node': deploy_data['node_id'],
+            'gpuCount': int(data['gpuCount']),
+            'memoryUsage': int(data['memoryUsage']),
+            'modelPath': data['modelPath'],
+            'description': data.get('description', ''),
+            'creator_id': data.get('creator_id', 'anonymous'),
+            'deployTime': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'status': 'pending',
+            'task_id': result.get('task_id'),
+            'cluster_id': target_cluster.id
+        }
+        if allocation is not None:
+            new_deployment['placement'] = allocation.allocation
+        
+        # 将部署信息保存到Redis
+        save_deployment(new_deployment)
+        
+        return {
+            'status': 'success',
+            'message': '模型部署请求已提交',
+            'data': {
+                'deployment_id': deployment_id,
+                'task_id': result.get('task_id'),
+                'gpu_id': result.get('gpu_id'),
+                'cluster': target_cluster.name,
+                'node': deploy_data['node_id']
+            }
+        }, 200
+    
+    # 集群控制器拒绝部署时释放预留
+    if allocation is not None:
+        gpu_resource_manager.release_gpus(deployment_id)
+    error_msg = response.json().get('message', '集群控制器响应异常')
+    return {
+        'status': 'error',
+        'message': f'部署失败: {error_msg}'
+    }, response.status_code
+
+def place_and_forward(data: Dict[str, Any], clusters: List[ClusterInfo]):
+    """
+    全局放置模式：为集群打分并在得分最高的集群内调度GPU，然后转发部署；
+    所有集群都放不下时进入等待队列，GPU释放后自动重试
+    
+    Returns:
+        (响应字典, HTTP状态码)
+    """
+    deployment_id = str(uuid.uuid4())
+    gpu_count = int(data['gpuCount'])
+    memory_required = int(data['memoryUsage']) * 1024  # 转换为MB
+    gpu_type = data.get('gpuType')
+    priority = data.get('priority', 'normal')
+    
+    target_cluster, allocation, ranked = global_placer.place(
+        clusters, deployment_id, gpu_count, memory_required, gpu_type,
+        get_cluster_queue_depths(), priority
+    )
+    if target_cluster is not None:
+        data['cluster'] = target_cluster.name
+        return forward_deployment(target_cluster, data, deployment_id, allocation)
+    
+    # 选择硬件上能容纳该部署的最高分集群排队
+    candidates = [score.cluster for score in ranked
+                  if sum(1 for node in score.cluster.nodes for gpu in node.gpus
+                         if gpu.memory_total >= memory_required) >= gpu_count]
+    if not candidates:
+        return {
+            'status': 'error',
+            'message': f'没有集群能够容纳 {gpu_count} 个 {memory_required}MB 显存的GPU'
+        }, 400
+    queue_cluster = candidates[0]
+    
+    forwarded = {}  # 分配回调中的转发结果: {'response': (响应字典, HTTP状态码)}
+    
+    def on_allocated(pending: PendingDeployment, pending_allocation: GPUAllocation):
+        cluster = load_cluster_by_id(pending.cluster_id)
+        if cluster is None:
+            gpu_resource_manager.release_gpus(pending.model_id)
+            result, status_code = {
+                'status': 'error',
+                'message': f'部署失败: 集群 {pending.cluster_id} 不存在'
+            }, 404
+        else:
+            data['cluster'] = cluster.name
+            try:
+                result, status_code = forward_deployment(cluster, data, pending.model_id, pending_allocation)
+            except Exception as e:
+                result, status_code = {
+                    'status': 'error',
+                    'message': f'部署失败: 转发到集群控制器时出错: {str(e)}'
+                }, 502
+        forwarded['response'] = (result, status_code)
+        if status_code != 200:
+            logger.error(f"排队部署 {pending.model_id} 转发失败: {result.get('message')}")
+            # 排队后才分配的部署已有记录，标记为失败
+            if redis_client.exists(f"deployment:{pending.model_id}"):
+                redis_client.hset(f"deployment:{pending.model_id}", "status", json.dumps("failed"))
+    
+    def on_expired(pending: PendingDeployment):
+        redis_client.hset(f"deployment:{pending.model_id}", "status", json.dumps("failed"))
+    
+    _, position = pending_deployments.submit(PendingDeployment(
+        model_id=deployment_id,
+        cluster_id=queue_cluster.id,
+        gpu_count=gpu_count,
+        memory_required=memory_required,
+        priority=normalize_priority(priority),
+        on_allocated=on_allocated,
+        on_expired=on_expired
+    ))
+    if position is None:
+        # 入队前的立即重试已成功放置，返回 on_allocated 中转发的结果
+        return forwarded['response']
+    
+    save_deployment({
+        'id': deployment_id,
+        'modelName': data['modelName'],
+        'version': data['version'],
+        'backend': data['backend'],
+        'image': data['image'],
+        'cluster': queue_cluster.name,
+        'node': '',
+        'gpuCount': gpu_count,
+        'memoryUsage': int(data['memoryUsage']),
+        'modelPath': data['modelPath'],
+        'description': data.get('description', ''),
+        'creator_id': data.get('creator_id', 'anonymous'),
+        'deployTime': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'status': 'queued',
+        'task_id': None,
+        'cluster_id': queue_cluster.id
+    })
+    return {
+        'status': 'success',
+        'message': f'暂无可用GPU，部署已进入集群 {queue_cluster.name} 的等待队列',
+        'data': {
+            'deployment_id': deployment_id,
+            'cluster': queue_cluster.name,
+            'queue_position': position
+        }
+    }, 202
+
 @app.route('/api/deploy', methods=['POST'])
 def deploy_model():
-    """模型部署API - 接收前端部署请求，调度GPU资源，并转发给集群控制器"""
+    """模型部署API - 接收前端部署请求，调度GPU资源，并转发给集群控制器
+    
+    未指定 cluster 时在所有集群中全局放置；指定 cluster 但未指定 node 时在该集群内放置
+    """
     try:
         # 获取部署请求数据
         data = request.json
         logger.info(f"接收到部署请求: {data}")
         
-        # 验证必要字段
-        required_fields = ['modelName', 'version', 'backend', 'cluster', 'node', 'gpuCount', 'memoryUsage', 'modelPath']
+        # 验证必要字段（cluster 和 node 可选，缺省时自动放置）
+        required_fields = ['modelName', 'version', 'backend', 'gpuCount', 'memoryUsage', 'modelPath']
         
         # 检查镜像字段 - 支持 image 或 image_id
         if 'image' not in data and 'image_id' not in data:
@@ -1078,17 +1376,19 @@ def deploy_model():
                     'message': f'缺少必要字段: {field}'
                 }), 400
         
-        # 获取集群信息
-        cluster_id = None
-        cluster_name = data['cluster']
         clusters = load_clusters_from_redis()
         
+        # 全局放置：在所有集群中选择
+        cluster_name = data.get('cluster')
+        if not cluster_name:
+            result, status_code = place_and_forward(data, clusters)
+            return jsonify(result), status_code
+        
         # 查找对应的集群
         target_cluster = None
         for cluster in clusters:
             if cluster.name == cluster_name:
                 target_cluster = cluster
-                cluster_id = cluster.id
                 break
         
         if not target_cluster:
@@ -1097,89 +1397,13 @@ def deploy_model():
                 'message': f'找不到集群: {cluster_name}'
             }), 404
         
-        # 获取集群控制器URL
-        # 如果没有指定集群控制器URL，使用默认的
-        cluster_controller_url = None
-        if hasattr(target_cluster, 'config') and isinstance(target_cluster.config, dict):
-            cluster_controller_url = target_cluster.config.get('controller_url')
-            
-        if not cluster_controller_url and target_cluster.nodes and len(target_cluster.nodes) > 0:
-            # 使用第一个节点的IP
-            node_ip = target_cluster.nodes[0].ip if hasattr(target_cluster.nodes[0], 'ip') else 'localhost'
-            # 使用正确的集群控制器端口（5002而不是5010）
-            cluster_controller_url = f"http://{node_ip}:5002"
-        
-        # 准备要转发给集群控制器的数据
-        deploy_data = {
-            'model_name': data['modelPath'],
-            'model_type': data['backend'],
-            'gpu_count': int(data['gpuCount']),
-            'memory_required': int(data['memoryUsage']) * 1024,  # 转换为MB
-            'node_id': data['node'],
-            'deploy_command': data.get('deployCommand', None)
-        }
-        
-        # 构建部署命令（如果没有提供）
-        if not deploy_data['deploy_command']:
-            # 生成一个不太可能冲突的端口，避开已经使用的端口
-            port = 6000 + int(time.time()) % 1000  # 使用6000+的端口范围
-            deploy_data['deploy_command'] = f"python backend/start_qwen_model.py --model-name \"{data['modelPath']}\" --port {port} --cluster-controller \"{cluster_controller_url}\" --gpu-count {data['gpuCount']}"
+        # 集群内放置：指定了集群但未指定节点
+        if not data.get('node'):
+            result, status_code = place_and_forward(data, [target_cluster])
+            return jsonify(result), status_code
         
-        logger.info(f"转发部署请求到集群控制器: {cluster_controller_url}/api/deploy, 数据: {deploy_data}")
-        
-        # 转发请求到集群控制器
-        import requests
-        response = requests.post(
-            f"{cluster_controller_url}/api/deploy",
-            json=deploy_data,
-            timeout=30
-        )
-        
-        # 检查集群控制器响应
-        if response.status_code == 200:
-            result = response.json()
-            # 创建新的模型部署实例
-            deployment_id = str(uuid.uuid4())
-            new_deployment = {
-                'id': deployment_id,
-                'modelName': data['modelName'],
-                'version': data['version'],
-                'backend': data['backend'],
-                'image': data['image'],
-                'cluster': data['cluster'],
-                'node': data['node'],
-                'gpuCount': int(data['gpuCount']),
-                'memoryUsage': int(data['memoryUsage']),
-                'modelPath': data['modelPath'],
-                'description': data.get('description', ''),
-                'creator_id': data.get('creator_id', 'anonymous'),
-                'deployTime': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'status': 'pending',
-                'task_id': result.get('task_id'),
-                'cluster_id': cluster_id
-            }
-            
-            # 将部署信息保存到Redis
-            deployment_key = f"deployment:{deployment_id}"
-            redis_client.hmset(deployment_key, {k: json.dumps(v) for k, v in new_deployment.items()})
-            redis_client.sadd("deployments", deployment_id)
-            redis_client.sadd(f"cluster:{cluster_id}:deployments", deployment_id)
-            
-            return jsonify({
-                'status': 'success',
-                'message': '模型部署请求已提交',
-                'data': {
-                    'deployment_id': deployment_id,
-                    'task_id': result.get('task_id'),
-                    'gpu_id': result.get('gpu_id')
-                }
-            })
-        else:
-            error_msg = response.json().get('message', '集群控制器响应异常')
-            return jsonify({
-                'status': 'error',
-                'message': f'部署失败: {error_msg}'
-            }), response.status_code
+        result, status_code = forward_deployment(target_cluster, data, str(uuid.uuid4()))
+        return jsonify(result), status_code
     except Exception as e:
         logger.error(f"处理部署请求时出错: {str(e)}")
         return jsonify({
@@ -1187,6 +1411,172 @@ def deploy_model():
             'message': f'处理部署请求时出错: {str(e)}'
         }), 500
 
+# ====================== 自动扩缩容 ======================
+
+def list_live_model_instances() -> List[Dict[str, Any]]:
+    """各集群最近一次轮询到的模型实例（含实例上报的负载指标）"""
+    instances = []
+    for cluster_id, instances_json in redis_client.hgetall("model_instances").items():
+        for instance in json.loads(instances_json):
+            instances.append({"cluster_id": cluster_id, **instance})
+    return instances
+
+def load_scaling_policies() -> Dict[str, ScalingPolicy]:
+    """从Redis加载各模型的扩缩容策略"""
+    return {model_name: ScalingPolicy.from_dict(json.loads(policy_json))
+            for model_name, policy_json in redis_client.hgetall("autoscale_policies").items()}
+
+def find_latest_deployment(model_path: str) -> Optional[Dict[str, Any]]:
+    """查找该模型最近一次成功提交的部署记录，作为扩容副本的部署参数"""
+    latest = None
+    for deployment_id in redis_client.smembers("deployments"):
+        record = {k: json.loads(v) for k, v in redis_client.hgetall(f"deployment:{deployment_id}").items()}
+        if record.get("modelPath") != model_path or record.get("status") == "failed":
+            continue
+        if latest is None or record.get("deployTime", "") > latest.get("deployTime", ""):
+            latest = record
+    return latest
+
+def scale_up_model(model_name: str, count: int) -> int:
+    """按最近一次部署的参数通过全局放置增加副本，返回已提交（含排队）的副本数"""
+    deployment = find_latest_deployment(model_name)
+    if deployment is None:
+        logger.warning(f"模型 {model_name} 没有可参考的部署记录，无法扩容")
+        return 0
+    
+    launched = 0
+    for _ in range(count):
+        data = {
+            'modelName': deployment['modelName'],
+            'version': deployment['version'],
+            'backend': deployment['backend'],
+            'image': deployment['image'],
+            'gpuCount': deployment['gpuCount'],
+            'memoryUsage': deployment['memoryUsage'],
+            'modelPath': deployment['modelPath'],
+            'description': deployment.get('description', ''),
+            'creator_id': deployment.get('creator_id', 'anonymous'),
+            'priority': 'normal'
+        }
+        result, status_code = place_and_forward(data, load_clusters_from_redis())
+        if status_code not in (200, 202):
+            logger.warning(f"模型 {model_name} 扩容失败: {result.get('message')}")
+            break
+        launched += 1
+    return launched
+
+def stop_model_instance(instance: Dict[str, Any]) -> bool:
+    """通过集群控制器停止模型实例"""
+    import requests
+    cluster = load_cluster_by_id(instance.get("cluster_id"))
+    cluster_controller_url = get_cluster_controller_url(cluster) if cluster else None
+    if not cluster_controller_url:
+        return False
+    model_id = instance["model_id"]
+    try:
+        response = requests.post(f"{cluster_controller_url}/api/models/{model_id}/stop", timeout=30)
+    except requests.RequestException as e:
+        logger.error(f"停止模型实例 {model_id} 时出错: {e}")
+        return False
+    if response.status_code != 200:
+        logger.warning(f"停止模型实例 {model_id} 失败: {response.status_code} {response.text}")
+        return False
+    
+    # 不等下一轮轮询，立即从集群的实例列表中移除，避免请求被路由到已停止的实例
+    cluster_instances = redis_client.hget("model_instances", cluster.id)
+    if cluster_instances:
+        redis_client.hset("model_instances", cluster.id, json.dumps(
+            [i for i in json.loads(cluster_instances) if i.get("model_id") != model_id]))
+    redis_client.srem("online_models", model_id)
+    redis_client.sadd("offline_models", model_id)
+    model_json = redis_client.hget("models", model_id)
+    if model_json:
+        model = json.loads(model_json)
+        model.update(status="offline", offline_at=time.time())
+        redis_client.hset("models", model_id, json.dumps(model))
+    return True
+
+def find_ready_instance(model_name: str) -> Optional[Dict[str, Any]]:
+    """模型的在线实例中处理中请求最少的一个"""
+    instances = [i for i in list_live_model_instances()
+                 if i.get("model_name") == model_name and i.get("status") == "online" and i.get("endpoint")]
+    if not instances:
+        return None
+    return min(instances, key=lambda i: (i.get("metrics") or {}).get("in_flight", 0))
+
+@app.route('/api/generate', methods=['POST'])
+def route_generate():
+    """
+    按模型名称路由推理请求（请求体需包含 model）
+    
+    模型已缩容到零时请求排队等待冷启动，实例就绪后转发；响应头 X-Cold-Start-Wait 为排队秒数
+    """
+    import requests
+    data = request.json or {}
+    model_name = data.get("model")
+    if not model_name:
+        return jsonify({"status": "error", "message": "缺少必要字段: model"}), 400
+    
+    instance, waited = find_ready_instance(model_name), 0.0
+    if instance is None:
+        policy = load_scaling_policies().get(model_name)
+        if policy is None or not policy.scale_to_zero:
+            return jsonify({"status": "error", "message": f"模型 {model_name} 没有可用实例"}), 503
+        instance, waited = cold_starts.acquire(model_name)
+        if instance is None:
+            return jsonify({"status": "error", "message": f"模型 {model_name} 冷启动失败或超时",
+                            "queue_wait": round(waited, 3)}), 503
+    
+    try:
+        response = requests.post(instance["endpoint"], json=data, timeout=300)
+    except requests.RequestException as e:
+        logger.error(f"转发推理请求到 {instance['endpoint']} 时出错: {e}")
+        return jsonify({"status": "error", "message": f"模型实例请求失败: {e}"}), 502
+    return response.content, response.status_code, {
+        "Content-Type": response.headers.get("Content-Type", "application/json"),
+        "X-Model-Instance": instance.get("model_id", ""),
+        "X-Cold-Start-Wait": f"{waited:.3f}"
+    }
+
+@app.route('/api/cold_starts', methods=['GET'])
+def get_cold_start_metrics():
+    """冷启动耗时和请求排队等待时间"""
+    return jsonify({"status": "success", "metrics": cold_starts.metrics()})
+
+@app.route('/api/autoscale', methods=['GET'])
+def get_autoscale_status():
+    """获取扩缩容策略和最近一轮决策"""
+    return jsonify({
+        "status": "success",
+        "policies": {name: policy.to_dict() for name, policy in load_scaling_policies().items()},
+        "decisions": autoscaler.status()
+    })
+
+@app.route('/api/autoscale/policies', methods=['POST'])
+def set_autoscale_policy():
+    """设置模型的扩缩容策略，model_name 为实例上报的模型名称（即部署时的 modelPath），未提供的字段使用默认值"""
+    try:
+        data = request.json or {}
+        model_name = data.get("model_name")
+        if not model_name:
+            return jsonify({"status": "error", "message": "缺少必要字段: model_name"}), 400
+        policy = ScalingPolicy.from_dict(data)
+        if policy.min_replicas < 0 or policy.max_replicas < max(policy.min_replicas, 1):
+            return jsonify({"status": "error", "message": "副本数上下限无效"}), 400
+        redis_client.hset("autoscale_policies", model_name, json.dumps(policy.to_dict()))
+        return jsonify({"status": "success", "model_name": model_name, "policy": policy.to_dict()})
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"策略参数无效: {e}"}), 400
+
+@app.route('/api/autoscale/policies', methods=['DELETE'])
+def delete_autoscale_policy():
+    """删除模型的扩缩容策略（?model_name=...），已有副本保持不变"""
+    model_name = request.args.get("model_name")
+    if not model_name:
+        return jsonify({"status": "error", "message": "缺少参数: model_name"}), 400
+    removed = redis_client.hdel("autoscale_policies", model_name)
+    return jsonify({"status": "success", "removed": bool(removed)})
+
 @app.route('/api/model-instances', methods=['GET'])
 def get_model_instances():
     """获取所有模型实例"""
@@ -1255,17 +1645,74 @@ def get_node_model_instances(node_id):
         logger.error(f"Error getting model instances for node {node_id}: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/reservations/<reservation_id>', methods=['GET'])
+def get_reservation(reservation_id):
+    """获取GPU预留记录"""
+    record = reservation_ledger.get(reservation_id)
+    if record is None:
+        return jsonify({"status": "error", "message": f"预留 {reservation_id} 不存在或已过期"}), 404
+    return jsonify({"status": "success", "reservation": record})
+
+@app.route('/api/reservations/<reservation_id>/commit', methods=['POST'])
+def commit_reservation(reservation_id):
+    """集群控制器确认实例已启动，将临时预留转为长期占用"""
+    try:
+        data = request.json or {}
+        if reservation_ledger.commit(reservation_id, metadata=data.get("metadata")):
+            return jsonify({"status": "success", "message": f"预留 {reservation_id} 已确认"})
+        return jsonify({"status": "error", "message": f"预留 {reservation_id} 不存在或已过期"}), 409
+    except Exception as e:
+        logger.error(f"确认预留 {reservation_id} 时出错: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/api/reservations/<reservation_id>/extend', methods=['POST'])
+def extend_reservation(reservation_id):
+    """集群控制器在部署排队和加载期间为临时预留续期"""
+    try:
+        if reservation_ledger.extend(reservation_id):
+            return jsonify({"status": "success", "message": f"预留 {reservation_id} 已续期"})
+        return jsonify({"status": "error", "message": f"预留 {reservation_id} 不存在或已过期"}), 409
+    except Exception as e:
+        logger.error(f"延长预留 {reservation_id} 时出错: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/api/reservations/<reservation_id>/release', methods=['POST'])
+def release_reservation(reservation_id):
+    """释放GPU预留（部署失败或实例停止）"""
+    try:
+        # 中心控制器上有对应的分配记录时一并移除，并唤醒等待GPU的排队部署
+        model_id = next((model_id for model_id, allocation in list(gpu_resource_manager.allocations.items())
+                         if allocation.reservation_id == reservation_id), None)
+        if model_id is not None:
+            released = gpu_resource_manager.release_gpus(model_id)
+        else:
+            released = reservation_ledger.release(reservation_id)
+        return jsonify({"status": "success", "released": released})
+    except Exception as e:
+        logger.error(f"释放预留 {reservation_id} 时出错: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 # ====================== 主函数 ======================
 
 if __name__ == "__main__":
     # 从环境变量获取端口
     port = int(os.environ.get("PORT", 5001))
+    debug = True
     
-    # 启动模型实例轮询线程
-    import threading
-    poll_thread = threading.Thread(target=poll_cluster_model_instances)
-    poll_thread.daemon = True
-    poll_thread.start()
-    logger.info("Started model instances polling thread")
+    # debug模式下Werkzeug重载器的父进程只负责监视文件并重启子进程，后台线程只在实际服务请求的子进程中启动，
+    # 否则两个进程中的自动扩缩容会基于同一份Redis状态重复扩缩
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        # 启动模型实例轮询线程
+        import threading
+        poll_thread = threading.Thread(target=poll_cluster_model_instances)
+        poll_thread.daemon = True
+        poll_thread.start()
+        logger.info("Started model instances polling thread")
+        
+        # 启动排队部署的重试线程
+        pending_deployments.start()
+        
+        # 启动自动扩缩容
+        autoscaler.start()
     
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host='0.0.0.0', port=port, debug=debug)
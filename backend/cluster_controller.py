@@ -12,6 +12,7 @@ import logging
 import argparse
 import requests
 import platform
+import signal
 import subprocess
 import threading
 from typing import Dict, List, Any, Optional
@@ -23,56 +24,115 @@ from ClusterRegister import (
     ClusterInfo, NodeInfo, GPUInfo, GPUType, 
     ResourceRegistry, AppleGPUAdapter, NvidiaGPUAdapter
 )
+from deployment_executor import DeploymentExecutor
+from hardware_facts import get_host_facts
+from standby_pool import StandbyPool, StandbyInstance
+from task_store import TaskStore
 
 # GPU资源管理
 class GPUResourceManager:
-    """GPU资源管理器，负责跟踪GPU使用情况"""
+    """GPU资源管理器，负责跟踪GPU使用情况
+    
+    一张GPU可以同时承载多个实例（租户），只要各实例预留的显存之和不超过显存总量；
+    memory_required 为0的分配表示独占整张GPU
+    """
     
     def __init__(self):
-        self.gpu_usage = {}  # gpu_id -> {model_id, memory_used, status}
-        
+        self.gpu_usage = {}  # gpu_id -> {model_id, memory_used, status, tenants, ...}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _refresh(usage):
+        """根据租户重新计算已用显存和状态: free / shared（还有剩余显存）/ allocated（已满或独占）"""
+        tenants = usage["tenants"]
+        usage["memory_used"] = sum(t["memory"] for t in tenants.values())
+        usage["model_id"] = next(iter(tenants), None)
+        if not tenants:
+            usage["status"] = "free"
+        elif any(t["exclusive"] for t in tenants.values()) or usage["memory_used"] >= usage.get("memory_total", 0):
+            usage["status"] = "allocated"
+        else:
+            usage["status"] = "shared"
+    
+    def _fits(self, usage, memory_required):
+        if usage["status"] == "allocated":
+            return False
+        if memory_required <= 0:
+            return not usage["tenants"]
+        return usage.get("memory_total", 0) - usage["memory_used"] >= memory_required
+    
     def allocate_gpu(self, model_id, gpu_id, memory_required=0):
-        """分配GPU资源给模型"""
-        if gpu_id not in self.gpu_usage:
-            self.gpu_usage[gpu_id] = {
-                "model_id": model_id,
-                "memory_used": memory_required,
-                "status": "allocated",
-                "allocated_time": time.time()
-            }
-            return True
-        elif self.gpu_usage[gpu_id]["status"] == "free":
-            self.gpu_usage[gpu_id] = {
-                "model_id": model_id,
-                "memory_used": memory_required,
-                "status": "allocated",
+        """分配GPU资源给模型，剩余显存足够时可以与其他实例共享同一张GPU"""
+        with self._lock:
+            if gpu_id not in self.gpu_usage:
+                # 未注册的GPU（显存未知）只能独占使用
+                self.gpu_usage[gpu_id] = {"memory_total": 0, "tenants": {}, "memory_used": 0, "status": "free"}
+                memory_required = 0
+            usage = self.gpu_usage[gpu_id]
+            if model_id in usage["tenants"] or not self._fits(usage, memory_required):
+                return False
+            usage["tenants"][model_id] = {
+                "memory": memory_required if memory_required > 0 else usage.get("memory_total", 0),
+                "exclusive": memory_required <= 0,
                 "allocated_time": time.time()
             }
+            usage["allocated_time"] = usage["tenants"][model_id]["allocated_time"]
+            self._refresh(usage)
             return True
-        return False
     
-    def release_gpu(self, gpu_id):
-        """释放GPU资源"""
-        if gpu_id in self.gpu_usage:
-            self.gpu_usage[gpu_id]["status"] = "free"
-            self.gpu_usage[gpu_id]["model_id"] = None
-            self.gpu_usage[gpu_id]["memory_used"] = 0
+    def release_gpu(self, gpu_id, model_id=None):
+        """释放GPU资源；指定 model_id 时只移除该实例，否则移除GPU上的所有实例"""
+        with self._lock:
+            if gpu_id not in self.gpu_usage:
+                return False
+            usage = self.gpu_usage[gpu_id]
+            if model_id is None:
+                usage["tenants"].clear()
+            elif usage["tenants"].pop(model_id, None) is None:
+                return False
+            self._refresh(usage)
             return True
-        return False
+    
+    def release_model(self, model_id):
+        """释放模型在所有GPU上的占用，返回释放的GPU列表"""
+        released = [gpu_id for gpu_id, usage in list(self.gpu_usage.items()) if model_id in usage["tenants"]]
+        for gpu_id in released:
+            self.release_gpu(gpu_id, model_id)
+        return released
+    
+    def model_gpus(self, model_id):
+        """模型当前占用的GPU列表"""
+        with self._lock:
+            return [gpu_id for gpu_id, usage in self.gpu_usage.items() if model_id in usage["tenants"]]
     
     def get_gpu_status(self, gpu_id):
         """获取GPU使用状态"""
         return self.gpu_usage.get(gpu_id, {"status": "unknown"})
     
-    def find_available_gpu(self, memory_required=0, gpu_type=None):
-        """查找可用的GPU"""
+    def can_allocate(self, gpu_id, memory_required=0):
+        """GPU当前是否还能容纳 memory_required MB 的实例"""
+        usage = self.gpu_usage.get(gpu_id)
+        return usage is not None and self._fits(usage, memory_required)
+    
+    def find_available_gpu(self, memory_required=0, gpu_type=None, node_id=None, exclude=()):
+        """
+        查找可用的GPU
+        
+        memory_required 为0时只返回空闲GPU；否则在剩余显存足够的GPU中选择剩余最少的（best-fit），
+        让小模型集中在已有实例的GPU上，保留整张空闲GPU给大模型
+        """
+        candidates = []
         for gpu_id, usage in self.gpu_usage.items():
-            if usage["status"] == "free" and usage.get("memory_total", 0) >= memory_required:
-                if gpu_type is None or usage.get("gpu_type") == gpu_type:
-                    return gpu_id
-        return None
+            if gpu_id in exclude or not self._fits(usage, memory_required):
+                continue
+            if gpu_type is not None and usage.get("gpu_type") != gpu_type:
+                continue
+            if node_id is not None and usage.get("node_id") not in (None, node_id):
+                continue
+            candidates.append((usage.get("memory_total", 0) - usage["memory_used"], gpu_id))
+        return min(candidates)[1] if candidates else None
     
-    def register_gpu(self, gpu_id, gpu_info):
+    def register_gpu(self, gpu_id, gpu_info, node_id=None):
         """注册GPU到资源管理器"""
         if gpu_id not in self.gpu_usage:
             self.gpu_usage[gpu_id] = {
@@ -81,14 +141,18 @@ class GPUResourceManager:
                 "status": "free",
                 "memory_total": gpu_info.memory_total,
                 "gpu_type": gpu_info.gpu_type.value,
-                "gpu_name": gpu_info.name
+                "gpu_name": gpu_info.name,
+                "node_id": node_id,
+                "tenants": {}
             }
             return True
         return False
     
     def get_all_gpus(self):
-        """获取所有GPU信息"""
-        return self.gpu_usage
+        """获取所有GPU信息（含每张GPU上的实例及其显存预留）"""
+        with self._lock:
+            return {gpu_id: {**usage, "tenants": {m: dict(t) for m, t in usage["tenants"].items()}}
+                    for gpu_id, usage in self.gpu_usage.items()}
 
 # 配置日志
 def setup_logging(log_path=None):
@@ -189,52 +253,22 @@ def discover_local_resources(adapter_type: str) -> List[NodeInfo]:
         # 将GPU资源注册到GPU资源管理器
         for gpu in gpus:
             logger.info(f"Registering GPU {gpu.id} ({gpu.name}) to resource manager")
-            gpu_manager.register_gpu(gpu.id, gpu)
-        
-        # 获取系统信息
-        node.metadata["os"] = platform.system()
-        node.metadata["os_version"] = platform.version()
-        node.metadata["hostname"] = platform.node()
+            gpu_manager.register_gpu(gpu.id, gpu, node.id)
         
-        # 获取CPU信息
-        if platform.system() == "Darwin":  # macOS
-            try:
-                # 获取CPU核心数
-                cmd = "sysctl -n hw.ncpu"
-                cpu_cores = subprocess.check_output(cmd, shell=True).decode().strip()
-                node.metadata["cpu_cores"] = cpu_cores
-                
-                # 获取CPU型号
-                cmd = "sysctl -n machdep.cpu.brand_string"
-                cpu_model = subprocess.check_output(cmd, shell=True).decode().strip()
-                node.metadata["cpu_model"] = cpu_model
-                
-                # 获取内存大小
-                cmd = "sysctl -n hw.memsize"
-                memory = int(subprocess.check_output(cmd, shell=True).decode().strip())
-                node.metadata["memory_total"] = memory // (1024 * 1024)  # 转换为MB
-                
-            except Exception as e:
-                logger.error(f"Error getting system info: {e}")
-        elif platform.system() == "Linux":  # Linux
-            try:
-                # 获取CPU核心数
-                cmd = "nproc"
-                cpu_cores = subprocess.check_output(cmd, shell=True).decode().strip()
-                node.metadata["cpu_cores"] = cpu_cores
-                
-                # 获取CPU型号
-                cmd = "cat /proc/cpuinfo | grep 'model name' | head -1 | cut -d':' -f2"
-                cpu_model = subprocess.check_output(cmd, shell=True).decode().strip()
-                node.metadata["cpu_model"] = cpu_model
-                
-                # 获取内存大小
-                cmd = "grep MemTotal /proc/meminfo | awk '{print $2}'"
-                memory_kb = int(subprocess.check_output(cmd, shell=True).decode().strip())
-                node.metadata["memory_total"] = memory_kb // 1024  # 转换为MB
-                
-            except Exception as e:
-                logger.error(f"Error getting system info on Linux: {e}")
+        # 获取系统信息（静态信息带磁盘缓存，重复发现时无需再次调用系统命令）
+        try:
+            facts = get_host_facts(include_dynamic=False)
+            node.metadata["os"] = facts.get("os", platform.system())
+            node.metadata["os_version"] = facts.get("os_version", platform.version())
+            node.metadata["hostname"] = facts.get("hostname", platform.node())
+            if facts.get("cpu_cores"):
+                node.metadata["cpu_cores"] = str(facts["cpu_cores"])
+            if facts.get("cpu_model"):
+                node.metadata["cpu_model"] = facts["cpu_model"]
+            if facts.get("memory_total"):
+                node.metadata["memory_total"] = facts["memory_total"]  # MB
+        except Exception as e:
+            logger.error(f"Error getting system info: {e}")
         
         logger.info(f"Discovered node: {node.name} with {len(node.gpus)} GPUs")
         
@@ -267,6 +301,34 @@ def register_with_center_controller(center_url: str, cluster_id: str, node_info:
         logger.error(f"Error registering with center controller: {e}")
         return False
 
+def notify_reservation(reservation_id: Optional[str], action: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    通知中心控制器续期、确认或释放GPU预留
+    
+    Args:
+        reservation_id: 预留ID，为空时不做任何操作
+        action: "extend"、"commit" 或 "release"
+        metadata: 附加信息（模型ID、端点等）
+    
+    Returns:
+        bool: 中心控制器是否执行成功；没有预留时返回True
+    """
+    if not reservation_id:
+        return True
+    center_url = cluster_info.get("center_controller_url")
+    if not center_url:
+        logger.warning(f"未配置中心控制器地址，无法{action}预留 {reservation_id}")
+        return False
+    try:
+        response = requests.post(f"{center_url}/api/reservations/{reservation_id}/{action}",
+                                 json={"metadata": metadata or {}}, timeout=5)
+        if response.status_code == 200:
+            return True
+        logger.warning(f"预留 {reservation_id} {action} 失败: {response.status_code} {response.text}")
+    except Exception as e:
+        logger.error(f"通知中心控制器预留 {reservation_id} {action} 时出错: {e}")
+    return False
+
 def node_to_dict(node: NodeInfo) -> Dict[str, Any]:
     """将NodeInfo对象转换为字典"""
     node_dict = {
@@ -319,8 +381,8 @@ cluster_info = {
     "nodes": []
 }
 
-# 部署任务队列
-deployment_tasks = []
+# 部署任务执行器（有界线程池 + 优先级队列），任务在执行器中按TTL保留
+deployment_executor = DeploymentExecutor(lambda task: process_deployment_task(task))
 
 # 模型实例列表
 model_instances = []
@@ -331,6 +393,18 @@ gpu_manager = GPUResourceManager()
 # 模型实例端点列表
 model_endpoints = []
 
+# 模型实例进程 model_id -> subprocess.Popen，用于停止实例
+model_processes = {}
+
+# 预热备用实例池（在main中根据配置创建）
+standby_pool: Optional[StandbyPool] = None
+
+# 等待模型实例加载完成（健康检查通过或注册上线）的最长时间(秒)
+model_load_timeout = float(os.environ.get("MODEL_LOAD_TIMEOUT", 600))
+
+# 模型实例进程的输出日志目录，每个实例一个 <model_id>.log
+MODEL_LOG_DIR = os.environ.get("MODEL_LOG_DIR", "/tmp/cluster_logs/models")
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
@@ -352,28 +426,46 @@ def deploy_model():
         if not data or 'model_name' not in data:
             return jsonify({"status": "error", "message": "Missing required field: model_name"}), 400
         
-        # 生成任务ID
+        # 生成任务ID和模型ID（提交时即以模型ID预留GPU）
         task_id = str(uuid.uuid4())
+        model_id = str(uuid.uuid4())
         
         # 检查是否指定GPU ID或GPU数量
         gpu_id = data.get("gpu_id", None)
+        
+        # 未指定GPU时优先认领节点、GPU数量、类型和显存都满足请求的预热备用实例，直接注册，无需冷启动；
+        # 没有匹配的备用实例时按正常流程冷启动
+        if not gpu_id and standby_pool:
+            standby = standby_pool.claim(data["model_name"], lambda s: standby_matches_request(s, data))
+            if standby:
+                task = register_standby_instance(standby, task_id, data)
+                return jsonify({
+                    "status": "success",
+                    "message": f"Model {data['model_name']} served by warm standby instance",
+                    "task_id": task_id,
+                    "gpu_id": task["gpu_id"],
+                    "queue_position": None,
+                    "standby": True
+                })
         gpu_count = data.get("gpu_count", 1)  # 默认使用一个GPU
+        memory_required = int(data.get("memory_required", 0) or 0)  # 每张GPU的显存预留(MB)，0表示独占
         
-        # 如果指定了特定GPU ID
+        # 如果指定了特定GPU ID（中心控制器全局放置时会给出完整的 gpu_ids）
         if gpu_id:
-            # 检查指定的GPU是否存在且可用
-            gpu_status = gpu_manager.get_gpu_status(gpu_id)
-            if gpu_status["status"] == "unknown":
-                return jsonify({"status": "error", "message": f"GPU {gpu_id} not found"}), 404
-            elif gpu_status["status"] != "free":
-                return jsonify({
-                    "status": "error", 
-                    "message": f"GPU {gpu_id} is not available, current status: {gpu_status['status']}"
-                }), 400
-            gpu_ids = [gpu_id]  # 已指定的GPU ID
+            gpu_ids = data.get("gpu_ids") or [gpu_id]
+            for requested_gpu in gpu_ids:
+                # 检查指定的GPU是否存在且剩余显存足够
+                gpu_status = gpu_manager.get_gpu_status(requested_gpu)
+                if gpu_status["status"] == "unknown":
+                    return jsonify({"status": "error", "message": f"GPU {requested_gpu} not found"}), 404
+                elif not gpu_manager.can_allocate(requested_gpu, memory_required):
+                    return jsonify({
+                        "status": "error", 
+                        "message": f"GPU {requested_gpu} is not available, current status: {gpu_status['status']}, "
+                                   f"memory used: {gpu_status.get('memory_used', 0)}/{gpu_status.get('memory_total', 0)}MB"
+                    }), 400
         else:
             # 根据GPU数量自动分配GPU
-            memory_required = data.get("memory_required", 0)
             gpu_type = data.get("gpu_type", None)
             node_id = data.get("node_id", None)  # 指定节点ID
             
@@ -382,42 +474,48 @@ def deploy_model():
             # 分配多个GPU
             gpu_ids = []
             for _ in range(int(gpu_count)):
-                available_gpu = gpu_manager.find_available_gpu(memory_required, gpu_type, node_id)
+                available_gpu = gpu_manager.find_available_gpu(memory_required, gpu_type, node_id, exclude=gpu_ids)
                 if available_gpu:
                     gpu_ids.append(available_gpu)
                     logger.info(f"分配到GPU: {available_gpu}")
                 else:
-                    # 如果找不到足够的GPU，释放已分配的GPU
-                    for g_id in gpu_ids:
-                        gpu_manager.release_gpu(g_id)
                     return jsonify({"status": "error", "message": f"无法分配{gpu_count}个GPU，只找到{len(gpu_ids)}个可用GPU"}), 400
             
             # 使用第一个GPU作为主要GPU
             gpu_id = gpu_ids[0] if gpu_ids else None
         
+        # 提交时立即预留GPU，排队中的任务不会选中同一张GPU；任务失败或实例停止时释放
+        for reserved_gpu in gpu_ids:
+            if not gpu_manager.allocate_gpu(model_id, reserved_gpu, memory_required):
+                gpu_manager.release_model(model_id)
+                return jsonify({"status": "error", "message": f"GPU {reserved_gpu} 已被其他任务占用"}), 409
+        
         # 创建部署任务
         task = {
             "task_id": task_id,
+            "model_id": model_id,
             "model_name": data["model_name"],
             "model_type": data.get("model_type", "transformers"),
             "gpu_id": gpu_id,
+            "gpu_ids": gpu_ids,
+            "node_id": data.get("node_id"),
+            "memory_required": memory_required,
+            "reservation_id": data.get("reservation_id"),
             "status": "pending",
             "created_at": time.time(),
             "updated_at": time.time(),
             "result": None
         }
         
-        # 添加到任务队列
-        deployment_tasks.append(task)
-        
-        # 启动单独的线程处理部署任务
-        threading.Thread(target=process_deployment_task, args=(task,)).start()
+        # 提交到部署执行器，按优先级排队
+        queue_position = deployment_executor.submit(task, data.get("priority", "normal"))
         
         return jsonify({
             "status": "success",
             "message": f"Deployment task created for model {data['model_name']} on GPU {gpu_id}",
             "task_id": task_id,
-            "gpu_id": gpu_id
+            "gpu_id": gpu_id,
+            "queue_position": queue_position
         })
     except Exception as e:
         logger.error(f"Error deploying model: {e}")
@@ -425,21 +523,32 @@ def deploy_model():
 
 @app.route('/api/tasks', methods=['GET'])
 def get_tasks():
-    """获取任务列表"""
+    """获取任务列表，支持 limit / cursor / status 参数分页过滤"""
+    try:
+        limit = min(int(request.args.get("limit", 100)), 1000)
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit必须是整数"}), 400
+    cursor = request.args.get("cursor")
+    status = request.args.get("status")
+    statuses = [s.strip() for s in status.split(",") if s.strip()] if status else None
+    
+    tasks, next_cursor = deployment_executor.list_tasks(limit=limit, cursor=cursor, statuses=statuses)
     return jsonify({
         "status": "success",
-        "tasks": deployment_tasks
+        "tasks": tasks,
+        "next_cursor": next_cursor,
+        "executor": deployment_executor.stats()
     })
 
 @app.route('/api/tasks/<task_id>', methods=['GET'])
 def get_task(task_id):
     """获取特定任务的状态"""
-    for task in deployment_tasks:
-        if task["task_id"] == task_id:
-            return jsonify({
-                "status": "success",
-                "task": task
-            })
+    task = deployment_executor.get_task(task_id)
+    if task:
+        return jsonify({
+            "status": "success",
+            "task": task
+        })
     
     return jsonify({"status": "error", "message": "任务不存在"}), 404
 
@@ -463,6 +572,43 @@ def get_model(model_id):
     
     return jsonify({"status": "error", "message": "模型不存在"}), 404
 
+@app.route('/api/models/<model_id>/stop', methods=['POST'])
+def stop_model(model_id):
+    """停止模型实例：结束进程，释放GPU和中心控制器上的预留"""
+    try:
+        model = next((m for m in model_instances if m["model_id"] == model_id), None)
+        if model is None:
+            return jsonify({"status": "error", "message": "模型不存在"}), 404
+        
+        process = model_processes.pop(model_id, None)
+        if process is not None:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        elif model.get("process_id"):
+            try:
+                os.kill(model["process_id"], signal.SIGTERM)
+            except OSError as e:
+                logger.warning(f"结束模型进程 {model['process_id']} 失败: {e}")
+        
+        gpu_manager.release_model(model_id)
+        notify_reservation(model.get("reservation_id"), "release", {"model_id": model_id})
+        model_instances.remove(model)
+        
+        logger.info(f"模型实例已停止: {model['model_name']} (ID: {model_id})")
+        return jsonify({
+            "status": "success",
+            "message": "模型实例已停止",
+            "model_id": model_id,
+            "timestamp": time.time()
+        })
+    except Exception as e:
+        logger.error(f"停止模型实例时出错: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/api/models', methods=['POST'])
 def register_model():
     """注册模型实例"""
@@ -477,10 +623,10 @@ def register_model():
             if field not in data:
                 return jsonify({"status": "error", "message": f"缺少必要字段: {field}"}), 400
         
-        # 检查模型ID是否已存在
-        for model in model_instances:
-            if model["model_id"] == data["model_id"]:
-                return jsonify({"status": "error", "message": "模型ID已存在"}), 400
+        # 检查模型ID是否已存在；部署任务创建的启动中记录由实例注册补全
+        existing = next((m for m in model_instances if m["model_id"] == data["model_id"]), None)
+        if existing is not None and existing.get("status") != "starting":
+            return jsonify({"status": "error", "message": "模型ID已存在"}), 400
         
         # 添加时间戳和状态
         model_data = {
@@ -489,8 +635,12 @@ def register_model():
             "status": "online"
         }
         
-        # 添加到模型实例列表
-        model_instances.append(model_data)
+        # 添加到模型实例列表（保留启动中记录的进程、GPU和预留等本地字段）
+        if existing is not None:
+            existing.update(model_data)
+            model_data = existing
+        else:
+            model_instances.append(model_data)
         
         # 如果模型端点不在列表中，添加到端点列表
         if data["endpoint"] not in model_endpoints:
@@ -576,9 +726,9 @@ def allocate_gpu(gpu_id):
         model_id = data['model_id']
         memory_required = data.get('memory_required', 0)
         
-        # 检查GPU是否可用
+        # 检查GPU剩余显存是否足够
         gpu_status = gpu_manager.get_gpu_status(gpu_id)
-        if gpu_status["status"] != "free":
+        if not gpu_manager.can_allocate(gpu_id, memory_required):
             return jsonify({
                 "status": "error", 
                 "message": f"GPU {gpu_id} is not available, current status: {gpu_status['status']}"
@@ -602,10 +752,11 @@ def allocate_gpu(gpu_id):
 
 @app.route('/api/gpus/<gpu_id>/release', methods=['POST'])
 def release_gpu(gpu_id):
-    """释放GPU资源"""
+    """释放GPU资源（请求体可指定 model_id，只移除该实例的占用）"""
     try:
         # 释放GPU
-        success = gpu_manager.release_gpu(gpu_id)
+        data = request.get_json(silent=True) or {}
+        success = gpu_manager.release_gpu(gpu_id, data.get("model_id"))
         if not success:
             return jsonify({"status": "error", "message": f"Failed to release GPU {gpu_id}"}), 500
             
@@ -619,8 +770,38 @@ def release_gpu(gpu_id):
         logger.error(f"Error releasing GPU: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def wait_for_instance_ready(model_id, port, process, timeout):
+    """
+    等待模型实例加载完成
+    
+    实例在权重加载完成后才开始监听端口，健康检查通过或实例向集群控制器注册上线即视为就绪。
+    
+    Returns:
+        None表示就绪，否则返回失败原因
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return f"模型进程已退出，返回码 {process.returncode}"
+        instance = next((m for m in model_instances if m["model_id"] == model_id), None)
+        if instance is not None and instance.get("status") == "online":
+            return None
+        try:
+            if requests.get(f"http://localhost:{port}/api/health", timeout=2).status_code == 200:
+                return None
+        except requests.RequestException:
+            pass
+        time.sleep(2)
+    return f"模型在 {timeout:.0f} 秒内未完成加载"
+
 def process_deployment_task(task):
-    """处理部署任务"""
+    """
+    处理部署任务
+    
+    在模型实例就绪或加载超时后才返回，部署执行器的工作线程和节点并发名额在整个加载过程中保持占用
+    """
+    model_id = task.get("model_id") or str(uuid.uuid4())
+    process = None
     try:
         task_id = task["task_id"]
         model_name = task["model_name"]
@@ -643,20 +824,20 @@ def process_deployment_task(task):
         task["status"] = "processing"
         task["started_at"] = time.time()
         
-        # 生成模型ID
-        model_id = str(uuid.uuid4())
-        
-        # 分配所有GPU给模型
+        # 分配所有GPU给模型（按显存预留，剩余显存足够的GPU可与其他实例共享）；提交时已预留的GPU直接使用
+        memory_required = int(task.get("memory_required", 0) or 0)
+        reserved_gpus = set(gpu_manager.model_gpus(model_id))
         allocated_gpus = []
         for gpu_id in gpu_ids:
-            success = gpu_manager.allocate_gpu(model_id, gpu_id)
+            if gpu_id in reserved_gpus:
+                allocated_gpus.append(gpu_id)
+                continue
+            success = gpu_manager.allocate_gpu(model_id, gpu_id, memory_required)
             if success:
                 allocated_gpus.append(gpu_id)
-                logger.info(f"GPU {gpu_id} 分配给模型 {model_id} 成功")
+                logger.info(f"GPU {gpu_id} 分配给模型 {model_id} 成功" +
+                            (f"，预留显存 {memory_required}MB" if memory_required else "（独占）"))
             else:
-                # 如果有一个GPU分配失败，释放已分配的GPU
-                for allocated_gpu in allocated_gpus:
-                    gpu_manager.release_gpu(allocated_gpu)
                 raise Exception(f"Failed to allocate GPU {gpu_id} for model {model_id}")
         
         # 使用第一个GPU作为主要GPU
@@ -671,25 +852,42 @@ def process_deployment_task(task):
         else:
             # 构建启动命令，包含所有GPU IDs
             gpu_args = ",".join(allocated_gpus)
-            cmd = f"python start_qwen_model.py --model-name \"{model_name}\" --port {port} --cluster-controller \"http://localhost:{cluster_info.get('port', 5010)}\" --gpu-ids {gpu_args}"
+            cmd = f"python start_qwen_model.py --model-name \"{model_name}\" --port {port} --cluster-controller \"http://localhost:{cluster_info.get('port', 5010)}\" --gpu-id {gpu_args}"
+        
+        # 让实例以集群控制器分配的模型ID上报，实例信息轮询才能对应到这条记录
+        if "start_qwen_model.py" in cmd and "--model-id" not in cmd:
+            cmd = f"{cmd} --model-id {model_id}"
+        if "start_qwen_model.py" in cmd and "--gpu-id" not in cmd:
+            cmd = f"{cmd} --gpu-id {','.join(allocated_gpus)}"
+        if "start_qwen_model.py" in cmd and memory_required and "--memory-required" not in cmd:
+            cmd = f"{cmd} --memory-required {memory_required}"
+        
+        # 共享GPU时通过环境变量把显存上限传给实例进程，按比例限制框架的显存占用
+        env = dict(os.environ)
+        if memory_required:
+            memory_totals = [gpu_manager.get_gpu_status(g).get("memory_total", 0) for g in allocated_gpus]
+            env["GPU_MEMORY_LIMIT_MB"] = str(memory_required)
+            if min(memory_totals) > 0:
+                env["GPU_MEMORY_FRACTION"] = f"{min(memory_required / min(memory_totals), 1.0):.4f}"
         
         logger.info(f"启动模型实例: {cmd}")
         
         # 在实际环境中执行部署命令
         try:
-            # 使用subprocess执行命令，非阻塞模式
+            # 使用subprocess执行命令，非阻塞模式；输出写入日志文件，避免管道写满阻塞加载中的实例
             import subprocess
-            process = subprocess.Popen(
-                cmd, 
-                shell=True, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE
-            )
-            logger.info(f"模型部署进程启动，PID: {process.pid}")
+            os.makedirs(MODEL_LOG_DIR, exist_ok=True)
+            log_path = os.path.join(MODEL_LOG_DIR, f"{model_id}.log")
+            with open(log_path, "ab") as log_file:
+                process = subprocess.Popen(
+                    cmd, 
+                    shell=True, 
+                    stdout=log_file, 
+                    stderr=subprocess.STDOUT,
+                    env=env
+                )
+            logger.info(f"模型部署进程启动，PID: {process.pid}，输出日志: {log_path}")
         except Exception as e:
-            # 如果启动失败，释放所有GPU
-            for gpu_id in allocated_gpus:
-                gpu_manager.release_gpu(gpu_id)
             raise Exception(f"Failed to start model process: {e}")
         
         # 创建模型实例记录
@@ -699,15 +897,30 @@ def process_deployment_task(task):
             "model_type": model_type,
             "gpu_ids": allocated_gpus,  # 所有分配的GPU
             "primary_gpu": primary_gpu,  # 主要GPU
+            "memory_required": memory_required,  # 每张GPU的显存预留(MB)，0表示独占
             "endpoint": f"http://localhost:{port}/api/generate",
             "status": "starting",  # 初始状态为启动中
             "created_at": time.time(),
             "node_id": task.get("node_id") or (cluster_info["nodes"][0]["id"] if cluster_info.get("nodes") else None),
-            "process_id": process.pid
+            "process_id": process.pid,
+            "task_id": task_id,
+            "reservation_id": task.get("reservation_id")
         }
         
         # 添加到模型实例列表
         model_instances.append(model_instance)
+        model_processes[model_id] = process
+        
+        # 等待实例加载完成，期间一直占用部署执行器的并发名额
+        failure = wait_for_instance_ready(model_id, port, process, model_load_timeout)
+        if failure:
+            raise Exception(failure)
+        
+        # 实例已就绪，确认中心控制器上的GPU预留；确认失败说明预留已失效，GPU可能已分给其他部署
+        if not notify_reservation(task.get("reservation_id"), "commit",
+                                  {"model_id": model_id, "endpoint": model_instance["endpoint"]}):
+            raise Exception(f"确认GPU预留 {task.get('reservation_id')} 失败，预留可能已过期")
+        model_instance["status"] = "online"
         
         # 更新任务结果
         task["result"] = {
@@ -720,17 +933,160 @@ def process_deployment_task(task):
         # 更新任务状态为完成
         task["status"] = "completed"
         task["completed_at"] = time.time()
-        logger.info(f"部署任务 {task_id} 完成, 模型实例已启动")
+        logger.info(f"部署任务 {task_id} 完成, 模型实例已就绪")
     except Exception as e:
         logger.error(f"处理部署任务 {task['task_id']} 时出错: {e}")
         task["status"] = "failed"
         task["error"] = str(e)
+        notify_reservation(task.get("reservation_id"), "release")
         
-        # 如果失败，释放GPU资源
-        if "gpu_id" in task:
-            gpu_manager.release_gpu(task["gpu_id"])
+        # 结束未能就绪的实例进程并移除其记录
+        if process is not None:
+            model_processes.pop(model_id, None)
+            if process.poll() is None:
+                process.kill()
+            model_instances[:] = [m for m in model_instances if m["model_id"] != model_id]
+        
+        # 如果失败，释放该实例占用的GPU资源（不影响共享GPU上的其他实例）
+        gpu_manager.release_model(model_id)
         task["failed_at"] = time.time()
 
+# ====================== 预热备用实例 ======================
+
+def find_free_port() -> int:
+    """获取一个当前未被占用的本地端口"""
+    import socket
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+def launch_standby(standby: StandbyInstance) -> bool:
+    """为备用实例分配GPU并以 --standby 模式启动模型进程（不注册）"""
+    gpu_count = int(standby.extra.get("gpu_count", 1))
+    gpu_type = standby.extra.get("gpu_type")
+    
+    for _ in range(gpu_count):
+        available_gpu = gpu_manager.find_available_gpu(standby.memory_required, gpu_type, exclude=standby.gpu_ids)
+        if not available_gpu or not gpu_manager.allocate_gpu(standby.standby_id, available_gpu, standby.memory_required):
+            logger.warning(f"没有足够的GPU启动备用实例 {standby.model_name}")
+            gpu_manager.release_model(standby.standby_id)
+            standby.gpu_ids = []
+            return False
+        standby.gpu_ids.append(available_gpu)
+    
+    standby.port = find_free_port()
+    cmd = [
+        "python", "start_qwen_model.py",
+        "--model-name", standby.model_name,
+        "--port", str(standby.port),
+        "--cluster-controller", f"http://localhost:{cluster_info.get('port', 5010)}",
+        "--gpu-id", ",".join(standby.gpu_ids),
+        "--memory-required", str(standby.memory_required),
+        "--model-id", standby.standby_id,
+        "--standby"
+    ]
+    try:
+        standby.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        logger.error(f"启动备用实例进程失败: {e}")
+        gpu_manager.release_model(standby.standby_id)
+        standby.gpu_ids = []
+        return False
+    return True
+
+def stop_standby(standby: StandbyInstance):
+    """停止备用实例进程并释放GPU"""
+    if standby.process is not None and standby.process.poll() is None:
+        standby.process.terminate()
+        try:
+            standby.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            standby.process.kill()
+    gpu_manager.release_model(standby.standby_id)
+
+def check_standby_health(standby: StandbyInstance) -> bool:
+    """检查备用实例是否已完成加载"""
+    try:
+        response = requests.get(f"http://localhost:{standby.port}/api/health", timeout=2)
+        return response.status_code == 200
+    except requests.RequestException:
+        return False
+
+def standby_matches_request(standby: StandbyInstance, data: Dict[str, Any]) -> bool:
+    """
+    备用实例是否满足部署请求：GPU数量相同，GPU类型和所在节点与请求一致，
+    每张GPU预留的显存不少于请求（请求独占GPU时备用实例也必须独占）
+    """
+    if len(standby.gpu_ids) != int(data.get("gpu_count", 1)):
+        return False
+    memory_required = int(data.get("memory_required", 0) or 0)
+    if standby.memory_required > 0 and (memory_required <= 0 or standby.memory_required < memory_required):
+        return False
+    gpu_type = data.get("gpu_type")
+    node_id = data.get("node_id")
+    for gpu_id in standby.gpu_ids:
+        usage = gpu_manager.get_gpu_status(gpu_id)
+        if gpu_type is not None and usage.get("gpu_type") != gpu_type:
+            return False
+        if node_id is not None and usage.get("node_id") not in (None, node_id):
+            return False
+    return True
+
+def register_standby_instance(standby: StandbyInstance, task_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """将认领的备用实例注册为模型实例，并记录一个已完成的部署任务"""
+    now = time.time()
+    endpoint = f"http://localhost:{standby.port}/api/generate"
+    model_instance = {
+        "model_id": standby.standby_id,
+        "model_name": standby.model_name,
+        "model_type": data.get("model_type", "transformers"),
+        "gpu_ids": standby.gpu_ids,
+        "primary_gpu": standby.gpu_ids[0] if standby.gpu_ids else None,
+        "memory_required": standby.memory_required,
+        "endpoint": endpoint,
+        "status": "online",
+        "created_at": now,
+        "registered_at": now,
+        "node_id": data.get("node_id") or (cluster_info["nodes"][0]["id"] if cluster_info.get("nodes") else None),
+        "process_id": standby.process.pid if standby.process else None,
+        "from_standby": True
+    }
+    model_instances.append(model_instance)
+    
+    model_info_url = f"http://localhost:{standby.port}/api/model_instances_info"
+    for url in (endpoint, model_info_url):
+        if url not in model_endpoints:
+            model_endpoints.append(url)
+    
+    task = {
+        "task_id": task_id,
+        "model_name": standby.model_name,
+        "model_type": model_instance["model_type"],
+        "gpu_id": model_instance["primary_gpu"],
+        "node_id": data.get("node_id"),
+        "status": "completed",
+        "created_at": now,
+        "updated_at": now,
+        "completed_at": now,
+        "result": {
+            "model_id": standby.standby_id,
+            "endpoint": endpoint,
+            "gpu_ids": standby.gpu_ids,
+            "primary_gpu": model_instance["primary_gpu"],
+            "standby": True
+        }
+    }
+    deployment_executor.store.put(task)
+    logger.info(f"备用实例 {standby.standby_id} 已注册为模型实例: {standby.model_name}")
+    return task
+
+@app.route('/api/standby', methods=['GET'])
+def get_standby_pool():
+    """获取预热备用实例池状态"""
+    if not standby_pool:
+        return jsonify({"status": "success", "enabled": False})
+    return jsonify({"status": "success", "enabled": True, "pool": standby_pool.status()})
+
 def poll_model_instances():
     """轮询模型实例信息的线程"""
     global model_instances, model_endpoints
@@ -764,8 +1120,8 @@ def poll_model_instances():
                                 found = False
                                 for i, model in enumerate(model_instances):
                                     if model["model_id"] == instance["model_id"]:
-                                        # 更新现有模型实例信息
-                                        model_instances[i] = instance
+                                        # 更新现有模型实例信息（保留进程、GPU和预留等本地字段）
+                                        model_instances[i] = {**model, **instance}
                                         # 确保状态为在线
                                         model_instances[i]["status"] = "online"
                                         found = True
@@ -816,6 +1172,22 @@ def poll_model_instances():
             logger.error(f"模型实例轮询线程出错: {e}")
             time.sleep(10)  # 出错后等待10秒再重试
 
+def reservation_keepalive_thread(interval):
+    """为排队和加载中的部署任务续期中心控制器上的临时GPU预留，直到实例就绪后确认"""
+    while True:
+        time.sleep(interval)
+        try:
+            cursor = None
+            while True:
+                tasks, cursor = deployment_executor.list_tasks(cursor=cursor, statuses=["pending", "processing"])
+                for task in tasks:
+                    if task.get("reservation_id"):
+                        notify_reservation(task["reservation_id"], "extend")
+                if not cursor:
+                    break
+        except Exception as e:
+            logger.error(f"预留续期线程出错: {e}")
+
 def heartbeat_thread(nodes, center_controller_url, cluster_id):
     """心跳线程，定期向中心控制器发送节点状态"""
     while True:
@@ -840,6 +1212,10 @@ def main():
     parser.add_argument("--config", required=True, help="Path to config file")
     parser.add_argument("--log-path", help="Path to log file")
     parser.add_argument("--port", type=int, default=5002, help="Port for the controller")
+    parser.add_argument("--max-concurrent-deploys", type=int, help="Max deployments loading in parallel")
+    parser.add_argument("--per-node-deploys", type=int, help="Max deployments loading in parallel per node")
+    parser.add_argument("--task-db", help="SQLite file for persisting deployment tasks")
+    parser.add_argument("--load-timeout", type=float, help="Seconds to wait for a deployed model to become ready")
     args = parser.parse_args()
     
     # 设置日志
@@ -879,6 +1255,28 @@ def main():
     
     logger.info(f"Starting cluster controller for cluster: {cluster_name}")
     
+    # 配置并启动部署执行器
+    executor_config = config.get("deployment_executor", {})
+    task_db = args.task_db or executor_config.get("task_db")
+    deployment_executor.configure(
+        store=TaskStore(task_db) if task_db else None,
+        max_workers=args.max_concurrent_deploys or executor_config.get("max_workers"),
+        per_node_limit=args.per_node_deploys or executor_config.get("per_node_limit"),
+        task_ttl=executor_config.get("task_ttl"),
+        gc_interval=executor_config.get("gc_interval")
+    )
+    deployment_executor.start()
+    global model_load_timeout
+    model_load_timeout = float(args.load_timeout or executor_config.get("load_timeout") or model_load_timeout)
+    
+    # 更新全局集群信息
+    global cluster_info
+    cluster_info["cluster_id"] = cluster_id
+    cluster_info["cluster_name"] = cluster_name
+    cluster_info["adapter_type"] = adapter_type
+    cluster_info["center_controller_url"] = center_controller_url
+    cluster_info["port"] = port
+    
     # 发现本地资源
     nodes = discover_local_resources(adapter_type)
     
@@ -900,14 +1298,23 @@ def main():
         else:
             logger.error(f"Failed to register node {node.name}")
     
-    # 更新全局集群信息
-    global cluster_info
-    cluster_info["cluster_id"] = cluster_id
-    cluster_info["cluster_name"] = cluster_name
-    cluster_info["adapter_type"] = adapter_type
-    cluster_info["center_controller_url"] = center_controller_url
     cluster_info["nodes"] = [node_to_dict(node) for node in nodes]
     
+    # 启动预热备用实例池
+    standby_config = config.get("standby_pool", {})
+    if standby_config.get("models"):
+        global standby_pool
+        standby_pool = StandbyPool(
+            launcher=launch_standby,
+            stopper=stop_standby,
+            health_checker=check_standby_health,
+            models=standby_config["models"],
+            memory_budget=int(standby_config.get("memory_budget", 0)),
+            idle_timeout=float(standby_config.get("idle_timeout", 3600)),
+            check_interval=float(standby_config.get("check_interval", 10))
+        )
+        standby_pool.start()
+    
     # 启动心跳线程
     heart_thread = threading.Thread(
         target=heartbeat_thread,
@@ -917,6 +1324,15 @@ def main():
     heart_thread.start()
     logger.info("Started heartbeat thread")
     
+    # 启动预留续期线程，间隔需小于中心控制器的 GPU_RESERVATION_TTL
+    keepalive_thread = threading.Thread(
+        target=reservation_keepalive_thread,
+        args=(float(config.get("reservation_keepalive_interval", 30)),)
+    )
+    keepalive_thread.daemon = True
+    keepalive_thread.start()
+    logger.info("Started reservation keepalive thread")
+    
     # 启动模型实例轮询线程
     poll_thread = threading.Thread(
         target=poll_model_instances
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+部署任务执行器
+使用有界工作线程池执行模型部署任务，支持优先级、节点级并发限制、
+排队位置查询，以及已完成任务的TTL保留与回收
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from task_store import TaskStore, FINISHED_STATUSES
+
+logger = logging.getLogger("deployment_executor")
+
+# 优先级定义，数值越小越优先
+PRIORITY_LEVELS = {
+    "high": 0,
+    "normal": 1,
+    "low": 2
+}
+
+# 未指定节点时使用的节点键
+DEFAULT_NODE_KEY = "__default__"
+
+
+def normalize_priority(priority: Any) -> int:
+    """将优先级（名称或数字）转换为整数，无法识别时使用normal"""
+    if isinstance(priority, str):
+        if priority in PRIORITY_LEVELS:
+            return PRIORITY_LEVELS[priority]
+        try:
+            priority = int(priority)
+        except ValueError:
+            return PRIORITY_LEVELS["normal"]
+    if isinstance(priority, (int, float)):
+        return max(0, int(priority))
+    return PRIORITY_LEVELS["normal"]
+
+
+class DeploymentExecutor:
+    """部署任务执行器
+
+    任务进入优先级队列后，由固定数量的工作线程按 (优先级, 提交顺序) 取出执行。
+    每个节点同时运行的部署数不超过 per_node_limit，避免同一节点并行加载权重。
+    handler 应在模型实例就绪（或加载超时）后才返回，工作线程和节点并发名额在此之前一直被占用。
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Any], max_workers: int = 2,
+                 per_node_limit: int = 1, task_ttl: float = 3600, gc_interval: float = 60,
+                 store: Optional[TaskStore] = None):
+        """
+        Args:
+            handler: 执行单个部署任务的函数，接收任务字典，实例就绪后返回
+            max_workers: 全局并发执行的部署任务数
+            per_node_limit: 每个节点同时执行的部署任务数
+            task_ttl: 已完成任务的保留时间(秒)
+            gc_interval: 回收线程的运行间隔(秒)
+            store: 任务存储，为空时使用内存存储
+        """
+        self.handler = handler
+        self.max_workers = max_workers
+        self.per_node_limit = per_node_limit
+        self.task_ttl = task_ttl
+        self.gc_interval = gc_interval
+
+        self.store = store if store is not None else TaskStore()
+        self._queue: List[tuple] = []  # 堆: (priority, seq, task_id)
+        self._seq = itertools.count()
+        self._running_per_node: Dict[str, int] = {}  # node_key -> 运行中任务数
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._started = False
+
+    def configure(self, max_workers: Optional[int] = None, per_node_limit: Optional[int] = None,
+                  task_ttl: Optional[float] = None, gc_interval: Optional[float] = None,
+                  store: Optional[TaskStore] = None):
+        """在启动前调整执行器参数"""
+        if self._started:
+            logger.warning("部署执行器已启动，忽略参数调整")
+            return
+        if max_workers is not None:
+            self.max_workers = max(1, int(max_workers))
+        if per_node_limit is not None:
+            self.per_node_limit = max(1, int(per_node_limit))
+        if task_ttl is not None:
+            self.task_ttl = float(task_ttl)
+        if gc_interval is not None:
+            self.gc_interval = float(gc_interval)
+        if store is not None:
+            self.store = store
+
+    def start(self):
+        """启动工作线程和回收线程"""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+
+        # 持久化存储中上次运行遗留的未完成任务不会再被执行
+        if self.store.persistent:
+            interrupted = self.store.mark_unfinished_failed("部署任务因集群控制器重启而中断")
+            if interrupted:
+                logger.warning(f"{interrupted} 个未完成的部署任务已标记为失败")
+
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"deploy-worker-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+        gc_thread = threading.Thread(target=self._gc_loop, name="deploy-task-gc")
+        gc_thread.daemon = True
+        gc_thread.start()
+        self._threads.append(gc_thread)
+
+        logger.info(f"部署执行器已启动: 工作线程 {self.max_workers} 个, "
+                    f"每节点并发 {self.per_node_limit}, 任务保留 {self.task_ttl}秒")
+
+    # ---------------------- 提交与查询 ----------------------
+
+    def submit(self, task: Dict[str, Any], priority: Any = "normal") -> int:
+        """提交部署任务，返回当前排队位置（从0开始）"""
+        if not self._started:
+            self.start()
+
+        with self._cond:
+            task["priority"] = normalize_priority(priority)
+            task["status"] = "pending"
+            task["queued_at"] = time.time()
+            self.store.put(task)
+            heapq.heappush(self._queue, (task["priority"], next(self._seq), task["task_id"]))
+            self._cond.notify()
+            position = self._queue_position_locked(task["task_id"])
+
+        logger.info(f"部署任务 {task['task_id']} 已入队, 优先级: {task['priority']}, 排队位置: {position}")
+        return position
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务，排队中的任务附带 queue_position"""
+        task = self.store.get(task_id)
+        if task is None:
+            return None
+        if task.get("status") != "pending":
+            return dict(task)
+        with self._cond:
+            return self._with_position_locked(task, self._queue_positions_locked())
+
+    def list_tasks(self, limit: int = 100, cursor: Optional[str] = None,
+                   statuses: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按创建时间倒序分页列出保留中的任务，返回 (任务列表, 下一页游标)"""
+        tasks, next_cursor = self.store.list(limit=limit, cursor=cursor, statuses=statuses)
+        with self._cond:
+            positions = self._queue_positions_locked() if self._queue else {}
+            return [self._with_position_locked(task, positions) for task in tasks], next_cursor
+
+    def get_queue_position(self, task_id: str) -> Optional[int]:
+        """获取任务的排队位置，不在队列中时返回None"""
+        with self._cond:
+            return self._queue_position_locked(task_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """执行器统计信息"""
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "running": sum(self._running_per_node.values()),
+                "running_per_node": dict(self._running_per_node),
+                "retained": len(self.store),
+                "max_workers": self.max_workers,
+                "per_node_limit": self.per_node_limit
+            }
+
+    def _queue_positions_locked(self) -> Dict[str, int]:
+        return {entry[2]: i for i, entry in enumerate(sorted(self._queue))}
+
+    def _queue_position_locked(self, task_id: str) -> Optional[int]:
+        return self._queue_positions_locked().get(task_id)
+
+    def _with_position_locked(self, task: Dict[str, Any], positions: Dict[str, int]) -> Dict[str, Any]:
+        task_copy = dict(task)
+        if task["task_id"] in positions:
+            task_copy["queue_position"] = positions[task["task_id"]]
+        return task_copy
+
+    # ---------------------- 执行 ----------------------
+
+    @staticmethod
+    def _node_key(task: Dict[str, Any]) -> str:
+        return task.get("node_id") or DEFAULT_NODE_KEY
+
+    def _take_runnable_locked(self) -> Optional[Dict[str, Any]]:
+        """按优先级取出第一个所在节点仍有并发余量的任务"""
+        skipped = []
+        task = None
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            candidate = self.store.get(entry[2])
+            if candidate is None:
+                continue
+            if self._running_per_node.get(self._node_key(candidate), 0) < self.per_node_limit:
+                task = candidate
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        return task
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                task = self._take_runnable_locked()
+                while task is None:
+                    self._cond.wait()
+                    task = self._take_runnable_locked()
+                node_key = self._node_key(task)
+                self._running_per_node[node_key] = self._running_per_node.get(node_key, 0) + 1
+                task["updated_at"] = time.time()
+                self.store.put(task)
+
+            try:
+                self.handler(task)
+            except Exception as e:
+                logger.error(f"执行部署任务 {task['task_id']} 时出错: {e}")
+                task["status"] = "failed"
+                task["error"] = str(e)
+            finally:
+                with self._cond:
+                    self._running_per_node[node_key] -= 1
+                    if self._running_per_node[node_key] <= 0:
+                        del self._running_per_node[node_key]
+                    if task.get("status") not in FINISHED_STATUSES:
+                        task["status"] = "failed"
+                    task["updated_at"] = time.time()
+                    self.store.put(task)
+                    # 节点并发余量释放后，唤醒等待的工作线程
+                    self._cond.notify_all()
+
+    # ---------------------- 回收 ----------------------
+
+    def collect_expired(self, now: Optional[float] = None) -> int:
+        """回收超过保留时间的已完成任务，返回回收数量"""
+        removed = self.store.expire(self.task_ttl, now)
+        if removed:
+            logger.info(f"回收了 {removed} 个过期部署任务")
+        return removed
+
+    def _gc_loop(self):
+        while True:
+            time.sleep(self.gc_interval)
+            try:
+                self.collect_expired()
+            except Exception as e:
+                logger.error(f"部署任务回收线程出错: {e}")
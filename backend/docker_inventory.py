@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Docker模型实例清单
+通过Docker Engine API（unix socket）订阅容器事件，在内存中增量维护 qwen-model-* 容器集合，
+/api/models/docker 直接读取清单，不再每次调用 docker ps
+"""
+
+import http.client
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+logger = logging.getLogger("docker_inventory")
+
+CONTAINER_PREFIX = "qwen-model-"
+# 模型服务在容器内监听的端口
+MODEL_PORT = 8000
+DEFAULT_IMAGE = "transformers:apple-lite-v1"
+# 收到这些事件时从清单中移除：die 表示容器主进程已退出（stop/kill/OOM 最终都会产生 die），
+# destroy 表示容器已删除；kill 和 oom 只是信号或内存事件，容器不一定因此退出
+REMOVE_ACTIONS = ("die", "destroy")
+
+
+def docker_socket_path() -> str:
+    """Docker守护进程的unix socket路径，支持 DOCKER_HOST=unix://..."""
+    host = os.environ.get("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return "/var/run/docker.sock"
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """通过unix socket连接的HTTP连接"""
+
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class DockerEngineClient:
+    """Docker Engine API 的最小客户端：列出容器、订阅事件"""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 10.0):
+        self.socket_path = socket_path or docker_socket_path()
+        self.timeout = timeout
+
+    @staticmethod
+    def _filters(**filters) -> str:
+        return quote(json.dumps({k: v for k, v in filters.items() if v}))
+
+    def list_containers(self, name_prefix: str = CONTAINER_PREFIX, container_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """列出运行中的容器（/containers/json 格式）"""
+        conn = UnixHTTPConnection(self.socket_path, self.timeout)
+        try:
+            filters = self._filters(name=[name_prefix], id=[container_id] if container_id else None)
+            conn.request("GET", f"/containers/json?filters={filters}")
+            response = conn.getresponse()
+            body = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"Docker API返回 {response.status}: {body[:200]!r}")
+            return json.loads(body)
+        finally:
+            conn.close()
+
+    def events(self, name_prefix: str = CONTAINER_PREFIX, since: Optional[float] = None) -> Iterable[Dict[str, Any]]:
+        """订阅容器事件，连接断开时迭代结束（事件接口不支持按名称前缀过滤，由调用方过滤）"""
+        conn = UnixHTTPConnection(self.socket_path, timeout=None)
+        try:
+            filters = self._filters(type=["container"], event=["start", *REMOVE_ACTIONS])
+            path = f"/events?filters={filters}"
+            if since is not None:
+                path += f"&since={int(since)}"
+            conn.request("GET", path)
+            response = conn.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f"Docker API返回 {response.status}")
+            while True:
+                line = response.readline()
+                if not line:
+                    return
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            conn.close()
+
+
+def container_to_instance(container: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """把 /containers/json 的容器转换为模型实例；没有映射模型端口的容器返回None"""
+    names = container.get("Names") or []
+    name = names[0].lstrip("/") if names else ""
+    port = next((str(p["PublicPort"]) for p in container.get("Ports", [])
+                 if p.get("PrivatePort") == MODEL_PORT and p.get("PublicPort")
+                 and p.get("Type", "tcp") == "tcp"), None)
+    if not name or port is None:
+        return None
+    image = container.get("Image") or DEFAULT_IMAGE
+    return {
+        "id": name,
+        "modelId": name,
+        "modelName": name.replace('-', ' ').title(),
+        "backend": "mac",
+        "server": "localhost",
+        "port": port,
+        "gpu": "Apple Silicon",
+        "status": "running",
+        "cluster": "local",
+        "node": "localhost",
+        "creator_name": "当前用户",
+        "image": image,
+        "image_id": image
+    }
+
+
+class DockerInventory:
+    """
+    容器事件驱动的模型实例清单
+
+    启动（以及事件流断开重连）时全量列出一次容器，之后只根据事件增量更新：
+    start 事件查询该容器并加入，die/destroy 事件移除。
+    """
+
+    def __init__(self, list_containers: Optional[Callable[..., List[Dict[str, Any]]]] = None,
+                 events: Optional[Callable[..., Iterable[Dict[str, Any]]]] = None,
+                 name_prefix: str = CONTAINER_PREFIX, retry_interval: float = 5.0):
+        """
+        Args:
+            list_containers: list_containers(name_prefix, container_id=None)，默认使用 DockerEngineClient
+            events: events(name_prefix, since=None) 返回事件迭代器，默认使用 DockerEngineClient
+            name_prefix: 容器名前缀
+            retry_interval: 事件流断开后的重连间隔(秒)
+        """
+        if list_containers is None or events is None:
+            client = DockerEngineClient()
+            list_containers = list_containers or client.list_containers
+            events = events or client.events
+        self.list_containers = list_containers
+        self.events = events
+        self.name_prefix = name_prefix
+        self.retry_interval = retry_interval
+        self._instances: Dict[str, Dict[str, Any]] = {}  # 容器ID -> 模型实例
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.ready = False
+        self.last_event_at: Optional[float] = None
+        self.error = ""
+
+    def start(self):
+        """启动后台监听线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def list(self) -> List[Dict[str, Any]]:
+        """当前运行中的模型实例"""
+        with self._lock:
+            return sorted((dict(instance) for instance in self._instances.values()), key=lambda m: m["id"])
+
+    def resync(self) -> float:
+        """全量列出容器重建清单，返回列出时的时间戳（事件订阅从该时间开始）"""
+        since = time.time()
+        containers = self.list_containers(self.name_prefix)
+        instances = {}
+        for container in containers:
+            instance = container_to_instance(container)
+            if instance and instance["id"].startswith(self.name_prefix):
+                instances[container["Id"]] = instance
+        with self._lock:
+            self._instances = instances
+        self.ready = True
+        return since
+
+    def handle_event(self, event: Dict[str, Any]):
+        """应用一个容器事件"""
+        action = (event.get("Action") or event.get("status") or "").split(":")[0]
+        container_id = event.get("id") or event.get("Actor", {}).get("ID")
+        name = event.get("Actor", {}).get("Attributes", {}).get("name", "")
+        if not container_id or (name and not name.startswith(self.name_prefix)):
+            return
+        self.last_event_at = time.time()
+        if action == "start":
+            containers = self.list_containers(self.name_prefix, container_id)
+            instance = container_to_instance(containers[0]) if containers else None
+            if instance:
+                with self._lock:
+                    self._instances[container_id] = instance
+                logger.info(f"模型容器启动: {instance['id']} (端口 {instance['port']})")
+        elif action in REMOVE_ACTIONS:
+            with self._lock:
+                instance = self._instances.pop(container_id, None)
+            if instance:
+                logger.info(f"模型容器停止: {instance['id']}")
+
+    def _run(self):
+        """全量同步后订阅事件；事件流断开或出错时等待后重新同步"""
+        while not self._stopped.is_set():
+            try:
+                since = self.resync()
+                self.error = ""
+                for event in self.events(self.name_prefix, since):
+                    if self._stopped.is_set():
+                        return
+                    self.handle_event(event)
+            except Exception as e:
+                self.error = str(e)
+                self.ready = False
+                logger.warning(f"Docker事件流中断: {e}")
+            self._stopped.wait(self.retry_interval)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            count = len(self._instances)
+        return {"ready": self.ready, "instances": count, "last_event_at": self.last_event_at, "error": self.error}
+
+
+# 全局清单（由 app.py 启动）
+docker_inventory = DockerInventory()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+跨集群全局放置
+部署请求未指定集群/节点时，按空闲容量、GPU类型匹配、部署队列深度和负载为每个集群打分，
+在得分最高且放得下的集群内运行GPU调度器完成放置
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ClusterRegister import ClusterInfo
+from gpu_scheduler import GPUAllocation, GPUResourceManager, gpu_free_memory
+
+logger = logging.getLogger("global_placement")
+
+# 各项得分的权重，每项得分都归一化到 [0, 1]
+DEFAULT_WEIGHTS = {
+    "capacity": 1.0,    # 放置后剩余可用GPU比例
+    "type_match": 0.5,  # 可用GPU中符合期望类型的比例
+    "queue": 0.3,       # 部署队列越短越好
+    "load": 0.2         # GPU平均利用率越低越好
+}
+
+
+@dataclass
+class ClusterScore:
+    """集群得分"""
+    cluster: ClusterInfo
+    score: float = 0.0
+    fits: bool = False  # 空闲GPU数量是否足够
+    fit_gpus: int = 0   # 空闲显存满足要求的GPU数
+    details: Dict[str, float] = field(default_factory=dict)
+
+
+def gpu_utilization(gpu) -> float:
+    """GPU利用率(0-100)，兼容 utilization 和 usage 两种字段"""
+    return float(gpu.extra_info.get("utilization", gpu.extra_info.get("usage", 0)) or 0)
+
+
+def score_cluster(cluster: ClusterInfo, gpu_count: int, memory_required: int, gpu_type: Optional[str] = None,
+                  queue_depth: int = 0, weights: Optional[Dict[str, float]] = None) -> ClusterScore:
+    """
+    为单个集群打分
+
+    Args:
+        cluster: 集群信息（可以是扣除预留后的视图）
+        gpu_count: 需要的GPU数量
+        memory_required: 每个GPU需要的显存(MB)
+        gpu_type: 期望的GPU类型（nvidia/apple），为空时不计类型得分
+        queue_depth: 集群控制器上排队的部署任务数
+        weights: 各项权重，默认 DEFAULT_WEIGHTS
+
+    Returns:
+        ClusterScore: 得分，fits 为 False 时不应选择该集群
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    online_gpus = [gpu for node in cluster.nodes if node.status == "online" for gpu in node.gpus]
+    fitting = [gpu for gpu in online_gpus if gpu_free_memory(gpu) >= memory_required]
+    result = ClusterScore(cluster=cluster, fit_gpus=len(fitting), fits=len(fitting) >= gpu_count)
+    if not online_gpus:
+        return result
+
+    details = {
+        "capacity": max(len(fitting) - gpu_count, 0) / len(online_gpus),
+        "type_match": (sum(1 for gpu in fitting if gpu.gpu_type.value == gpu_type) / len(fitting)
+                       if gpu_type and fitting else 0.0),
+        "queue": 1.0 / (1 + max(queue_depth, 0)),
+        "load": 1.0 - sum(gpu_utilization(gpu) for gpu in online_gpus) / (100.0 * len(online_gpus))
+    }
+    result.details = details
+    result.score = sum(weights.get(name, 0) * value for name, value in details.items())
+    return result
+
+
+class GlobalPlacer:
+    """跨集群放置器"""
+
+    def __init__(self, manager: GPUResourceManager, weights: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            manager: GPU资源管理器（其调度器负责集群内选卡，配置账本时放置结果会被预留）
+            weights: 打分权重
+        """
+        self.manager = manager
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+    def rank(self, clusters: List[ClusterInfo], gpu_count: int, memory_required: int,
+             gpu_type: Optional[str] = None, queue_depths: Optional[Dict[str, int]] = None) -> List[ClusterScore]:
+        """按得分从高到低排列所有集群（含放不下的集群，fits=False）"""
+        queue_depths = queue_depths or {}
+        scores = []
+        for cluster in clusters:
+            view, _ = self.manager.available_view(cluster, memory_required)
+            score = score_cluster(view, gpu_count, memory_required, gpu_type,
+                                  queue_depths.get(cluster.id, 0), self.weights)
+            score.cluster = cluster
+            scores.append(score)
+        scores.sort(key=lambda s: (s.fits, s.score), reverse=True)
+        return scores
+
+    def place(self, clusters: List[ClusterInfo], model_id: str, gpu_count: int, memory_required: int,
+              gpu_type: Optional[str] = None, queue_depths: Optional[Dict[str, int]] = None,
+              priority: Any = "normal") -> Tuple[Optional[ClusterInfo], GPUAllocation, List[ClusterScore]]:
+        """
+        选择集群并在其中分配GPU；得分最高的集群调度失败（如预留冲突）时依次尝试下一个
+
+        Returns:
+            (选中的集群或None, 分配结果, 所有集群得分)
+        """
+        ranked = self.rank(clusters, gpu_count, memory_required, gpu_type, queue_depths)
+        allocation = GPUAllocation(success=False, message="没有空闲GPU足够的集群")
+        for score in ranked:
+            if not score.fits:
+                break
+            allocation = self.manager.allocate_gpus(score.cluster, model_id, gpu_count, memory_required, priority)
+            if allocation.success:
+                logger.info(f"全局放置 {model_id}: 集群 {score.cluster.name} (得分 {score.score:.3f}, "
+                            f"{score.details}), 分配 {allocation.allocation}")
+                return score.cluster, allocation, ranked
+        return None, allocation, ranked
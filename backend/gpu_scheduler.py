@@ -4,9 +4,15 @@ GPU资源调度策略
 提供多种GPU资源调度算法，用于在集群内分配GPU资源
 """
 
+import dataclasses
+import heapq
+import itertools
 import logging
-from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, field
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, 
@@ -15,6 +21,8 @@ logger = logging.getLogger("gpu_scheduler")
 
 # 导入数据模型
 from ClusterRegister import GPUInfo, NodeInfo, ClusterInfo
+from gpu_topology import group_score, gpu_link, link_score
+from deployment_executor import PRIORITY_LEVELS, normalize_priority
 
 @dataclass
 class GPUAllocation:
@@ -22,6 +30,9 @@ class GPUAllocation:
     success: bool = False
     allocation: Dict[str, List[str]] = None  # {node_id: [gpu_ids]}
     message: str = ""
+    reservation_id: str = ""  # 预留账本中的预留ID（未使用账本时为空）
+    memory_required: int = 0  # 每个GPU占用的显存(MB)，由资源管理器记录
+    priority: int = PRIORITY_LEVELS["normal"]  # 部署优先级，数值越小越优先
 
 class GPUScheduler:
     """GPU调度器基类"""
@@ -39,6 +50,10 @@ class GPUScheduler:
             GPUAllocation: 分配结果
         """
         raise NotImplementedError("Subclasses must implement this method")
+    
+    def release(self, allocation: GPUAllocation, memory_required: int):
+        """分配被释放时的回调，维护内部状态的调度器（如容量快照）在此归还资源"""
+        pass
 
 class SingleNodeFirstScheduler(GPUScheduler):
     """单节点优先调度器
@@ -244,21 +259,349 @@ class UtilizationAwareScheduler(GPUScheduler):
             message=f"成功分配 {gpu_count} 个GPU，优化GPU利用率"
         )
 
+def gpu_free_memory(gpu: GPUInfo) -> int:
+    """
+    获取GPU实际空闲显存(MB)
+    
+    优先使用 extra_info 中的 memory_free，其次用 memory_total 减去 memory_used
+    """
+    if "memory_free" in gpu.extra_info:
+        return int(gpu.extra_info["memory_free"])
+    return gpu.memory_total - int(gpu.extra_info.get("memory_used", 0))
+
+def pack_across_nodes(node_candidates: List[Tuple[str, List[Tuple[float, str]]]], gpu_count: int,
+                      cross_node_penalty: float) -> Dict[str, List[str]]:
+    """
+    跨节点贪心装箱：已选节点上的下一张卡按得分计价，新开一个节点额外计 cross_node_penalty；
+    需要新开节点时选择能容纳剩余需求最多的节点，使涉及的节点数尽量少
+    
+    Args:
+        node_candidates: [(节点ID, [(得分, GPU ID)] 按得分升序)]，候选总数不少于 gpu_count
+        gpu_count: 需要的GPU数量
+        cross_node_penalty: 每多开一个节点的惩罚
+        
+    Returns:
+        Dict: {节点ID: [GPU ID]}
+    """
+    allocation: Dict[str, List[str]] = {}
+    taken: Dict[str, int] = {}  # 节点ID -> 已选张数
+    remaining = gpu_count
+    while remaining:
+        best = None
+        for node_id, candidates in node_candidates:
+            if node_id in taken and taken[node_id] < len(candidates):
+                score = candidates[taken[node_id]][0]
+                if best is None or score < best[0]:
+                    best = (score, node_id, candidates)
+        unopened = [(node_id, candidates) for node_id, candidates in node_candidates if node_id not in taken]
+        if unopened:
+            node_id, candidates = max(unopened, key=lambda nc: (min(len(nc[1]), remaining), -nc[1][0][0]))
+            score = candidates[0][0] + (cross_node_penalty if taken else 0)
+            if best is None or score < best[0]:
+                best = (score, node_id, candidates)
+        _, node_id, candidates = best
+        index = taken.get(node_id, 0)
+        allocation.setdefault(node_id, []).append(candidates[index][1])
+        taken[node_id] = index + 1
+        remaining -= 1
+    return allocation
+
+class BinPackingScheduler(GPUScheduler):
+    """装箱调度器
+    
+    按GPU实际空闲显存进行最佳适配(best-fit)：优先放到剩余空间最小且刚好够用的GPU上，
+    把整卡和空节点留给大模型；对会留下过小碎片的放置和跨节点放置施加惩罚。
+    批量部署时按需求从大到小排序（best-fit decreasing）。
+    """
+    
+    def __init__(self, min_fragment: int = 4096, fragment_penalty: float = 0.5, cross_node_penalty: float = 1.0):
+        """
+        Args:
+            min_fragment: 小于该值(MB)的剩余显存视为难以利用的碎片
+            fragment_penalty: 产生碎片时的惩罚（以GPU总显存的比例计）
+            cross_node_penalty: 跨节点分配时每多一个节点的惩罚
+        """
+        self.min_fragment = min_fragment
+        self.fragment_penalty = fragment_penalty
+        self.cross_node_penalty = cross_node_penalty
+    
+    def _gpu_score(self, gpu: GPUInfo, free: int, memory_required: int) -> float:
+        """放置得分，越小越好：剩余显存占比 + 碎片惩罚"""
+        leftover = free - memory_required
+        score = leftover / max(gpu.memory_total, 1)
+        if 0 < leftover < self.min_fragment:
+            score += self.fragment_penalty
+        return score
+    
+    def allocate_gpus(self, cluster: ClusterInfo, gpu_count: int, memory_required: int,
+                      free_memory: Optional[Dict[Tuple[str, str], int]] = None) -> GPUAllocation:
+        """
+        按最佳适配分配GPU
+        
+        Args:
+            cluster: 集群信息
+            gpu_count: 需要的GPU数量
+            memory_required: 每个GPU需要的显存(MB)
+            free_memory: 可选的空闲显存视图 {(node_id, gpu_id): MB}，用于批量放置时叠加已做出的决策
+            
+        Returns:
+            GPUAllocation: 分配结果
+        """
+        logger.info(f"尝试分配 {gpu_count} 个GPU，每个至少 {memory_required}MB 空闲显存，最佳适配装箱")
+        
+        # 收集每个节点上放得下的GPU及其得分
+        node_candidates = []
+        for node in cluster.nodes:
+            if node.status != "online":
+                continue
+            
+            candidates = []
+            for gpu in node.gpus:
+                free = gpu_free_memory(gpu)
+                if free_memory is not None:
+                    free = free_memory.get((node.id, gpu.id), free)
+                if free >= memory_required:
+                    candidates.append((self._gpu_score(gpu, free, memory_required), gpu))
+            if candidates:
+                candidates.sort(key=lambda x: x[0])
+                node_candidates.append((node, candidates))
+        
+        # 1. 单节点能满足时，选择得分总和最小的节点
+        best = None
+        for node, candidates in node_candidates:
+            if len(candidates) < gpu_count:
+                continue
+            score = sum(c[0] for c in candidates[:gpu_count])
+            if best is None or score < best[0]:
+                best = (score, node, [c[1] for c in candidates[:gpu_count]])
+        
+        if best:
+            _, node, selected_gpus = best
+            return GPUAllocation(
+                success=True,
+                allocation={node.id: [gpu.id for gpu in selected_gpus]},
+                message=f"在节点 {node.name} 上装箱分配 {gpu_count} 个GPU"
+            )
+        
+        # 2. 跨节点分配
+        available = sum(len(candidates) for _, candidates in node_candidates)
+        if available < gpu_count:
+            return GPUAllocation(
+                success=False,
+                message=f"空闲显存满足 {memory_required}MB 的GPU不足，需要 {gpu_count} 个，只有 {available} 个"
+            )
+        allocation = pack_across_nodes([(node.id, [(score, gpu.id) for score, gpu in candidates])
+                                        for node, candidates in node_candidates],
+                                       gpu_count, self.cross_node_penalty)
+        
+        return GPUAllocation(
+            success=True,
+            allocation=allocation,
+            message=f"跨节点装箱分配了 {gpu_count} 个GPU，涉及 {len(allocation)} 个节点"
+        )
+    
+    def allocate_batch(self, cluster: ClusterInfo, requests: List[Dict[str, int]]) -> List[GPUAllocation]:
+        """
+        批量分配（best-fit decreasing）：按 gpu_count * memory_required 从大到小依次放置
+        
+        Args:
+            cluster: 集群信息
+            requests: [{"gpu_count": int, "memory_required": int}, ...]
+            
+        Returns:
+            List[GPUAllocation]: 与 requests 顺序一致的分配结果
+        """
+        free_memory = {}
+        for node in cluster.nodes:
+            for gpu in node.gpus:
+                free_memory[(node.id, gpu.id)] = gpu_free_memory(gpu)
+        
+        order = sorted(range(len(requests)),
+                       key=lambda i: requests[i]["gpu_count"] * requests[i]["memory_required"],
+                       reverse=True)
+        results: List[Optional[GPUAllocation]] = [None] * len(requests)
+        for i in order:
+            req = requests[i]
+            allocation = self.allocate_gpus(cluster, req["gpu_count"], req["memory_required"], free_memory)
+            if allocation.success:
+                for node_id, gpu_ids in allocation.allocation.items():
+                    for gpu_id in gpu_ids:
+                        free_memory[(node_id, gpu_id)] -= req["memory_required"]
+            results[i] = allocation
+        return results
+
+class TopologyAwareScheduler(BinPackingScheduler):
+    """拓扑感知调度器
+    
+    多GPU（张量并行）部署时，在单节点内按 nvidia-smi topo 拓扑选择GPU组：
+    优先最差链路也是NVLink的组，其次同一NUMA节点，再比较装箱得分；
+    单GPU部署和单节点无法满足时沿用装箱调度器的策略。
+    """
+    
+    def __init__(self, max_combinations: int = 5000, **kwargs):
+        """
+        Args:
+            max_combinations: 单节点候选组合数上限，超过时改用贪心扩展
+            **kwargs: 传给 BinPackingScheduler 的参数
+        """
+        super().__init__(**kwargs)
+        self.max_combinations = max_combinations
+    
+    def _candidate_groups(self, gpus: List[GPUInfo], gpu_count: int):
+        """枚举候选GPU组；组合过多时从每张GPU出发贪心扩展（每次加入与组内最差链路最好的GPU）"""
+        if math.comb(len(gpus), gpu_count) <= self.max_combinations:
+            yield from itertools.combinations(gpus, gpu_count)
+            return
+        for seed in gpus:
+            group = [seed]
+            remaining = [gpu for gpu in gpus if gpu is not seed]
+            while len(group) < gpu_count:
+                best = max(remaining, key=lambda g: (min(link_score(gpu_link(g, m)) for m in group),
+                                                     sum(link_score(gpu_link(g, m)) for m in group)))
+                group.append(best)
+                remaining.remove(best)
+            yield tuple(group)
+    
+    def allocate_gpus(self, cluster: ClusterInfo, gpu_count: int, memory_required: int,
+                      free_memory: Optional[Dict[Tuple[str, str], int]] = None) -> GPUAllocation:
+        """
+        按拓扑选择单节点内的GPU组，无法满足时回退到装箱调度
+        
+        Args:
+            cluster: 集群信息
+            gpu_count: 需要的GPU数量
+            memory_required: 每个GPU需要的显存(MB)
+            free_memory: 可选的空闲显存视图 {(node_id, gpu_id): MB}
+            
+        Returns:
+            GPUAllocation: 分配结果
+        """
+        if gpu_count <= 1:
+            return super().allocate_gpus(cluster, gpu_count, memory_required, free_memory)
+        
+        logger.info(f"尝试分配 {gpu_count} 个GPU，每个至少 {memory_required}MB 空闲显存，按互联拓扑选择")
+        
+        best = None
+        for node in cluster.nodes:
+            if node.status != "online":
+                continue
+            
+            fits = {}
+            for gpu in node.gpus:
+                free = gpu_free_memory(gpu)
+                if free_memory is not None:
+                    free = free_memory.get((node.id, gpu.id), free)
+                if free >= memory_required:
+                    fits[gpu.id] = self._gpu_score(gpu, free, memory_required)
+            if len(fits) < gpu_count:
+                continue
+            
+            candidates = [gpu for gpu in node.gpus if gpu.id in fits]
+            for group in self._candidate_groups(candidates, gpu_count):
+                # 拓扑得分越大越好，装箱得分越小越好
+                key = group_score(list(group)) + (-sum(fits[gpu.id] for gpu in group),)
+                if best is None or key > best[0]:
+                    best = (key, node, group)
+        
+        if best is None:
+            return super().allocate_gpus(cluster, gpu_count, memory_required, free_memory)
+        
+        (worst_link, same_numa, _, _), node, group = best
+        return GPUAllocation(
+            success=True,
+            allocation={node.id: [gpu.id for gpu in group]},
+            message=f"在节点 {node.name} 上按拓扑分配 {gpu_count} 个GPU"
+                    f"（最差链路得分 {worst_link}，{'同一' if same_numa else '跨'}NUMA节点）"
+        )
+
+# 调度器名称 -> 类，用于按配置选择调度器
+def _create_vectorized_scheduler() -> GPUScheduler:
+    # 向量化调度器依赖numpy，按需导入
+    from capacity_snapshot import VectorizedScheduler
+    return VectorizedScheduler()
+
+SCHEDULERS = {
+    "single_node_first": SingleNodeFirstScheduler,
+    "memory_optimized": MemoryOptimizedScheduler,
+    "utilization_aware": UtilizationAwareScheduler,
+    "bin_packing": BinPackingScheduler,
+    "topology_aware": TopologyAwareScheduler,
+    "vectorized": _create_vectorized_scheduler,
+}
+
+def create_scheduler(name: str) -> GPUScheduler:
+    """按名称创建调度器，名称未知时使用单节点优先调度器"""
+    scheduler_class = SCHEDULERS.get((name or "").lower())
+    if scheduler_class is None:
+        logger.warning(f"未知的调度器 {name}，使用 single_node_first")
+        scheduler_class = SingleNodeFirstScheduler
+    return scheduler_class()
+
 class GPUResourceManager:
     """GPU资源管理器
     
-    管理GPU资源的分配和释放
+    管理GPU资源的分配和释放。配置预留账本（ReservationLedger）后，
+    调度器只能看到扣除账本中有效预留后的空闲显存，决策结果以带TTL的临时预留提交，
+    与并发部署冲突时基于最新视图重新调度
     """
     
-    def __init__(self):
+    def __init__(self, ledger=None, max_reserve_attempts: int = 5):
+        """
+        Args:
+            ledger: 可选的 ReservationLedger，多个调度进程共享
+            max_reserve_attempts: 预留冲突时的最大调度次数
+        """
         self.scheduler = SingleNodeFirstScheduler()  # 默认使用单节点优先调度器
         self.allocations = {}  # {model_id: GPUAllocation}
+        self.ledger = ledger
+        self.max_reserve_attempts = max_reserve_attempts
+        self._release_listeners: List[Callable[[str, GPUAllocation], None]] = []
     
     def set_scheduler(self, scheduler: GPUScheduler):
         """设置调度器"""
         self.scheduler = scheduler
     
-    def allocate_gpus(self, cluster: ClusterInfo, model_id: str, gpu_count: int, memory_required: int) -> GPUAllocation:
+    def set_ledger(self, ledger):
+        """设置预留账本"""
+        self.ledger = ledger
+    
+    def add_release_listener(self, listener: Callable[[str, GPUAllocation], None]):
+        """注册GPU释放回调 listener(model_id, allocation)，用于在容量释放后重试排队的部署"""
+        self._release_listeners.append(listener)
+    
+    def available_view(self, cluster: ClusterInfo, memory_required: int,
+                        freed: Optional[Dict[Tuple[str, str], int]] = None):
+        """
+        构建扣除账本预留后的集群视图
+        
+        剩余显存不足 memory_required 的GPU直接从视图中移除，
+        因此只看 memory_total 的调度器也不会选中已被占满的GPU
+        
+        Args:
+            freed: 假设额外释放的显存 {(node_id, gpu_id): MB}，用于抢占前的预演
+        
+        Returns:
+            (集群视图, {(node_id, gpu_id): 容量MB})
+        """
+        gpus = [(node.id, gpu.id) for node in cluster.nodes for gpu in node.gpus]
+        reserved = self.ledger.reserved_memory(cluster.id, gpus) if self.ledger is not None else {}
+        freed = freed or {}
+        capacities = {}
+        nodes = []
+        for node in cluster.nodes:
+            visible = []
+            for gpu in node.gpus:
+                key = (node.id, gpu.id)
+                capacities[key] = gpu.memory_total
+                free = min(gpu_free_memory(gpu), gpu.memory_total - reserved.get(key, 0)) + freed.get(key, 0)
+                free = min(free, gpu.memory_total)
+                if free >= memory_required:
+                    visible.append(dataclasses.replace(gpu, extra_info={**gpu.extra_info, "memory_free": free}))
+            nodes.append(dataclasses.replace(node, gpus=visible))
+        return dataclasses.replace(cluster, nodes=nodes), capacities
+    
+    def allocate_gpus(self, cluster: ClusterInfo, model_id: str, gpu_count: int, memory_required: int,
+                      priority: Any = "normal", freed: Optional[Dict[Tuple[str, str], int]] = None) -> GPUAllocation:
         """
         为模型分配GPU资源
         
@@ -267,19 +610,39 @@ class GPUResourceManager:
             model_id: 模型ID
             gpu_count: 需要的GPU数量
             memory_required: 每个GPU需要的显存(MB)
+            priority: 部署优先级（high/normal/low或数字），抢占时低优先级实例先被驱逐
+            freed: 集群信息中尚未反映的已释放显存 {(node_id, gpu_id): MB}（如刚被抢占的实例）
             
         Returns:
-            GPUAllocation: 分配结果
+            GPUAllocation: 分配结果，使用账本时 reservation_id 为临时预留ID
         """
         # 如果模型已有分配，先释放
         if model_id in self.allocations:
             self.release_gpus(model_id)
         
-        # 分配GPU
-        allocation = self.scheduler.allocate_gpus(cluster, gpu_count, memory_required)
+        if self.ledger is None:
+            # 分配GPU
+            view = self.available_view(cluster, memory_required, freed)[0] if freed else cluster
+            allocation = self.scheduler.allocate_gpus(view, gpu_count, memory_required)
+        else:
+            allocation = GPUAllocation(success=False, message="预留冲突次数过多")
+            for attempt in range(self.max_reserve_attempts):
+                view, capacities = self.available_view(cluster, memory_required, freed)
+                allocation = self.scheduler.allocate_gpus(view, gpu_count, memory_required)
+                if not allocation.success:
+                    break
+                reserved, result = self.ledger.reserve(cluster.id, allocation.allocation, memory_required,
+                                                       capacities, metadata={"model_id": model_id})
+                if reserved:
+                    allocation.reservation_id = result
+                    break
+                logger.info(f"模型 {model_id} 第 {attempt + 1} 次预留冲突: {result}，重新调度")
+                allocation = GPUAllocation(success=False, message=f"预留冲突: {result}")
         
         # 如果分配成功，记录分配情况
         if allocation.success:
+            allocation.memory_required = memory_required
+            allocation.priority = normalize_priority(priority)
             self.allocations[model_id] = allocation
             logger.info(f"模型 {model_id} 成功分配GPU: {allocation.allocation}")
         else:
@@ -287,6 +650,24 @@ class GPUResourceManager:
         
         return allocation
     
+    def commit_gpus(self, model_id: str) -> bool:
+        """
+        确认模型的GPU预留（集群控制器已启动实例）
+        
+        Args:
+            model_id: 模型ID
+            
+        Returns:
+            bool: 是否确认成功；未使用账本时总是成功
+        """
+        allocation = self.allocations.get(model_id)
+        if allocation is None:
+            logger.warning(f"模型 {model_id} 没有GPU分配记录")
+            return False
+        if self.ledger is None or not allocation.reservation_id:
+            return True
+        return self.ledger.commit(allocation.reservation_id)
+    
     def release_gpus(self, model_id: str) -> bool:
         """
         释放模型的GPU资源
@@ -305,9 +686,24 @@ class GPUResourceManager:
         logger.info(f"释放模型 {model_id} 的GPU资源: {allocation.allocation}")
         
         # 释放资源
+        if self.ledger is not None and allocation.reservation_id:
+            self.ledger.release(allocation.reservation_id)
+        self.scheduler.release(allocation, allocation.memory_required)
         del self.allocations[model_id]
+        
+        for listener in self._release_listeners:
+            try:
+                listener(model_id, allocation)
+            except Exception as e:
+                logger.error(f"GPU释放回调出错: {e}")
         return True
     
+    def preview_allocation(self, cluster: ClusterInfo, gpu_count: int, memory_required: int,
+                           freed: Optional[Dict[Tuple[str, str], int]] = None) -> GPUAllocation:
+        """预演分配（不预留、不记录），freed 为假设额外释放的显存"""
+        view, _ = self.available_view(cluster, memory_required, freed)
+        return self.scheduler.allocate_gpus(view, gpu_count, memory_required)
+    
     def get_allocation(self, model_id: str) -> Optional[GPUAllocation]:
         """获取模型的GPU分配情况"""
         return self.allocations.get(model_id)
@@ -316,6 +712,281 @@ class GPUResourceManager:
         """获取所有模型的GPU分配情况"""
         return self.allocations.copy()
 
+@dataclass
+class PendingDeployment:
+    """等待GPU资源的部署请求"""
+    model_id: str
+    cluster_id: str
+    gpu_count: int
+    memory_required: int
+    priority: int = PRIORITY_LEVELS["normal"]
+    preemptible: bool = False  # 是否允许抢占低优先级的空闲实例
+    on_allocated: Optional[Callable[["PendingDeployment", GPUAllocation], None]] = None
+    on_expired: Optional[Callable[["PendingDeployment"], None]] = None
+    submitted_at: float = field(default_factory=time.time)
+    attempts: int = 0
+    seq: int = 0
+
+class PendingDeploymentQueue:
+    """部署等待队列
+
+    GPU不足时部署请求按 (优先级, 提交顺序) 排队，在GPU释放或周期性检查时自动重试；
+    排在前面的请求放不下时，后面较小的请求仍可先行放置（回填）。
+    允许抢占的请求可以驱逐优先级更低且处于空闲状态的实例，驱逐前先预演确认腾出的资源足够；
+    驱逐后仍无法放置时，被驱逐的实例重新进入队列等待重新部署。
+    """
+
+    def __init__(self, manager: GPUResourceManager, cluster_loader: Callable[[str], Optional[ClusterInfo]],
+                 evictor: Optional[Callable[[str], bool]] = None,
+                 idle_checker: Optional[Callable[[str], bool]] = None,
+                 redeployer: Optional[Callable[[PendingDeployment, GPUAllocation], None]] = None,
+                 max_wait: float = 3600, retry_interval: float = 15):
+        """
+        Args:
+            manager: GPU资源管理器
+            cluster_loader: 按集群ID加载最新集群信息
+            evictor: 停止模型实例的函数 evictor(model_id) -> bool，为空时不抢占
+            idle_checker: 判断模型实例是否空闲的函数 idle_checker(model_id) -> bool
+            redeployer: 重新部署被抢占实例的分配回调，用于不是经本队列放置的实例；
+                        经本队列放置的实例沿用原请求的 on_allocated
+            max_wait: 排队超过该时间(秒)的请求视为超时
+            retry_interval: 后台重试间隔(秒)
+        """
+        self.manager = manager
+        self.cluster_loader = cluster_loader
+        self.evictor = evictor
+        self.idle_checker = idle_checker
+        self.redeployer = redeployer
+        self.max_wait = max_wait
+        self.retry_interval = retry_interval
+
+        self._pending: List[Tuple[int, int, str]] = []  # 堆: (priority, seq, model_id)
+        self._requests: Dict[str, PendingDeployment] = {}
+        self._placed: Dict[str, PendingDeployment] = {}  # 经本队列放置、仍持有GPU的请求，抢占后用于重新入队
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        manager.add_release_listener(self._on_release)
+
+    def _on_release(self, model_id: str, allocation: GPUAllocation):
+        with self._lock:
+            self._placed.pop(model_id, None)
+        self._wakeup.set()
+
+    def start(self):
+        """启动后台重试线程"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._retry_loop, name="pending-deployments")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, request: PendingDeployment) -> Tuple[Optional[GPUAllocation], Optional[int]]:
+        """
+        提交部署请求：能立即分配时直接返回分配结果，否则入队
+
+        Returns:
+            (分配结果或None, 排队位置或None)
+        """
+        allocation = self._try_allocate(request)
+        if allocation is not None:
+            return allocation, None
+
+        position = self._enqueue(request)
+        logger.info(f"部署 {request.model_id} 暂无可用GPU，进入等待队列，优先级 {request.priority}，位置 {position}")
+        return None, position
+
+    def _enqueue(self, request: PendingDeployment) -> Optional[int]:
+        with self._lock:
+            request.seq = next(self._seq)
+            self._requests[request.model_id] = request
+            heapq.heappush(self._pending, (request.priority, request.seq, request.model_id))
+            return self._position_locked(request.model_id)
+
+    def cancel(self, model_id: str) -> bool:
+        """取消排队中的部署"""
+        with self._lock:
+            return self._requests.pop(model_id, None) is not None
+
+    def position(self, model_id: str) -> Optional[int]:
+        """排队位置（从0开始），不在队列中时返回None"""
+        with self._lock:
+            return self._position_locked(model_id)
+
+    def list_pending(self) -> List[Dict[str, Any]]:
+        """排队中的部署请求（按调度顺序）"""
+        with self._lock:
+            ordered = [self._requests[entry[2]] for entry in sorted(self._pending) if entry[2] in self._requests]
+        return [{
+            "model_id": r.model_id,
+            "cluster_id": r.cluster_id,
+            "gpu_count": r.gpu_count,
+            "memory_required": r.memory_required,
+            "priority": r.priority,
+            "preemptible": r.preemptible,
+            "attempts": r.attempts,
+            "waiting": time.time() - r.submitted_at
+        } for r in ordered]
+
+    def _position_locked(self, model_id: str) -> Optional[int]:
+        ordered = [entry[2] for entry in sorted(self._pending) if entry[2] in self._requests]
+        return ordered.index(model_id) if model_id in ordered else None
+
+    # ---------------------- 重试与抢占 ----------------------
+
+    def retry(self) -> int:
+        """按优先级依次重试排队的部署，返回本轮成功放置的数量"""
+        with self._lock:
+            entries = sorted(self._pending)
+
+        placed = 0
+        now = time.time()
+        for _, _, model_id in entries:
+            with self._lock:
+                request = self._requests.get(model_id)
+            if request is None:
+                continue
+
+            if now - request.submitted_at > self.max_wait:
+                logger.warning(f"部署 {model_id} 排队超过 {self.max_wait}秒，放弃")
+                self._remove(model_id)
+                if request.on_expired:
+                    request.on_expired(request)
+                continue
+
+            request.attempts += 1
+            if self._try_allocate(request) is not None:
+                self._remove(model_id)
+                placed += 1
+        return placed
+
+    def _remove(self, model_id: str):
+        with self._lock:
+            self._requests.pop(model_id, None)
+            self._pending = [entry for entry in self._pending if entry[2] in self._requests]
+            heapq.heapify(self._pending)
+
+    def _try_allocate(self, request: PendingDeployment) -> Optional[GPUAllocation]:
+        """尝试分配（必要时抢占），成功时调用 on_allocated"""
+        cluster = self.cluster_loader(request.cluster_id)
+        if cluster is None:
+            return None
+
+        allocation = self.manager.allocate_gpus(cluster, request.model_id, request.gpu_count,
+                                                request.memory_required, request.priority)
+        if not allocation.success and request.preemptible:
+            preempted = self._preempt_for(request, cluster)
+            if preempted is not None:
+                # 集群信息中的显存占用要等下次状态上报才会反映驱逐结果，沿用预演时的释放量分配
+                freed, victims = preempted
+                allocation = self.manager.allocate_gpus(cluster, request.model_id, request.gpu_count,
+                                                        request.memory_required, request.priority, freed)
+                if not allocation.success:
+                    logger.warning(f"抢占后部署 {request.model_id} 仍无法放置: {allocation.message}，被抢占的实例重新排队")
+                    self._requeue(victims, request.cluster_id)
+        if not allocation.success:
+            return None
+
+        with self._lock:
+            self._placed[request.model_id] = request
+        if request.on_allocated:
+            try:
+                request.on_allocated(request, allocation)
+            except Exception as e:
+                logger.error(f"部署 {request.model_id} 分配回调出错: {e}")
+        return allocation
+
+    def _preempt_for(self, request: PendingDeployment, cluster: ClusterInfo):
+        """
+        为请求抢占优先级更低的空闲实例
+
+        候选实例按 (优先级从低到高, 占用从小到大) 依次加入，直到预演分配成功；
+        预演不成功时不驱逐任何实例
+
+        Returns:
+            未抢占时返回None，否则返回 (实际释放的显存 {(node_id, gpu_id): MB}, [(被驱逐的模型ID, 原分配)])
+        """
+        if self.evictor is None:
+            return None
+
+        node_ids = {node.id for node in cluster.nodes}
+        candidates = [
+            (model_id, allocation) for model_id, allocation in self.manager.get_all_allocations().items()
+            if allocation.priority > request.priority
+            and set(allocation.allocation or {}) <= node_ids
+            and (self.idle_checker is None or self.idle_checker(model_id))
+        ]
+        candidates.sort(key=lambda c: (-c[1].priority,
+                                       c[1].memory_required * sum(len(g) for g in c[1].allocation.values())))
+
+        def freed_by(chosen: List[Tuple[str, GPUAllocation]]) -> Dict[Tuple[str, str], int]:
+            freed: Dict[Tuple[str, str], int] = {}
+            for _, allocation in chosen:
+                for node_id, gpu_ids in allocation.allocation.items():
+                    for gpu_id in gpu_ids:
+                        freed[(node_id, gpu_id)] = freed.get((node_id, gpu_id), 0) + allocation.memory_required
+            return freed
+
+        def fits(chosen: List[Tuple[str, GPUAllocation]]) -> bool:
+            return self.manager.preview_allocation(cluster, request.gpu_count, request.memory_required,
+                                                   freed_by(chosen)).success
+
+        chosen = []
+        for candidate in candidates:
+            chosen.append(candidate)
+            if fits(chosen):
+                break
+        else:
+            return None
+
+        # 去掉不影响结果的候选，避免多驱逐
+        for candidate in list(chosen[:-1]):
+            remaining = [c for c in chosen if c is not candidate]
+            if fits(remaining):
+                chosen = remaining
+        with self._lock:
+            originals = {model_id: self._placed.get(model_id) for model_id, _ in chosen}
+
+        evicted = []
+        for model_id, allocation in chosen:
+            logger.info(f"为高优先级部署 {request.model_id} 抢占空闲实例 {model_id}")
+            if self.evictor(model_id):
+                self.manager.release_gpus(model_id)
+                evicted.append((model_id, allocation, originals[model_id]))
+        return freed_by([(model_id, allocation) for model_id, allocation, _ in evicted]), evicted
+
+    def _requeue(self, victims: List[Tuple[str, GPUAllocation, Optional[PendingDeployment]]], cluster_id: str):
+        """被驱逐的实例重新进入等待队列，放置后重新部署"""
+        for model_id, allocation, original in victims:
+            if original is not None:
+                request = dataclasses.replace(original, submitted_at=time.time(), attempts=0)
+            elif self.redeployer is not None:
+                request = PendingDeployment(
+                    model_id=model_id,
+                    cluster_id=cluster_id,
+                    gpu_count=sum(len(gpu_ids) for gpu_ids in allocation.allocation.values()),
+                    memory_required=allocation.memory_required,
+                    priority=allocation.priority,
+                    on_allocated=self.redeployer
+                )
+            else:
+                logger.warning(f"被抢占的实例 {model_id} 没有可用的重新部署方式，未重新排队")
+                continue
+            position = self._enqueue(request)
+            logger.info(f"被抢占的实例 {model_id} 重新排队，位置 {position}")
+
+    def _retry_loop(self):
+        while True:
+            self._wakeup.wait(self.retry_interval)
+            self._wakeup.clear()
+            try:
+                if self._requests:
+                    self.retry()
+            except Exception as e:
+                logger.error(f"重试排队部署时出错: {e}")
+
 
 # 创建全局GPU资源管理器实例
 gpu_resource_manager = GPUResourceManager()
@@ -387,10 +1058,54 @@ def example_usage():
     allocation3 = manager.allocate_gpus(cluster, "model3", 1, 30000)
     print(f"Model3 allocation: {allocation3}")
     
+    # 使用装箱调度器（按实际空闲显存分配）
+    manager.set_scheduler(BinPackingScheduler())
+    
+    # 分配GPU
+    allocation4 = manager.allocate_gpus(cluster, "model4", 1, 8000)
+    print(f"Model4 allocation: {allocation4}")
+
+    # 使用拓扑感知调度器：8卡节点，GPU0-3与GPU4-7各自NVLink全互联
+    from gpu_topology import parse_topology_matrix, attach_topology
+    nvlink_islands = (
+        "\tGPU0\tGPU1\tGPU2\tGPU3\tGPU4\tGPU5\tGPU6\tGPU7\tCPU Affinity\tNUMA Affinity\n"
+        "GPU0\t X \tNV4\tNV4\tNV4\tSYS\tSYS\tSYS\tSYS\t0-23\t0\n"
+        "GPU1\tNV4\t X \tNV4\tNV4\tSYS\tSYS\tSYS\tSYS\t0-23\t0\n"
+        "GPU2\tNV4\tNV4\t X \tNV4\tSYS\tSYS\tSYS\tSYS\t0-23\t0\n"
+        "GPU3\tNV4\tNV4\tNV4\t X \tSYS\tSYS\tSYS\tSYS\t0-23\t0\n"
+        "GPU4\tSYS\tSYS\tSYS\tSYS\t X \tNV4\tNV4\tNV4\t24-47\t1\n"
+        "GPU5\tSYS\tSYS\tSYS\tSYS\tNV4\t X \tNV4\tNV4\t24-47\t1\n"
+        "GPU6\tSYS\tSYS\tSYS\tSYS\tNV4\tNV4\t X \tNV4\t24-47\t1\n"
+        "GPU7\tSYS\tSYS\tSYS\tSYS\tNV4\tNV4\tNV4\t X \t24-47\t1\n"
+    )
+    topology = parse_topology_matrix(nvlink_islands)
+    node3 = NodeInfo(
+        id="node3",
+        name="节点3",
+        ip="10.0.0.3",
+        port=22,
+        status="online"
+    )
+    node3.gpus = [
+        GPUInfo(id=f"node3-gpu-{i}", name="A100-SXM4-80GB", memory_total=81920, gpu_type=GPUType.NVIDIA)
+        for i in range(8)
+    ]
+    attach_topology(node3.gpus, topology, "node3-gpu-")
+    # GPU1已被占用一半显存，4卡张量并行应落到GPU4-7这一组NVLink域
+    node3.gpus[1].extra_info["memory_used"] = 40960
+    topo_cluster = ClusterInfo(id="topo-cluster", name="拓扑测试集群", adapter_type="nvidia", nodes=[node3])
+    manager.set_scheduler(TopologyAwareScheduler())
+
+    # 分配GPU
+    allocation5 = manager.allocate_gpus(topo_cluster, "model5", 4, 60000)
+    print(f"Model5 allocation: {allocation5}")
+
     # 释放资源
     manager.release_gpus("model1")
     manager.release_gpus("model2")
     manager.release_gpus("model3")
+    manager.release_gpus("model4")
+    manager.release_gpus("model5")
 
 if __name__ == "__main__":
     example_usage()
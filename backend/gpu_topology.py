@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+GPU互联拓扑
+解析 `nvidia-smi topo -m` 输出，得到GPU之间的连接类型（NVLink / PCIe / 跨NUMA）以及
+每张GPU所属的NUMA节点，并提供用于张量并行放置的GPU组评分
+"""
+
+import itertools
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("gpu_topology")
+
+# 连接类型得分，越大越好；NV# 为 NVLINK_BASE_SCORE + NVLink条数
+LINK_SCORES = {
+    "PIX": 4,   # 最多经过一个PCIe桥
+    "PXB": 3,   # 经过多个PCIe桥，不经过Host Bridge
+    "PHB": 2,   # 经过PCIe Host Bridge（通常是CPU）
+    "NODE": 1,  # 同一NUMA节点内跨Host Bridge
+    "SYS": 0    # 跨NUMA节点（QPI/UPI）
+}
+NVLINK_BASE_SCORE = 10
+UNKNOWN_LINK_SCORE = 0
+
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def link_score(link: Optional[str]) -> int:
+    """连接类型得分"""
+    if not link:
+        return UNKNOWN_LINK_SCORE
+    match = re.match(r"NV(\d+)$", link)
+    if match:
+        return NVLINK_BASE_SCORE + int(match.group(1))
+    return LINK_SCORES.get(link, UNKNOWN_LINK_SCORE)
+
+
+def parse_topology_matrix(output: str) -> Dict[str, Dict[str, Any]]:
+    """
+    解析 `nvidia-smi topo -m` 输出
+
+    Args:
+        output: 命令输出（可包含终端颜色控制符）
+
+    Returns:
+        Dict: GPU序号 -> {"links": {对端GPU序号: 连接类型}, "cpu_affinity": str, "numa_node": int或None}
+    """
+    lines = [_ANSI_ESCAPE.sub("", line) for line in output.splitlines()]
+    header_index = next((i for i, line in enumerate(lines) if re.match(r"\s+GPU\d+", line)), None)
+    if header_index is None:
+        return {}
+
+    # 表头中的设备列（GPU、NIC/mlx网卡）位于 "CPU Affinity" 之前
+    header = lines[header_index].split()
+    devices = list(itertools.takewhile(lambda name: name != "CPU", header))
+    has_numa = "NUMA" in header
+
+    topology = {}
+    for line in lines[header_index + 1:]:
+        tokens = line.split()
+        if not tokens or not re.match(r"GPU\d+$", tokens[0]):
+            if topology:
+                break  # 矩阵结束（图例或空行）
+            continue
+        cells = tokens[1:1 + len(devices)]
+        rest = tokens[1 + len(devices):]
+        links = {}
+        for device, cell in zip(devices, cells):
+            if device.startswith("GPU") and device != tokens[0]:
+                links[device[3:]] = cell
+        numa_node = None
+        if has_numa and len(rest) >= 2 and rest[1].isdigit():
+            numa_node = int(rest[1])
+        topology[tokens[0][3:]] = {
+            "links": links,
+            "cpu_affinity": rest[0] if rest else "",
+            "numa_node": numa_node
+        }
+    return topology
+
+
+def attach_topology(gpus: List[Any], topology: Dict[str, Dict[str, Any]], id_prefix: str):
+    """
+    将解析出的拓扑写入 GPUInfo.extra_info["topology"]，对端以GPU ID表示
+
+    Args:
+        gpus: GPUInfo列表，ID形如 f"{id_prefix}{序号}"
+        topology: parse_topology_matrix 的结果
+        id_prefix: GPU ID前缀（例如 "node1-gpu-"）
+    """
+    for gpu in gpus:
+        index = gpu.id[len(id_prefix):] if gpu.id.startswith(id_prefix) else gpu.id
+        entry = topology.get(index)
+        if entry is None:
+            continue
+        gpu.extra_info["topology"] = {
+            "links": {f"{id_prefix}{peer}": link for peer, link in entry["links"].items()},
+            "cpu_affinity": entry["cpu_affinity"],
+            "numa_node": entry["numa_node"]
+        }
+
+
+def gpu_link(gpu_a: Any, gpu_b: Any) -> Optional[str]:
+    """两张GPU之间的连接类型，缺少拓扑信息时返回None"""
+    links = gpu_a.extra_info.get("topology", {}).get("links", {})
+    if gpu_b.id in links:
+        return links[gpu_b.id]
+    return gpu_b.extra_info.get("topology", {}).get("links", {}).get(gpu_a.id)
+
+
+def gpu_numa_node(gpu: Any) -> Optional[int]:
+    """GPU所属NUMA节点，未知时返回None"""
+    return gpu.extra_info.get("topology", {}).get("numa_node")
+
+
+def group_score(gpus: List[Any]) -> tuple:
+    """
+    GPU组的拓扑得分，元组越大越好:
+    (最差一对连接得分, 是否同一NUMA节点, 所有连接得分之和)
+
+    张量并行的集合通信受最慢链路限制，因此首先比较最差连接
+    """
+    if len(gpus) < 2:
+        return (NVLINK_BASE_SCORE, 1, 0)
+    scores = [link_score(gpu_link(a, b)) for a, b in itertools.combinations(gpus, 2)]
+    numa_nodes = {gpu_numa_node(gpu) for gpu in gpus}
+    same_numa = 1 if len(numa_nodes) == 1 and None not in numa_nodes else 0
+    return (min(scores), same_numa, sum(scores))
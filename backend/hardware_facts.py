@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+主机硬件信息采集
+Linux上直接读取 /proc 和 /sys，macOS上把一次采集需要的外部命令合并为一次shell调用；
+互不依赖的探测并行执行，静态信息（CPU、总内存、机型等）缓存到磁盘并设置TTL
+"""
+
+import json
+import logging
+import os
+import platform
+import re
+import secrets
+import shlex
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("hardware_facts")
+
+# 静态信息缓存文件及有效期
+DEFAULT_CACHE_PATH = os.environ.get(
+    "HARDWARE_FACTS_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "model-deploy", "hardware_facts.json")
+)
+DEFAULT_CACHE_TTL = int(os.environ.get("HARDWARE_FACTS_TTL", 24 * 60 * 60))
+
+# 一次外部命令调用（包括合并后的整批命令）的超时时间(秒)
+COMMAND_TIMEOUT = 15
+
+
+def _read_file(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read()
+
+
+def _run(args: List[str]) -> str:
+    return subprocess.check_output(args, timeout=COMMAND_TIMEOUT).decode()
+
+
+def run_command_batch(commands: Dict[str, List[str]]) -> Dict[str, str]:
+    """
+    在一次shell调用中依次执行多个命令，按分隔行切分各自的输出
+
+    Args:
+        commands: 段名 -> 命令参数列表
+
+    Returns:
+        Dict: 段名 -> 标准输出；执行失败的命令输出为空
+    """
+    if len(commands) == 1:
+        (name, args), = commands.items()
+        return {name: _run(args)}
+
+    marker = f"@@hardware-facts-{secrets.token_hex(8)}@@"
+    script = "; ".join(f"echo {marker} {name}; {shlex.join(args)} 2>/dev/null"
+                       for name, args in commands.items())
+    output = subprocess.run(["/bin/sh", "-c", script], stdout=subprocess.PIPE,
+                            timeout=COMMAND_TIMEOUT).stdout.decode()
+
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in output.splitlines(keepends=True):
+        if line.startswith(marker):
+            current = line[len(marker):].strip()
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    return {name: "".join(lines) for name, lines in sections.items()}
+
+
+def _parse_meminfo(text: str) -> Dict[str, int]:
+    """解析 /proc/meminfo，返回 字段 -> KB"""
+    values = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].endswith(":"):
+            try:
+                values[parts[0][:-1]] = int(parts[1])
+            except ValueError:
+                continue
+    return values
+
+
+# ====================== 探测函数 ======================
+
+def probe_os() -> Dict[str, Any]:
+    """操作系统信息（不调用外部命令）"""
+    return {
+        "hostname": platform.node(),
+        "os": platform.system(),
+        "os_release": platform.release(),
+        "os_version": platform.version(),
+        "cpu_arch": platform.machine()
+    }
+
+
+def probe_linux_cpu() -> Dict[str, Any]:
+    """从 /proc/cpuinfo 读取CPU型号和核心数"""
+    cpu_model = ""
+    for line in _read_file("/proc/cpuinfo").splitlines():
+        if line.startswith("model name") and ":" in line:
+            cpu_model = line.split(":", 1)[1].strip()
+            break
+    return {"cpu_model": cpu_model, "cpu_cores": os.cpu_count() or 0}
+
+
+def probe_linux_memory_total() -> Dict[str, Any]:
+    """从 /proc/meminfo 读取总内存(MB)"""
+    meminfo = _parse_meminfo(_read_file("/proc/meminfo"))
+    return {"memory_total": meminfo.get("MemTotal", 0) // 1024}
+
+
+def probe_linux_memory_available() -> Dict[str, Any]:
+    """从 /proc/meminfo 读取可用内存(MB)"""
+    meminfo = _parse_meminfo(_read_file("/proc/meminfo"))
+    available = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+    return {"memory_available": available // 1024}
+
+
+def probe_linux_sys() -> Dict[str, Any]:
+    """从 /sys 读取NUMA节点数和机器型号"""
+    facts: Dict[str, Any] = {}
+    node_dir = "/sys/devices/system/node"
+    if os.path.isdir(node_dir):
+        facts["numa_nodes"] = len([d for d in os.listdir(node_dir) if re.match(r"node\d+$", d)])
+    product_path = "/sys/class/dmi/id/product_name"
+    if os.path.exists(product_path):
+        try:
+            facts["model_name"] = _read_file(product_path).strip()
+        except OSError:
+            pass
+    return facts
+
+
+def parse_darwin_sysctl(output: str) -> Dict[str, Any]:
+    """解析 sysctl -n hw.ncpu machdep.cpu.brand_string hw.memsize：CPU核心数、CPU型号和总内存"""
+    lines = [line.strip() for line in output.strip().splitlines()]
+    facts: Dict[str, Any] = {}
+    if len(lines) >= 3:
+        facts["cpu_cores"] = int(lines[0])
+        facts["cpu_model"] = lines[1]
+        facts["memory_total"] = int(lines[2]) // (1024 * 1024)
+    return facts
+
+
+def parse_darwin_hardware(output: str) -> Dict[str, Any]:
+    """解析 system_profiler SPHardwareDataType -json：机型、芯片和内存（耗时较长，结果随静态信息缓存）"""
+    if not output.strip():
+        return {}
+    items = json.loads(output).get("SPHardwareDataType", [])
+    if not items:
+        return {}
+    hardware = items[0]
+    facts: Dict[str, Any] = {
+        "model_name": hardware.get("machine_name", ""),
+        "chip_model": hardware.get("chip_type", "").replace("Apple ", "", 1)
+    }
+    memory_match = re.search(r"(\d+)\s*GB", hardware.get("physical_memory", ""))
+    if memory_match:
+        facts["unified_memory"] = int(memory_match.group(1)) * 1024
+    return facts
+
+
+def parse_darwin_vm_stat(vm_stat: str) -> Dict[str, Any]:
+    """解析 vm_stat：空闲内存(MB)"""
+    page_size_match = re.search(r"page size of (\d+) bytes", vm_stat)
+    pages_free_match = re.search(r"Pages free:\s+(\d+)", vm_stat)
+    if page_size_match and pages_free_match:
+        page_size = int(page_size_match.group(1))
+        pages_free = int(pages_free_match.group(1))
+        return {"memory_available": (pages_free * page_size) // (1024 * 1024)}
+    return {}
+
+
+# 各系统的探测函数：static 结果缓存，dynamic 每次采集
+PROBES: Dict[str, Dict[str, List[Callable[[], Dict[str, Any]]]]] = {
+    "Linux": {
+        "static": [probe_os, probe_linux_cpu, probe_linux_memory_total, probe_linux_sys],
+        "dynamic": [probe_linux_memory_available]
+    },
+    "Darwin": {
+        "static": [probe_os],
+        "dynamic": []
+    }
+}
+
+# 各系统需要外部命令的探测：段名 -> (命令, 输出解析函数)；同一次采集需要的命令合并为一次shell调用
+CommandProbe = Tuple[List[str], Callable[[str], Dict[str, Any]]]
+COMMAND_PROBES: Dict[str, Dict[str, Dict[str, CommandProbe]]] = {
+    "Darwin": {
+        "static": {
+            "sysctl": (["sysctl", "-n", "hw.ncpu", "machdep.cpu.brand_string", "hw.memsize"], parse_darwin_sysctl),
+            "hardware": (["system_profiler", "SPHardwareDataType", "-json"], parse_darwin_hardware)
+        },
+        "dynamic": {
+            "vm_stat": (["vm_stat"], parse_darwin_vm_stat)
+        }
+    }
+}
+
+
+# ====================== 采集器 ======================
+
+class HardwareFactsCollector:
+    """硬件信息采集器"""
+
+    def __init__(self, cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                 ttl: float = DEFAULT_CACHE_TTL, max_workers: int = 4):
+        """
+        Args:
+            cache_path: 静态信息缓存文件，为空时不使用磁盘缓存
+            ttl: 缓存有效期(秒)
+            max_workers: 并行探测的线程数
+        """
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.system = platform.system()
+        self._static: Optional[Dict[str, Any]] = None
+        self._static_at = 0.0
+        self._lock = threading.Lock()
+
+    def collect(self, refresh: bool = False, include_dynamic: bool = True) -> Dict[str, Any]:
+        """
+        采集主机硬件信息
+
+        Args:
+            refresh: 忽略缓存重新探测静态信息
+            include_dynamic: 是否同时采集可用内存等动态信息
+
+        Returns:
+            Dict: 硬件信息，内存单位MB
+        """
+        probes = PROBES.get(self.system, {"static": [probe_os], "dynamic": []})
+        commands = COMMAND_PROBES.get(self.system, {"static": {}, "dynamic": {}})
+        dynamic_probes = probes["dynamic"] if include_dynamic else []
+        dynamic_commands = commands["dynamic"] if include_dynamic else {}
+
+        dynamic = None
+        with self._lock:
+            static = None if refresh else self._cached_static()
+            if static is None:
+                started = time.time()
+                # 静态信息需要重新探测时，动态信息的外部命令与静态命令合并为一次调用
+                results = self._run_probes({"static": probes["static"], "dynamic": dynamic_probes},
+                                           {"static": commands["static"], "dynamic": dynamic_commands})
+                static, dynamic = results["static"], results["dynamic"]
+                static["collected_at"] = time.time()
+                self._static, self._static_at = static, static["collected_at"]
+                self._save_cache(static)
+                logger.info(f"采集主机静态硬件信息耗时 {time.time() - started:.3f}秒")
+
+        if dynamic is None:
+            dynamic = self._run_probes({"dynamic": dynamic_probes}, {"dynamic": dynamic_commands})["dynamic"]
+        facts = dict(static)
+        facts.update(dynamic)
+        return facts
+
+    def _run_probes(self, probes: Dict[str, List[Callable[[], Dict[str, Any]]]],
+                    commands: Dict[str, Dict[str, CommandProbe]]) -> Dict[str, Dict[str, Any]]:
+        """
+        并行执行探测函数和（合并为一次调用的）外部命令，按类别合并结果，单个探测失败不影响其他探测
+
+        Args:
+            probes: 类别(static/dynamic) -> 探测函数列表
+            commands: 类别 -> {段名: (命令, 解析函数)}
+
+        Returns:
+            Dict: 类别 -> 硬件信息
+        """
+        facts: Dict[str, Dict[str, Any]] = {kind: {} for kind in probes}
+        jobs = [(kind, probe) for kind, kind_probes in probes.items() for probe in kind_probes]
+        sections = {name: (kind, command, parser)
+                    for kind, kind_commands in commands.items()
+                    for name, (command, parser) in kind_commands.items()}
+        if sections:
+            def run_commands():
+                return self._run_commands(sections)
+            jobs.append((None, run_commands))
+        if not jobs:
+            return facts
+
+        if len(jobs) == 1:
+            results = [self._safe_probe(jobs[0][1])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+                results = list(pool.map(self._safe_probe, [probe for _, probe in jobs]))
+        for (kind, _), result in zip(jobs, results):
+            if kind is None:
+                for command_kind, command_facts in result.items():
+                    facts[command_kind].update(command_facts)
+            else:
+                facts[kind].update(result)
+        return facts
+
+    @staticmethod
+    def _run_commands(sections: Dict[str, Tuple[str, List[str], Callable[[str], Dict[str, Any]]]]
+                      ) -> Dict[str, Dict[str, Any]]:
+        """一次shell调用执行所有外部命令，逐段解析；返回 类别 -> 硬件信息"""
+        outputs = run_command_batch({name: command for name, (_, command, _) in sections.items()})
+        facts: Dict[str, Dict[str, Any]] = {}
+        for name, (kind, _, parser) in sections.items():
+            try:
+                parsed = parser(outputs.get(name, ""))
+            except Exception as e:
+                logger.warning(f"解析 {name} 输出失败: {e}")
+                parsed = {}
+            facts.setdefault(kind, {}).update(parsed)
+        return facts
+
+    @staticmethod
+    def _safe_probe(probe: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            return probe()
+        except Exception as e:
+            logger.warning(f"硬件探测 {probe.__name__} 失败: {e}")
+            return {}
+
+    def _cached_static(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        if self._static is not None and now - self._static_at < self.ttl:
+            return self._static
+
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, "r") as f:
+                cached = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取硬件信息缓存失败: {e}")
+            return None
+
+        collected_at = cached.get("collected_at", 0)
+        # 缓存文件可能来自其他主机（共享home目录），主机名不一致时视为失效
+        if now - collected_at >= self.ttl or cached.get("hostname") != platform.node():
+            return None
+        self._static, self._static_at = cached, collected_at
+        return cached
+
+    def _save_cache(self, static: Dict[str, Any]):
+        if not self.cache_path:
+            return
+        try:
+            cache_dir = os.path.dirname(self.cache_path)
+            if cache_dir and not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(static, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"写入硬件信息缓存失败: {e}")
+
+
+# 全局采集器实例
+hardware_facts_collector = HardwareFactsCollector()
+
+
+def get_host_facts(refresh: bool = False, include_dynamic: bool = True) -> Dict[str, Any]:
+    """使用全局采集器获取本机硬件信息"""
+    return hardware_facts_collector.collect(refresh=refresh, include_dynamic=include_dynamic)
@@ -15,6 +15,8 @@ import logging
 from flask import Flask, request, jsonify, Blueprint
 from flask_cors import CORS
 
+from weight_cache import get_weight_cache
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -47,6 +49,21 @@ def run_command(command, cwd=None):
         logger.error(f"错误输出: {e.stderr}")
         return False, e.stderr
 
+def release_weights(model_id):
+    """释放模型占用的权重缓存条目引用"""
+    weight_path = running_models.get(model_id, {}).pop("weight_path", None)
+    weight_cache = get_weight_cache()
+    if weight_path and weight_cache:
+        weight_cache.release(weight_path)
+
+def invalidate_routing_table():
+    """实例上线或停止后让模型路由器的路由表失效，避免继续向已停止的实例转发请求"""
+    try:
+        from model_schedule.router import routing_table
+        routing_table.invalidate()
+    except ImportError as e:
+        logger.warning(f"模型路由器不可用，跳过路由表失效: {e}")
+
 def deploy_model_thread(model_id, model_name, model_path, port, device, max_memory=None, image=None):
     """在后台线程中部署模型"""
     try:
@@ -58,10 +75,20 @@ def deploy_model_thread(model_id, model_name, model_path, port, device, max_memo
         logger.info(f"最大内存: {max_memory}G")
         logger.info(f"镜像: {image if image else 'transformers:apple-lite-v1'}")
         
-        # 如果是OSS路径，使用本地测试模型路径
+        # 如果是OSS路径，通过节点本地权重缓存获取；未配置对象存储时使用本地测试模型路径
         if model_path.startswith('oss://'):
-            logger.warning(f"检测到OSS路径: {model_path}，使用本地测试模型")
-            model_path = "/Users/wanggao/CascadeProjects/model-deploy-form/models/Qwen2.5-0.5B"
+            weight_cache = get_weight_cache()
+            if weight_cache:
+                logger.info(f"检测到OSS路径: {model_path}，从权重缓存获取")
+                running_models[model_id]["status"] = "fetching_weights"
+                model_path = weight_cache.materialize(model_path)
+                # 模型运行期间保持对缓存条目的引用，停止时释放
+                running_models[model_id]["weight_path"] = model_path
+                running_models[model_id]["status"] = "deploying"
+                logger.info(f"模型权重已就绪: {model_path}")
+            else:
+                logger.warning(f"检测到OSS路径: {model_path}，未配置对象存储，使用本地测试模型")
+                model_path = "/Users/wanggao/CascadeProjects/model-deploy-form/models/Qwen2.5-0.5B"
         
         # 获取脚本目录
         script_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_build")
@@ -117,6 +144,7 @@ def deploy_model_thread(model_id, model_name, model_path, port, device, max_memo
             logger.error(f"模型 {model_id} 部署失败: {output}")
             running_models[model_id]["status"] = "failed"
             running_models[model_id]["error"] = output
+            release_weights(model_id)
             return
         
         # 打印端口信息，方便测试
@@ -187,11 +215,13 @@ def deploy_model_thread(model_id, model_name, model_path, port, device, max_memo
         except Exception as e:
             logger.warning(f"更新全局模型实例列表失败: {str(e)}")
         
+        invalidate_routing_table()
         logger.info(f"模型 {model_id} 部署成功并已添加到模型列表")
     except Exception as e:
         logger.exception(f"部署模型 {model_id} 时发生异常: {str(e)}")
         running_models[model_id]["status"] = "failed"
         running_models[model_id]["error"] = str(e)
+        release_weights(model_id)
 
 @model_deployment_api.route('/api/models/deploy', methods=['POST'])
 def deploy_model():
@@ -305,6 +335,8 @@ def stop_model(model_id):
     if success:
         model_info["status"] = "stopped"
         model_info["stop_time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        release_weights(model_id)
+        invalidate_routing_table()
         
         return jsonify({
             "status": "success",
@@ -0,0 +1,234 @@
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+import requests
+
+
+class HedgePolicy:
+    """
+    对冲请求策略
+
+    首token在对冲延迟内没有到达时，把同一请求再发给另一个实例，先返回首token的实例胜出。
+    对冲延迟取最近首token耗时的分位数；预算按主请求数累积，每次对冲消耗一个，
+    保证对冲额外增加的请求不超过主请求的 budget_ratio 倍。
+    """
+
+    def __init__(self, percentile=0.95, min_delay_ms=200, default_delay_ms=2000,
+                 budget_ratio=0.1, max_budget=10.0, window=500, min_samples=20):
+        """
+        Args:
+            percentile: 对冲延迟取首token耗时的分位数
+            min_delay_ms: 对冲延迟下限(毫秒)
+            default_delay_ms: 样本不足时的对冲延迟(毫秒)
+            budget_ratio: 每个主请求累积的对冲预算
+            max_budget: 预算上限（允许短时间内连续对冲的次数）
+            window: 保留的首token耗时样本数
+            min_samples: 使用分位数所需的最少样本数
+        """
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.default_delay_ms = default_delay_ms
+        self.budget_ratio = budget_ratio
+        self.max_budget = max_budget
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._budget = max_budget
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'failovers': 0, 'budget_exhausted': 0}
+
+    def record_ttft(self, ttft_ms):
+        with self._lock:
+            self._samples.append(ttft_ms)
+
+    def delay(self):
+        """当前的对冲延迟(秒)"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return self.default_delay_ms / 1000
+        value = samples[min(math.ceil(len(samples) * self.percentile) - 1, len(samples) - 1)]
+        return max(value, self.min_delay_ms) / 1000
+
+    def on_request(self):
+        """主请求到达，累积预算"""
+        with self._lock:
+            self.counters['requests'] += 1
+            self._budget = min(self._budget + self.budget_ratio, self.max_budget)
+
+    def try_acquire(self):
+        """申请一次对冲，预算不足时返回False"""
+        with self._lock:
+            if self._budget < 1:
+                self.counters['budget_exhausted'] += 1
+                return False
+            self._budget -= 1
+            self.counters['hedged'] += 1
+            return True
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def metrics(self):
+        with self._lock:
+            return {**self.counters, 'budget': round(self._budget, 2),
+                    'samples': len(self._samples)}
+
+
+class Attempt(threading.Thread):
+    """向一个实例发出的流式请求，收到的每一行放入共享队列"""
+
+    def __init__(self, instance, url, headers, data, events, timeout):
+        super().__init__(daemon=True)
+        self.instance = instance
+        self.url = url
+        self.headers = headers
+        self.data = data
+        self.events = events
+        self.timeout = timeout
+        self.started = time.time()
+        self.cancelled = False
+        self._response = None
+
+    def run(self):
+        try:
+            response = requests.post(self.url, headers=self.headers, json=self.data,
+                                     stream=True, timeout=self.timeout)
+            self._response = response
+            if self.cancelled:
+                return
+            if response.status_code != 200:
+                self.events.put((self, 'error', f"模型API返回错误: {response.status_code}"))
+                return
+            for line in response.iter_lines():
+                if self.cancelled:
+                    return
+                if line:
+                    self.events.put((self, 'line', line))
+            self.events.put((self, 'done', None))
+        except Exception as e:
+            if not self.cancelled:
+                self.events.put((self, 'error', f"连接模型API时发生错误: {str(e)}"))
+        finally:
+            if self._response is not None:
+                self._response.close()
+
+    def cancel(self):
+        """取消请求，关闭连接让上游停止生成"""
+        self.cancelled = True
+        if self._response is not None:
+            try:
+                self._response.close()
+            except Exception:
+                pass
+
+
+def hedged_stream(primary, pick_backup, make_request, policy, timeout=30, on_start=None, on_finish=None,
+                  on_first_token=None):
+    """
+    带对冲和首token失败转移的流式请求
+
+    主请求在 policy.delay() 内没有首token且预算允许时，向备选实例发出同一请求；
+    主请求在首token之前出错时，不消耗预算直接转移到备选实例。先返回首token的实例胜出，另一个被取消。
+
+    Args:
+        primary: 首选实例
+        pick_backup: pick_backup(已尝试的实例ID集合) 返回备选实例或None
+        make_request: make_request(实例) 返回 (url, headers, data)
+        policy: HedgePolicy
+        timeout: 等待首token的最长时间(秒)
+        on_start / on_finish: 每个尝试开始/结束时的回调，参数为实例
+        on_first_token: on_first_token(胜出实例, 首token耗时ms)
+
+    Yields:
+        ('line', 实例, 行字节) 或 ('error', None, 错误信息)
+    """
+    events = queue.Queue()
+    attempts = []
+    tried = set()
+    policy.on_request()
+
+    def launch(instance):
+        url, headers, data = make_request(instance)
+        attempt = Attempt(instance, url, headers, data, events, timeout)
+        attempts.append(attempt)
+        tried.add(instance['id'])
+        if on_start:
+            on_start(instance)
+        attempt.start()
+        return attempt
+
+    def finish(attempt):
+        attempt.cancel()
+        if on_finish and not getattr(attempt, 'finished', False):
+            attempt.finished = True
+            on_finish(attempt.instance)
+
+    launch(primary)
+    deadline = time.time() + timeout
+    hedge_at = time.time() + policy.delay()
+    winner = None
+    hedged = False
+    last_error = None
+    try:
+        # 等待首token
+        while winner is None:
+            live = [a for a in attempts if not getattr(a, 'finished', False)]
+            now = time.time()
+            if not live or now >= deadline:
+                yield ('error', None, last_error or "等待模型首token超时")
+                return
+            wait_until = deadline if len(attempts) > 1 else min(hedge_at, deadline)
+            try:
+                attempt, kind, payload = events.get(timeout=max(wait_until - now, 0.001))
+            except queue.Empty:
+                if len(attempts) == 1 and time.time() >= hedge_at:
+                    # 无论是否发出对冲，每个请求最多对冲一次
+                    hedge_at = deadline
+                    backup = pick_backup(tried)
+                    if backup is not None and policy.try_acquire():
+                        print(f"实例 {primary['id']} 在对冲延迟内没有首token，对冲到 {backup['id']}")
+                        hedged = True
+                        launch(backup)
+                continue
+            if kind == 'line':
+                winner = attempt
+                ttft_ms = (time.time() - attempt.started) * 1000
+                policy.record_ttft(ttft_ms)
+                if on_first_token:
+                    on_first_token(attempt.instance, ttft_ms)
+                if hedged and attempt is not attempts[0]:
+                    policy.count('hedge_wins')
+                yield ('line', attempt.instance, payload)
+            else:
+                # 首token之前结束或出错：该尝试失败，必要时转移到备选实例
+                last_error = payload if kind == 'error' else "模型没有返回任何内容"
+                finish(attempt)
+                if len(attempts) == 1:
+                    backup = pick_backup(tried)
+                    if backup is not None:
+                        print(f"实例 {attempt.instance['id']} 失败({last_error})，转移到 {backup['id']}")
+                        policy.count('failovers')
+                        launch(backup)
+
+        # 取消落后的尝试，只转发胜出实例的输出
+        for attempt in attempts:
+            if attempt is not winner:
+                finish(attempt)
+        while True:
+            attempt, kind, payload = events.get()
+            if attempt is not winner:
+                continue
+            if kind == 'line':
+                yield ('line', winner.instance, payload)
+            elif kind == 'error':
+                yield ('error', None, payload)
+                return
+            else:
+                return
+    finally:
+        for attempt in attempts:
+            finish(attempt)
@@ -1,9 +1,18 @@
+import bisect
+import hashlib
+import itertools
 import json
+import math
+import os
 import random
+import threading
+import time
 import requests
 from flask import Blueprint, request, Response, jsonify, current_app
 from functools import wraps
 
+from model_schedule.hedging import HedgePolicy, hedged_stream
+
 # 创建Blueprint
 router_bp = Blueprint('model_router', __name__)
 
@@ -28,12 +37,258 @@ def get_model_instances():
     print(f"使用全局变量中的 {len(model_instances)} 个模型实例")
     return model_instances
 
+class RoutingTable:
+    """
+    内存中的路由表（模型实例列表）
+    
+    - 在 ttl 内直接返回缓存
+    - 过期但未超过 max_stale 时先返回旧数据，同时在后台刷新（stale-while-revalidate）
+    - 没有数据或过期太久时同步刷新
+    - 同一时刻只有一个刷新在执行，并发的同步调用方等待同一次刷新结果（single-flight）
+    - 后台线程每 refresh_interval 秒主动刷新一次
+    - 部署或停止实例后调用 invalidate()，下次访问同步重新加载；其他途径的实例变化（如容器异常退出）
+      最多延迟 max_stale 秒（通常为 refresh_interval 秒）才会反映到路由表
+    """
+    
+    def __init__(self, loader, ttl=5.0, max_stale=60.0, refresh_interval=10.0):
+        """
+        Args:
+            loader: 返回模型实例列表的函数
+            ttl: 缓存新鲜时间(秒)
+            max_stale: 允许返回的最大过期时间(秒)
+            refresh_interval: 后台刷新间隔(秒)，0表示不启动后台刷新
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.refresh_interval = refresh_interval
+        self._instances = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = None  # 进行中刷新的完成事件
+        self._refresher = None
+        self._generation = 0  # invalidate() 的次数
+        self._loaded_generation = 0  # 最近一次成功加载开始时的 _generation
+        self.refresh_count = 0
+        self.error_count = 0
+    
+    def get(self):
+        """获取路由表"""
+        if self.refresh_interval and self._refresher is None:
+            self._start_background()
+        instances = self._instances
+        age = time.time() - self._loaded_at
+        if instances is not None and age < self.ttl:
+            return instances
+        if instances is not None and age < self.max_stale:
+            self._refresh(wait=False)
+            return instances
+        generation = self._generation
+        self._refresh(wait=True)
+        if self._loaded_generation < generation:
+            # 复用的刷新在失效之前就已开始，结果可能仍包含已停止的实例，再加载一次
+            self._refresh(wait=True)
+        return self._instances or []
+    
+    def invalidate(self):
+        """标记路由表失效（部署或停止实例后调用），下次访问时同步重新加载"""
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = 0.0
+    
+    def _refresh(self, wait):
+        """发起刷新；已有刷新在进行时复用它"""
+        with self._lock:
+            done = self._refreshing
+            leader = done is None
+            if leader:
+                done = self._refreshing = threading.Event()
+        if leader:
+            if wait:
+                self._load(done)
+            else:
+                threading.Thread(target=self._load, args=(done,), daemon=True).start()
+        elif wait:
+            done.wait()
+    
+    def _load(self, done):
+        generation = self._generation
+        try:
+            instances = self.loader()
+            self._instances = list(instances or [])
+            # 加载期间被标记失效时保持过期，下次访问重新加载
+            if generation == self._generation:
+                self._loaded_at = time.time()
+            self._loaded_generation = generation
+            self.refresh_count += 1
+        except Exception as e:
+            self.error_count += 1
+            print(f"刷新路由表失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = None
+            done.set()
+    
+    def _start_background(self):
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._background_loop, daemon=True)
+        self._refresher.start()
+    
+    def _background_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self._refresh(wait=True)
+    
+    def status(self):
+        """路由表状态"""
+        return {
+            'instances': len(self._instances or []),
+            'age_seconds': round(time.time() - self._loaded_at, 3) if self._instances is not None else None,
+            'refresh_count': self.refresh_count,
+            'error_count': self.error_count
+        }
+
+# 全局路由表，TTL 可通过环境变量调整
+routing_table = RoutingTable(get_model_instances,
+                             ttl=float(os.environ.get('MODEL_ROUTER_TABLE_TTL', 5)),
+                             refresh_interval=float(os.environ.get('MODEL_ROUTER_TABLE_REFRESH', 10)))
+
+# 默认调度策略，可被请求中的 strategy 字段或查询参数覆盖
+DEFAULT_STRATEGY = os.environ.get('MODEL_ROUTER_STRATEGY', 'least_load')
+
+# 首token耗时EWMA的平滑系数
+TTFT_EWMA_ALPHA = 0.2
+
+class InstanceStats:
+    """模型实例的实时负载统计：进行中的请求数和首token耗时(TTFT)的EWMA"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._ttft_ewma = {}
+        self._requests = {}
+    
+    def begin(self, instance_id):
+        """请求开始转发到实例"""
+        with self._lock:
+            self._in_flight[instance_id] = self._in_flight.get(instance_id, 0) + 1
+            self._requests[instance_id] = self._requests.get(instance_id, 0) + 1
+    
+    def end(self, instance_id):
+        """请求结束（成功、失败或客户端断开）"""
+        with self._lock:
+            self._in_flight[instance_id] = max(self._in_flight.get(instance_id, 0) - 1, 0)
+    
+    def record_ttft(self, instance_id, ttft_ms):
+        """记录一次首token耗时(毫秒)"""
+        with self._lock:
+            previous = self._ttft_ewma.get(instance_id)
+            self._ttft_ewma[instance_id] = (ttft_ms if previous is None
+                                            else TTFT_EWMA_ALPHA * ttft_ms + (1 - TTFT_EWMA_ALPHA) * previous)
+    
+    def in_flight(self, instance_id):
+        return self._in_flight.get(instance_id, 0)
+    
+    def ttft_ewma(self, instance_id):
+        return self._ttft_ewma.get(instance_id)
+    
+    def snapshot(self):
+        """所有实例的统计"""
+        with self._lock:
+            ids = set(self._in_flight) | set(self._ttft_ewma)
+            return {instance_id: {
+                'in_flight': self._in_flight.get(instance_id, 0),
+                'ttft_ewma_ms': round(self._ttft_ewma[instance_id], 1) if instance_id in self._ttft_ewma else None,
+                'requests': self._requests.get(instance_id, 0)
+            } for instance_id in ids}
+
+# 全局实例统计
+instance_stats = InstanceStats()
+
+# 对冲请求：默认关闭，可通过环境变量、app.config['ROUTER_HEDGING'] 或请求中的 hedge 开启
+HEDGING_ENABLED = os.environ.get('MODEL_ROUTER_HEDGE', '').lower() in ('1', 'true', 'yes')
+hedge_policy = HedgePolicy(
+    percentile=float(os.environ.get('MODEL_ROUTER_HEDGE_PERCENTILE', 0.95)),
+    budget_ratio=float(os.environ.get('MODEL_ROUTER_HEDGE_BUDGET', 0.1))
+)
+
+# 亲和路由：每个实例在哈希环上的虚拟节点数，以及单实例负载上限相对平均负载的倍数
+AFFINITY_VIRTUAL_NODES = 100
+AFFINITY_LOAD_FACTOR = 1.25
+# 按消息前缀计算亲和键时使用的最大字符数
+AFFINITY_PREFIX_CHARS = 512
+
+def stable_hash(value):
+    """跨进程稳定的64位哈希（内置hash带随机盐，不能用于多副本路由）"""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def affinity_key(data, session_id=None):
+    """
+    计算请求的亲和键：优先使用会话ID，否则使用规范化后的消息前缀
+    
+    多轮对话每轮的 messages 都以相同的系统提示和第一条用户消息开头，以它们作为前缀，
+    同一对话的各轮会落到同一实例，复用该实例上已缓存的KV
+    
+    Returns:
+        str 或 None（无法计算时）
+    """
+    session_id = session_id or data.get('session_id') or data.get('conversation_id')
+    if session_id:
+        return f"session:{session_id}"
+    
+    messages = data.get('messages')
+    if isinstance(messages, list) and messages:
+        parts = []
+        for message in messages:
+            if not isinstance(message, dict):
+                continue
+            content = ' '.join(str(message.get('content', '')).split())
+            parts.append(f"{message.get('role', '')}:{content}")
+            if message.get('role') == 'user':
+                break
+        prefix = '\n'.join(parts)
+    else:
+        prefix = ' '.join(str(data.get('prompt', '')).split())
+    return f"prefix:{prefix[:AFFINITY_PREFIX_CHARS]}" if prefix else None
+
+class ConsistentHashRing:
+    """一致性哈希环，实例增减时只有落在该实例上的键会迁移"""
+    
+    def __init__(self, instance_ids, virtual_nodes=AFFINITY_VIRTUAL_NODES):
+        points = sorted((stable_hash(f"{instance_id}#{i}"), instance_id)
+                        for instance_id in instance_ids for i in range(virtual_nodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [instance_id for _, instance_id in points]
+        self.size = len(set(instance_ids))
+    
+    def walk(self, key):
+        """从键的位置顺时针依次返回不重复的实例ID"""
+        if not self._hashes:
+            return
+        start = bisect.bisect(self._hashes, stable_hash(key))
+        seen = set()
+        for i in range(len(self._owners)):
+            owner = self._owners[(start + i) % len(self._owners)]
+            if owner not in seen:
+                seen.add(owner)
+                yield owner
+                if len(seen) == self.size:
+                    return
+
+# 哈希环缓存：实例ID集合 -> 环，实例集合不变时复用
+_affinity_rings = {}
+
+# 轮询游标：模型 -> itertools.count，next() 在GIL下是原子的，选择时无需加锁
+_round_robin_cursors = {}
+
 # 调度算法接口
 class ModelScheduler:
     """模型调度器，负责选择合适的模型实例处理请求"""
     
     @staticmethod
-    def random_select(model_instances):
+    def random_select(model_instances, model=None, stats=None):
         """随机选择一个可用的模型实例"""
         available_instances = [m for m in model_instances if m.get('status') == 'running']
         if not available_instances:
@@ -41,33 +296,105 @@ class ModelScheduler:
         return random.choice(available_instances)
     
     @staticmethod
-    def round_robin(model_instances):
-        """轮询算法（预留）"""
-        # TODO: 实现轮询算法
-        return ModelScheduler.random_select(model_instances)
+    def round_robin(model_instances, model=None, stats=None):
+        """轮询算法：每个模型一个递增游标，按实例ID排序后取模"""
+        available_instances = sorted((m for m in model_instances if m.get('status') == 'running'),
+                                     key=lambda m: str(m.get('id')))
+        if not available_instances:
+            return None
+        cursor = _round_robin_cursors.get(model or '*')
+        if cursor is None:
+            cursor = _round_robin_cursors.setdefault(model or '*', itertools.count())
+        return available_instances[next(cursor) % len(available_instances)]
     
     @staticmethod
-    def least_load(model_instances):
-        """最小负载算法（预留）"""
-        # TODO: 实现最小负载算法
-        return ModelScheduler.random_select(model_instances)
+    def least_load(model_instances, model=None, stats=None):
+        """
+        最小负载算法：预计等待时间 = (进行中请求数 + 1) × 首token耗时EWMA，取最小者；
+        没有TTFT样本的实例使用其它实例的平均值，得分相同时随机选择
+        """
+        stats = stats or instance_stats
+        available_instances = [m for m in model_instances if m.get('status') == 'running']
+        if not available_instances:
+            return None
+        samples = [stats.ttft_ewma(m.get('id')) for m in available_instances]
+        known = [ttft for ttft in samples if ttft is not None]
+        default_ttft = sum(known) / len(known) if known else 1.0
+        scores = [(stats.in_flight(m.get('id')) + 1) * (ttft if ttft is not None else default_ttft)
+                  for m, ttft in zip(available_instances, samples)]
+        best = min(scores)
+        return random.choice([m for m, score in zip(available_instances, scores) if score == best])
+    
+    @staticmethod
+    def affinity(model_instances, model=None, stats=None, key=None):
+        """
+        亲和路由：按亲和键在一致性哈希环上选择实例（有界负载）
+        
+        单个实例的进行中请求数上限为 ceil(AFFINITY_LOAD_FACTOR × (总进行中请求数 + 1) / 实例数)，
+        首选实例达到上限时沿哈希环顺延到下一个未超限的实例；实例下线后其键顺延到环上的下一个实例。
+        没有亲和键时退化为最小负载算法
+        """
+        stats = stats or instance_stats
+        available_instances = {m.get('id'): m for m in model_instances if m.get('status') == 'running'}
+        if not available_instances:
+            return None
+        if key is None:
+            return ModelScheduler.least_load(list(available_instances.values()), model, stats)
+        
+        ids = frozenset(available_instances)
+        ring = _affinity_rings.get(ids)
+        if ring is None:
+            if len(_affinity_rings) > 64:
+                _affinity_rings.clear()
+            ring = _affinity_rings[ids] = ConsistentHashRing(ids)
+        
+        total_in_flight = sum(stats.in_flight(instance_id) for instance_id in ids)
+        capacity = math.ceil(AFFINITY_LOAD_FACTOR * (total_in_flight + 1) / len(ids))
+        for instance_id in ring.walk(key):
+            if stats.in_flight(instance_id) < capacity:
+                return available_instances[instance_id]
+        return ModelScheduler.least_load(list(available_instances.values()), model, stats)
+    
+    STRATEGIES = {
+        'random': 'random_select',
+        'round_robin': 'round_robin',
+        'least_load': 'least_load',
+        'affinity': 'affinity'
+    }
+    
+    @staticmethod
+    def select(model_instances, strategy=None, model=None, stats=None, key=None):
+        """按策略名选择实例，未知策略时使用随机选择；key 为亲和键，只有亲和路由使用"""
+        method = ModelScheduler.STRATEGIES.get(strategy or DEFAULT_STRATEGY, 'random_select')
+        if method == 'affinity':
+            return ModelScheduler.affinity(model_instances, model, stats, key)
+        return getattr(ModelScheduler, method)(model_instances, model, stats)
 
 # 路由处理函数
 @router_bp.route('/remote/generate/stream', methods=['POST'])
 def remote_generate_stream():
-    """将请求路由到随机选择的模型实例"""
+    """将请求路由到按调度策略选择的模型实例"""
     # 获取请求数据
     data = request.get_json()
     if not data:
         return jsonify({'status': 'error', 'message': '无效的请求数据'}), 400
     
-    # 获取可用的模型实例
-    model_instances = get_model_instances()
+    # 从路由表获取可用的模型实例
+    model_instances = routing_table.get()
     if not model_instances:
         return jsonify({'status': 'error', 'message': '没有可用的模型实例'}), 503
     
-    # 使用调度算法选择模型实例
-    selected_model = ModelScheduler.random_select(model_instances)
+    # 使用调度算法选择模型实例（请求体或查询参数中的 strategy 优先于默认配置）
+    strategy = data.pop('strategy', None) or request.args.get('strategy') or current_app.config.get('ROUTER_STRATEGY')
+    if strategy and strategy not in ModelScheduler.STRATEGIES:
+        return jsonify({'status': 'error', 'message': f'未知的调度策略: {strategy}'}), 400
+    hedge = data.pop('hedge', None)
+    if hedge is None:
+        hedge = request.args.get('hedge') or current_app.config.get('ROUTER_HEDGING', HEDGING_ENABLED)
+    hedge = str(hedge).lower() in ('1', 'true', 'yes')
+    key = affinity_key(data, request.headers.get('X-Session-Id'))
+    data.pop('session_id', None)
+    selected_model = ModelScheduler.select(model_instances, strategy, data.get('model'), key=key)
     if not selected_model:
         return jsonify({'status': 'error', 'message': '没有可用的模型实例'}), 503
     
@@ -96,8 +423,38 @@ def remote_generate_stream():
         'Connection': 'keep-alive'
     }
     
+    instance_id = selected_model['id']
+    
+    def generate_hedged():
+        """带对冲的流式响应：首token迟迟不到或首选实例出错时改发到另一个实例"""
+        def pick_backup(tried):
+            candidates = [m for m in model_instances if m.get('id') not in tried and m.get('port')]
+            return ModelScheduler.select(candidates, strategy, data.get('model'), key=key) if candidates else None
+        
+        def make_request(instance):
+            return f"http://localhost:{instance['port']}/chat/stream", headers, data
+        
+        yield "data: {\"text\": \"正在连接模型...\"}\n\n"
+        for kind, instance, payload in hedged_stream(
+                selected_model, pick_backup, make_request, hedge_policy, timeout=30,
+                on_start=lambda m: instance_stats.begin(m['id']),
+                on_finish=lambda m: instance_stats.end(m['id']),
+                on_first_token=lambda m, ttft_ms: instance_stats.record_ttft(m['id'], ttft_ms)):
+            if kind == 'error':
+                print(payload)
+                yield f"data: {json.dumps({'error': payload}, ensure_ascii=False)}\n\n"
+                break
+            yield f"data: {payload.decode('utf-8', errors='replace')}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    if hedge:
+        return Response(generate_hedged(), mimetype='text/event-stream')
+    
     def generate():
         """生成流式响应"""
+        instance_stats.begin(instance_id)
+        started = time.time()
+        first_token = True
         try:
             # 发送SSE头部
             yield "data: {\"text\": \"正在连接模型...\"}\n\n"
@@ -138,6 +495,9 @@ def remote_generate_stream():
             # 直接转发流式响应
             for line in response.iter_lines():
                 if line:
+                    if first_token:
+                        instance_stats.record_ttft(instance_id, (time.time() - started) * 1000)
+                        first_token = False
                     try:
                         # 解析每行数据
                         line_text = line.decode('utf-8')
@@ -155,9 +515,25 @@ def remote_generate_stream():
             print(error_msg)
             yield f"data: {{\"error\": \"{error_msg}\"}}\n\n"
             yield "data: [DONE]\n\n"
+        finally:
+            instance_stats.end(instance_id)
     
     return Response(generate(), mimetype='text/event-stream')
 
+@router_bp.route('/remote/stats', methods=['GET'])
+def remote_stats():
+    """各模型实例的进行中请求数和首token耗时EWMA"""
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'default_strategy': current_app.config.get('ROUTER_STRATEGY') or DEFAULT_STRATEGY,
+            'routing_table': routing_table.status(),
+            'hedging': {'default_enabled': bool(current_app.config.get('ROUTER_HEDGING', HEDGING_ENABLED)),
+                        'delay_seconds': round(hedge_policy.delay(), 3), **hedge_policy.metrics()},
+            'instances': instance_stats.snapshot()
+        }
+    })
+
 # 注册Blueprint的函数
 def register_router(app):
     """注册路由Blueprint到Flask应用"""
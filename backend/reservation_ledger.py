@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+GPU预留账本
+所有调度器共享的两阶段预留记录，保存在Redis中并通过Lua脚本原子更新:
+    1. reserve: 调度器做出放置决策后提交带TTL的临时预留，与并发预留冲突时失败并重试
+    2. extend:  部署任务排队和加载期间，集群控制器定期延长临时预留的TTL
+    3. commit:  集群控制器确认实例已就绪后，将预留转为长期占用（移除TTL）
+    4. release: 实例停止或部署失败时释放
+临时预留在TTL到期后自动失效（集群控制器停止续期时），不需要加锁，也不会因部署中途失败而泄漏GPU
+"""
+
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("reservation_ledger")
+
+# 预留键: {prefix}:res:<reservation_id> -> JSON记录，临时预留带PX过期时间
+# GPU键:  {prefix}:gpu:<cluster_id>:<node_id>:<gpu_id> -> Hash{reservation_id: 显存MB}
+#         独占预留（显存<=0）记为 "x<GPU容量>"，按整张GPU的容量计入用量
+# 键名以 {prefix} 作为hash tag，Redis Cluster下所有键落在同一个slot，脚本可以访问计算出的键
+
+# KEYS[1]=预留键, KEYS[2..]=GPU键
+# ARGV[1]=预留ID, ARGV[2]=TTL毫秒, ARGV[3]=每张GPU显存, ARGV[4]=预留记录, ARGV[5]=预留键前缀, ARGV[6..]=每张GPU容量
+# 显存<=0表示独占：GPU上已有任何有效预留时失败；已有独占预留的GPU拒绝任何新预留
+# 返回 {1, 0} 成功; {0, i} 第i张GPU容量不足; {-1, 0} 预留ID已存在
+RESERVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return {-1, 0}
+end
+local memory = tonumber(ARGV[3])
+for i = 2, #KEYS do
+    local used = 0
+    local holders = 0
+    local exclusive = false
+    local capacity = tonumber(ARGV[4 + i])
+    local entries = redis.call('HGETALL', KEYS[i])
+    for j = 1, #entries, 2 do
+        if redis.call('EXISTS', ARGV[5] .. entries[j]) == 1 then
+            local value = entries[j + 1]
+            if string.sub(value, 1, 1) == 'x' then
+                exclusive = true
+                value = string.sub(value, 2)
+            end
+            used = used + tonumber(value)
+            holders = holders + 1
+        else
+            redis.call('HDEL', KEYS[i], entries[j])
+        end
+    end
+    if exclusive or (memory <= 0 and holders > 0) or (memory > 0 and used + memory > capacity) then
+        return {0, i - 1}
+    end
+end
+for i = 2, #KEYS do
+    if memory <= 0 then
+        redis.call('HSET', KEYS[i], ARGV[1], 'x' .. ARGV[4 + i])
+    else
+        redis.call('HSET', KEYS[i], ARGV[1], memory)
+    end
+end
+redis.call('SET', KEYS[1], ARGV[4], 'PX', ARGV[2])
+return {1, 0}
+"""
+
+# KEYS[1]=预留键；ARGV[1]=更新后的预留记录
+# 返回 1 成功; 0 预留不存在（已过期或已释放）
+COMMIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS[1]=预留键；ARGV[1]=TTL毫秒
+# 返回 1 成功（已确认的预留没有TTL，保持不变）; 0 预留不存在（已过期或已释放）
+EXTEND_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if redis.call('PTTL', KEYS[1]) > 0 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# KEYS[1]=预留键；ARGV[1]=预留ID, ARGV[2]=GPU键前缀
+# 返回释放的GPU数量
+RELEASE_SCRIPT = """
+local record = redis.call('GET', KEYS[1])
+if not record then
+    return 0
+end
+local gpus = cjson.decode(record)['gpus']
+for _, gpu in ipairs(gpus) do
+    redis.call('HDEL', ARGV[2] .. gpu, ARGV[1])
+end
+redis.call('DEL', KEYS[1])
+return #gpus
+"""
+
+# KEYS=GPU键；ARGV[1]=预留键前缀
+# 返回每张GPU上仍有效的预留显存之和
+USAGE_SCRIPT = """
+local result = {}
+for i = 1, #KEYS do
+    local used = 0
+    local entries = redis.call('HGETALL', KEYS[i])
+    for j = 1, #entries, 2 do
+        if redis.call('EXISTS', ARGV[1] .. entries[j]) == 1 then
+            used = used + tonumber((string.gsub(entries[j + 1], '^x', '')))
+        else
+            redis.call('HDEL', KEYS[i], entries[j])
+        end
+    end
+    result[i] = used
+end
+return result
+"""
+
+
+class ReservationLedger:
+    """GPU两阶段预留账本"""
+
+    def __init__(self, redis_client, prefix: str = "gpu_ledger", reserve_ttl: float = 120):
+        """
+        Args:
+            redis_client: redis.Redis 实例
+            prefix: 键名前缀
+            reserve_ttl: 临时预留的有效期(秒)，超时未确认自动释放
+        """
+        self.redis = redis_client
+        self.prefix = prefix
+        self.reserve_ttl = reserve_ttl
+        self._reservation_prefix = f"{{{prefix}}}:res:"
+        self._gpu_prefix = f"{{{prefix}}}:gpu:"
+        self._reserve = redis_client.register_script(RESERVE_SCRIPT)
+        self._commit = redis_client.register_script(COMMIT_SCRIPT)
+        self._extend = redis_client.register_script(EXTEND_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+        self._usage = redis_client.register_script(USAGE_SCRIPT)
+
+    @staticmethod
+    def gpu_name(cluster_id: str, node_id: str, gpu_id: str) -> str:
+        return f"{cluster_id}:{node_id}:{gpu_id}"
+
+    def _gpu_key(self, name: str) -> str:
+        return f"{self._gpu_prefix}{name}"
+
+    def _reservation_key(self, reservation_id: str) -> str:
+        return f"{self._reservation_prefix}{reservation_id}"
+
+    def reserve(self, cluster_id: str, allocation: Dict[str, List[str]], memory: int,
+                capacities: Dict[Tuple[str, str], int], reservation_id: Optional[str] = None,
+                ttl: Optional[float] = None, metadata: Optional[Dict[str, Any]] = None) -> Tuple[bool, str]:
+        """
+        原子地为一组GPU创建临时预留
+
+        Args:
+            cluster_id: 集群ID
+            allocation: {node_id: [gpu_ids]}
+            memory: 每张GPU预留的显存(MB)，<=0表示独占整张GPU
+            capacities: {(node_id, gpu_id): 容量MB}，账本内所有有效预留之和不能超过容量
+            reservation_id: 预留ID，为空时自动生成
+            ttl: 临时预留有效期(秒)，默认使用 reserve_ttl
+            metadata: 附加信息（模型ID等）
+
+        Returns:
+            (是否成功, 预留ID或失败原因)
+        """
+        reservation_id = reservation_id or str(uuid.uuid4())
+        pairs = [(node_id, gpu_id) for node_id, gpu_ids in allocation.items() for gpu_id in gpu_ids]
+        gpus = [self.gpu_name(cluster_id, node_id, gpu_id) for node_id, gpu_id in pairs]
+        record = {
+            "reservation_id": reservation_id,
+            "cluster_id": cluster_id,
+            "allocation": allocation,
+            "gpus": gpus,
+            "memory": memory,
+            "state": "reserved",
+            "reserved_at": time.time(),
+            "metadata": metadata or {}
+        }
+        ttl_ms = int((ttl if ttl is not None else self.reserve_ttl) * 1000)
+        status, index = self._reserve(
+            keys=[self._reservation_key(reservation_id)] + [self._gpu_key(gpu) for gpu in gpus],
+            args=[reservation_id, ttl_ms, memory, json.dumps(record), self._reservation_prefix]
+                 + [capacities[pair] for pair in pairs]
+        )
+        if status == 1:
+            logger.info(f"临时预留 {reservation_id}: {allocation}, 每卡 {memory}MB, TTL {ttl_ms}ms")
+            return True, reservation_id
+        if status == -1:
+            return False, f"预留 {reservation_id} 已存在"
+        node_id, gpu_id = pairs[index - 1]
+        logger.info(f"预留冲突: GPU {node_id}/{gpu_id} 剩余容量不足 {memory}MB")
+        return False, f"GPU {node_id}/{gpu_id} 已被并发部署占用"
+
+    def extend(self, reservation_id: str, ttl: Optional[float] = None) -> bool:
+        """延长临时预留的TTL（部署仍在排队或加载）；预留已过期或已释放时返回False"""
+        ttl_ms = int((ttl if ttl is not None else self.reserve_ttl) * 1000)
+        extended = bool(self._extend(keys=[self._reservation_key(reservation_id)], args=[ttl_ms]))
+        if not extended:
+            logger.warning(f"延长预留 {reservation_id} 失败: 预留不存在或已过期")
+        return extended
+
+    def commit(self, reservation_id: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """确认预留（实例已就绪），移除TTL；预留已过期时返回False"""
+        record = self.get(reservation_id)
+        if record is None:
+            logger.warning(f"确认预留 {reservation_id} 失败: 预留不存在或已过期")
+            return False
+        record["state"] = "committed"
+        record["committed_at"] = time.time()
+        record["metadata"].update(metadata or {})
+        committed = bool(self._commit(keys=[self._reservation_key(reservation_id)], args=[json.dumps(record)]))
+        if committed:
+            logger.info(f"预留 {reservation_id} 已确认")
+        return committed
+
+    def release(self, reservation_id: str) -> bool:
+        """释放预留（临时或已确认）"""
+        released = self._release(keys=[self._reservation_key(reservation_id)],
+                                 args=[reservation_id, self._gpu_prefix])
+        if released:
+            logger.info(f"预留 {reservation_id} 已释放")
+        return bool(released)
+
+    def get(self, reservation_id: str) -> Optional[Dict[str, Any]]:
+        """获取预留记录，不存在或已过期时返回None"""
+        record = self.redis.get(self._reservation_key(reservation_id))
+        return json.loads(record) if record else None
+
+    def reserved_memory(self, cluster_id: str, gpus: List[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """
+        查询GPU上仍有效的预留显存（同时清理已过期预留的残留记录）
+
+        Args:
+            cluster_id: 集群ID
+            gpus: [(node_id, gpu_id)]
+
+        Returns:
+            Dict: {(node_id, gpu_id): 已预留显存MB}
+        """
+        if not gpus:
+            return {}
+        keys = [self._gpu_key(self.gpu_name(cluster_id, node_id, gpu_id)) for node_id, gpu_id in gpus]
+        used = self._usage(keys=keys, args=[self._reservation_prefix])
+        return {gpu: int(value) for gpu, value in zip(gpus, used)}
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+缩容到零模型的冷启动
+模型所有副本因空闲被停止后，路由到该模型的请求在此排队，
+同一模型只触发一次重新部署，实例就绪后一起放行；同时记录冷启动耗时和请求排队等待时间
+"""
+
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger("scale_to_zero")
+
+
+@dataclass
+class ColdStart:
+    """一次进行中的冷启动"""
+    model_name: str
+    started_at: float = field(default_factory=time.time)
+    ready_at: Optional[float] = None
+    instance: Optional[Dict[str, Any]] = None
+    error: str = ""
+    waiters: int = 0
+    event: threading.Event = field(default_factory=threading.Event)
+
+
+def summarize(samples) -> Dict[str, float]:
+    """耗时样本(秒)的统计"""
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), 3),
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(int(len(values) * 0.95), len(values) - 1)], 3),
+        "max": round(values[-1], 3)
+    }
+
+
+class ColdStartManager:
+    """冷启动请求保持队列"""
+
+    def __init__(self, find_instance: Callable[[str], Optional[Dict[str, Any]]],
+                 activate: Callable[[str], bool], poll_interval: float = 2.0,
+                 max_wait: float = 600.0, history: int = 500):
+        """
+        Args:
+            find_instance: find_instance(model_name) 返回一个就绪的实例，没有时返回None
+            activate: activate(model_name) 触发部署一个副本，返回是否提交成功
+            poll_interval: 冷启动期间检查实例是否就绪的间隔(秒)
+            max_wait: 冷启动最长等待时间(秒)，超时后放行的请求得到失败结果
+            history: 保留的耗时样本数
+        """
+        self.find_instance = find_instance
+        self.activate = activate
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self._active: Dict[str, ColdStart] = {}
+        self._lock = threading.Lock()
+        self._cold_start_seconds: Deque[float] = deque(maxlen=history)
+        self._queue_wait_seconds: Deque[float] = deque(maxlen=history)
+        self._counters = {"cold_starts": 0, "failed": 0, "held_requests": 0, "timed_out_requests": 0}
+
+    def acquire(self, model_name: str, timeout: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        获取模型的就绪实例；没有实例时触发冷启动并阻塞等待
+
+        Args:
+            model_name: 模型名称
+            timeout: 本请求最长等待时间(秒)，默认 max_wait
+
+        Returns:
+            (实例或None, 排队等待秒数)
+        """
+        instance = self.find_instance(model_name)
+        if instance is not None:
+            return instance, 0.0
+
+        started = time.time()
+        with self._lock:
+            cold_start = self._active.get(model_name)
+            if cold_start is None:
+                cold_start = ColdStart(model_name=model_name)
+                self._active[model_name] = cold_start
+                self._counters["cold_starts"] += 1
+                threading.Thread(target=self._run, args=(cold_start,), daemon=True).start()
+            cold_start.waiters += 1
+            self._counters["held_requests"] += 1
+
+        ready = cold_start.event.wait(self.max_wait if timeout is None else timeout)
+        waited = time.time() - started
+        with self._lock:
+            cold_start.waiters -= 1
+            self._queue_wait_seconds.append(waited)
+            if not ready:
+                self._counters["timed_out_requests"] += 1
+        return (cold_start.instance if ready else None), waited
+
+    def _run(self, cold_start: ColdStart):
+        """触发部署并等待实例就绪，然后放行所有排队请求"""
+        model_name = cold_start.model_name
+        logger.info(f"模型 {model_name} 没有可用实例，开始冷启动")
+        try:
+            if not self.activate(model_name):
+                cold_start.error = "部署副本失败"
+            else:
+                deadline = cold_start.started_at + self.max_wait
+                while time.time() < deadline:
+                    cold_start.instance = self.find_instance(model_name)
+                    if cold_start.instance is not None:
+                        break
+                    time.sleep(self.poll_interval)
+                else:
+                    cold_start.error = f"{self.max_wait}s 内实例未就绪"
+        except Exception as e:
+            cold_start.error = str(e)
+
+        cold_start.ready_at = time.time()
+        with self._lock:
+            self._active.pop(model_name, None)
+            if cold_start.instance is not None:
+                self._cold_start_seconds.append(cold_start.ready_at - cold_start.started_at)
+            else:
+                self._counters["failed"] += 1
+        if cold_start.instance is not None:
+            logger.info(f"模型 {model_name} 冷启动完成，耗时 {cold_start.ready_at - cold_start.started_at:.1f}s，"
+                        f"放行 {cold_start.waiters} 个排队请求")
+        else:
+            logger.warning(f"模型 {model_name} 冷启动失败: {cold_start.error}")
+        cold_start.event.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        """冷启动耗时、排队等待时间和计数"""
+        with self._lock:
+            return {
+                **self._counters,
+                "cold_start_seconds": summarize(self._cold_start_seconds),
+                "queue_wait_seconds": summarize(self._queue_wait_seconds),
+                "in_progress": [{"model_name": c.model_name, "waiting_requests": c.waiters,
+                                 "elapsed": round(time.time() - c.started_at, 3)}
+                                for c in self._active.values()]
+            }
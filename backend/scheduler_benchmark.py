@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+GPU调度器基准测试
+在合成集群和合成部署负载上比较各调度器的模型密度
+"""
+
+import argparse
+import copy
+import dataclasses
+import os
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+from ClusterRegister import ClusterInfo, NodeInfo, GPUInfo, GPUType
+from gpu_scheduler import (
+    GPUScheduler, SingleNodeFirstScheduler, MemoryOptimizedScheduler,
+    UtilizationAwareScheduler, BinPackingScheduler, TopologyAwareScheduler, gpu_free_memory
+)
+from gpu_topology import (
+    NVLINK_BASE_SCORE, parse_topology_matrix, attach_topology, group_score
+)
+
+# 8卡节点的 nvidia-smi topo -m 输出：GPU0-3 与 GPU4-7 各自NVLink全互联，两组之间跨NUMA
+TOPOLOGY_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "tests", "fixtures", "nvidia_smi_topo_8gpu_nvlink.txt")
+
+# 合成负载：(权重, GPU数量, 每GPU显存MB)
+WORKLOAD_MIX = [
+    (40, 1, 2048),
+    (25, 1, 8192),
+    (15, 1, 16384),
+    (10, 1, 30000),
+    (7, 2, 40000),
+    (3, 4, 60000),
+]
+
+
+def build_synthetic_cluster(seed: int = 0, busy_ratio: float = 0.3, scale: int = 1) -> ClusterInfo:
+    """
+    构建合成集群：4台8卡A100-80G（两组NVLink域）+ 4台4卡V100-32G（仅PCIe），部分GPU已有显存占用
+    
+    Args:
+        scale: 节点数倍数（scale=1 时共48张GPU）
+    """
+    rng = random.Random(seed)
+    with open(TOPOLOGY_FIXTURE) as f:
+        topology = parse_topology_matrix(f.read())
+    cluster = ClusterInfo(id="bench-cluster", name="基准测试集群", adapter_type="nvidia")
+
+    specs = ([("a100", 8, "A100-SXM4-80GB", 81920)] * 4 + [("v100", 4, "Tesla V100-32GB", 32768)] * 4) * scale
+    for n, (prefix, gpu_count, gpu_name, memory_total) in enumerate(specs):
+        node = NodeInfo(id=f"{prefix}-node-{n}", name=f"{prefix}-node-{n}", ip=f"10.0.0.{n + 1}",
+                        port=22, status="online")
+        for i in range(gpu_count):
+            memory_used = 0
+            if rng.random() < busy_ratio:
+                memory_used = rng.choice([4096, 16384, memory_total // 2])
+            node.gpus.append(GPUInfo(
+                id=f"{node.id}-gpu-{i}",
+                name=gpu_name,
+                memory_total=memory_total,
+                gpu_type=GPUType.NVIDIA,
+                extra_info={"memory_used": memory_used, "utilization": rng.randint(0, 100)}
+            ))
+        if prefix == "a100":
+            attach_topology(node.gpus, topology, f"{node.id}-gpu-")
+        cluster.nodes.append(node)
+    return cluster
+
+
+def build_synthetic_workload(count: int, seed: int = 0) -> List[Dict[str, int]]:
+    """按 WORKLOAD_MIX 生成部署请求序列"""
+    rng = random.Random(seed)
+    weights = [w for w, _, _ in WORKLOAD_MIX]
+    requests = []
+    for _ in range(count):
+        _, gpu_count, memory_required = rng.choices(WORKLOAD_MIX, weights=weights)[0]
+        requests.append({"gpu_count": gpu_count, "memory_required": memory_required})
+    return requests
+
+
+def _gpu_index(cluster: ClusterInfo) -> Dict[Tuple[str, str], GPUInfo]:
+    return {(node.id, gpu.id): gpu for node in cluster.nodes for gpu in node.gpus}
+
+
+def apply_allocation(cluster: ClusterInfo, allocation: Dict[str, List[str]], memory_required: int) -> bool:
+    """
+    将分配结果落到GPU的 memory_used 上
+
+    Returns:
+        bool: 所有GPU都有足够空闲显存时返回True；否则视为超卖，不做修改
+    """
+    index = _gpu_index(cluster)
+    gpus = [index[(node_id, gpu_id)] for node_id, gpu_ids in allocation.items() for gpu_id in gpu_ids]
+    if any(gpu_free_memory(gpu) < memory_required for gpu in gpus):
+        return False
+    for gpu in gpus:
+        gpu.extra_info["memory_used"] = gpu.extra_info.get("memory_used", 0) + memory_required
+    return True
+
+
+def summarize(cluster: ClusterInfo, baseline: ClusterInfo, placed: int, overcommitted: int,
+              rejected: int) -> Dict[str, Any]:
+    """计算模型密度等指标"""
+    base_index = _gpu_index(baseline)
+    used_gpus = [gpu for key, gpu in _gpu_index(cluster).items()
+                 if gpu.extra_info.get("memory_used", 0) > base_index[key].extra_info.get("memory_used", 0)]
+    memory_util = (sum(gpu.extra_info["memory_used"] for gpu in used_gpus)
+                   / max(sum(gpu.memory_total for gpu in used_gpus), 1))
+    total_gpus = len(base_index)
+    return {
+        "placed": placed,
+        "overcommitted": overcommitted,
+        "rejected": rejected,
+        "gpus_used": len(used_gpus),
+        "gpus_untouched": total_gpus - len(used_gpus),
+        "density": placed / max(len(used_gpus), 1),
+        "memory_util": memory_util
+    }
+
+
+def exclusive_view(cluster: ClusterInfo, taken: set) -> ClusterInfo:
+    """隐藏已被独占分配的GPU（模拟集群控制器按整卡标记 allocated 的行为）"""
+    nodes = [dataclasses.replace(node, gpus=[gpu for gpu in node.gpus if (node.id, gpu.id) not in taken])
+             for node in cluster.nodes]
+    return dataclasses.replace(cluster, nodes=nodes)
+
+
+def run_density_benchmark(scheduler: GPUScheduler, cluster: ClusterInfo,
+                          requests: List[Dict[str, int]], exclusive: bool = False) -> Dict[str, Any]:
+    """
+    逐个放置请求，统计成功放置、超卖和拒绝的数量
+
+    Args:
+        exclusive: 每次分配独占整卡（原有调度器不感知已用显存，只能按整卡使用）
+    """
+    working = copy.deepcopy(cluster)
+    taken = set()
+    placed = overcommitted = rejected = 0
+    for req in requests:
+        view = exclusive_view(working, taken) if exclusive else working
+        allocation = scheduler.allocate_gpus(view, req["gpu_count"], req["memory_required"])
+        if not allocation.success:
+            rejected += 1
+        elif apply_allocation(working, allocation.allocation, req["memory_required"]):
+            placed += 1
+            if exclusive:
+                taken.update((node_id, gpu_id) for node_id, gpu_ids in allocation.allocation.items()
+                             for gpu_id in gpu_ids)
+        else:
+            overcommitted += 1
+    return summarize(working, cluster, placed, overcommitted, rejected)
+
+
+def run_gang_benchmark(scheduler: GPUScheduler, cluster: ClusterInfo,
+                       requests: List[Dict[str, int]]) -> Dict[str, Any]:
+    """
+    统计多GPU（张量并行）放置的互联质量：最差链路为NVLink、同一NUMA、跨节点的比例
+    
+    与密度测试一样逐个放置，只统计 gpu_count > 1 且成功放置的请求
+    """
+    working = copy.deepcopy(cluster)
+    gpus = _gpu_index(working)
+    nvlink = same_numa = cross_node = gangs = 0
+    for req in requests:
+        allocation = scheduler.allocate_gpus(working, req["gpu_count"], req["memory_required"])
+        if not allocation.success or not apply_allocation(working, allocation.allocation, req["memory_required"]):
+            continue
+        if req["gpu_count"] <= 1:
+            continue
+        gangs += 1
+        if len(allocation.allocation) > 1:
+            cross_node += 1
+            continue
+        group = [gpus[(node_id, gpu_id)] for node_id, gpu_ids in allocation.allocation.items() for gpu_id in gpu_ids]
+        worst_link, numa, _ = group_score(group)
+        nvlink += worst_link > NVLINK_BASE_SCORE
+        same_numa += numa
+    return {
+        "gangs": gangs,
+        "nvlink": nvlink / max(gangs, 1),
+        "same_numa": same_numa / max(gangs, 1),
+        "cross_node": cross_node / max(gangs, 1)
+    }
+
+
+def run_batch_benchmark(scheduler: BinPackingScheduler, cluster: ClusterInfo,
+                        requests: List[Dict[str, int]]) -> Dict[str, Any]:
+    """使用 best-fit decreasing 批量放置"""
+    working = copy.deepcopy(cluster)
+    placed = overcommitted = rejected = 0
+    for req, allocation in zip(requests, scheduler.allocate_batch(working, requests)):
+        if not allocation.success:
+            rejected += 1
+        elif apply_allocation(working, allocation.allocation, req["memory_required"]):
+            placed += 1
+        else:
+            overcommitted += 1
+    return summarize(working, cluster, placed, overcommitted, rejected)
+
+
+def _time_decisions(decide, requests: List[Dict[str, int]]) -> Dict[str, float]:
+    """逐个计时调度决策，返回平均值和P99(毫秒)"""
+    samples = []
+    for req in requests:
+        started = time.perf_counter()
+        decide(req)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"mean": statistics.mean(samples), "p99": samples[int(len(samples) * 0.99) - 1]}
+
+
+def run_latency_benchmark(scale: int, decisions: int, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    比较对象遍历调度器与向量化调度器的单次决策延迟（只做决策，不修改集群状态）
+    
+    Args:
+        scale: 合成集群节点数倍数（每倍48张GPU）
+        decisions: 每个调度器的决策次数
+    """
+    from ClusterRegister import ResourceRegistry
+    try:
+        from capacity_snapshot import CapacitySnapshot, VectorizedScheduler
+    except ImportError:
+        print("未安装numpy，跳过向量化调度器延迟测试")
+        return {}
+
+    cluster = build_synthetic_cluster(seed, scale=scale)
+    requests = build_synthetic_workload(decisions, seed)
+    registry = ResourceRegistry()
+    registry.add_cluster(cluster)
+
+    started = time.perf_counter()
+    snapshot = CapacitySnapshot.from_clusters([cluster])
+    build_ms = (time.perf_counter() - started) * 1000
+
+    object_schedulers = {
+        "SingleNodeFirst": SingleNodeFirstScheduler(),
+        "MemoryOptimized": MemoryOptimizedScheduler(),
+        "UtilizationAware": UtilizationAwareScheduler(),
+        "BinPacking": BinPackingScheduler(),
+    }
+    results = {name: _time_decisions(lambda r, s=s: s.allocate_gpus(cluster, r["gpu_count"], r["memory_required"]),
+                                     requests)
+               for name, s in object_schedulers.items()}
+    vectorized = VectorizedScheduler(snapshot, apply_to_snapshot=False)
+    results["Vectorized"] = _time_decisions(
+        lambda r: vectorized.allocate_gpus(cluster, r["gpu_count"], r["memory_required"]), requests)
+
+    lookups = [{"gpu_type": "nvidia", "min_memory": r["memory_required"] * 2} for r in requests]
+    results["find_available_gpu (registry)"] = _time_decisions(registry.find_available_gpu, lookups)
+    results["find_available_gpu (snapshot)"] = _time_decisions(snapshot.find_available_gpu, lookups)
+    results["快照构建(一次)"] = {"mean": build_ms, "p99": build_ms}
+    return results
+
+
+def print_latency_table(results: Dict[str, Dict[str, float]]):
+    header = f"{'调度器':<34}{'平均(ms)':>10}{'P99(ms)':>10}"
+    print(header)
+    print("-" * len(header.encode("gbk", errors="ignore")))
+    for name, r in results.items():
+        pad = 36 - len(name.encode("gbk", errors="ignore")) + len(name)
+        print(f"{name:<{pad}}{r['mean']:>10.3f}{r['p99']:>10.3f}")
+
+
+def print_table(results: Dict[str, Dict[str, Any]]):
+    header = f"{'调度器':<28}{'放置':>6}{'超卖':>6}{'拒绝':>6}{'使用GPU':>8}{'空闲GPU':>8}{'密度':>8}{'显存利用率':>10}"
+    print(header)
+    print("-" * len(header.encode("gbk", errors="ignore")))
+    for name, r in results.items():
+        print(f"{name:<30}{r['placed']:>6}{r['overcommitted']:>6}{r['rejected']:>6}"
+              f"{r['gpus_used']:>9}{r['gpus_untouched']:>9}{r['density']:>10.2f}{r['memory_util']:>12.1%}")
+
+
+def print_gang_table(results: Dict[str, Dict[str, Any]]):
+    header = f"{'调度器':<28}{'多卡部署':>8}{'全NVLink':>10}{'同NUMA':>8}{'跨节点':>8}"
+    print(header)
+    print("-" * len(header.encode("gbk", errors="ignore")))
+    for name, r in results.items():
+        print(f"{name:<30}{r['gangs']:>8}{r['nvlink']:>12.1%}{r['same_numa']:>10.1%}{r['cross_node']:>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPU调度器基准测试")
+    parser.add_argument("--requests", type=int, default=120, help="合成部署请求数量")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--busy-ratio", type=float, default=0.3, help="初始已有显存占用的GPU比例")
+    parser.add_argument("--latency-scale", type=int, default=64,
+                        help="决策延迟测试的集群规模倍数（每倍48张GPU），0表示跳过")
+    parser.add_argument("--latency-decisions", type=int, default=200, help="决策延迟测试的决策次数")
+    args = parser.parse_args()
+
+    cluster = build_synthetic_cluster(args.seed, args.busy_ratio)
+    requests = build_synthetic_workload(args.requests, args.seed)
+
+    schedulers = {
+        "SingleNodeFirst": SingleNodeFirstScheduler(),
+        "MemoryOptimized": MemoryOptimizedScheduler(),
+        "UtilizationAware": UtilizationAwareScheduler(),
+        "BinPacking": BinPackingScheduler(),
+        "TopologyAware": TopologyAwareScheduler(),
+    }
+    # 原有调度器按整卡独占分配；装箱调度器按实际空闲显存共享GPU
+    results = {name: run_density_benchmark(s, cluster, requests, exclusive=not isinstance(s, BinPackingScheduler))
+               for name, s in schedulers.items()}
+    results["BinPacking (BFD batch)"] = run_batch_benchmark(BinPackingScheduler(), cluster, requests)
+
+    print(f"\n=== 模型密度 ({args.requests} 个请求, seed={args.seed}) ===")
+    print_table(results)
+
+    # 张量并行放置质量（均按实际空闲显存共享GPU，只比较选卡策略）
+    gang_schedulers = {"BinPacking": BinPackingScheduler(), "TopologyAware": TopologyAwareScheduler()}
+    gang_results = {name: run_gang_benchmark(s, cluster, requests) for name, s in gang_schedulers.items()}
+    print(f"\n=== 多GPU部署互联质量 ===")
+    print_gang_table(gang_results)
+
+    if args.latency_scale > 0:
+        latency = run_latency_benchmark(args.latency_scale, args.latency_decisions, args.seed)
+        if latency:
+            print(f"\n=== 调度决策延迟 ({args.latency_scale * 48} 张GPU, {args.latency_decisions} 次决策) ===")
+            print_latency_table(latency)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.INFO)
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+调度器离线模拟器
+在合成集群（或JSON集群描述）上回放部署/下线轨迹（JSONL），
+统计各调度器的显存利用率、碎片率、拒绝率和单次决策延迟，用于评估和回归测试调度器改动
+
+轨迹格式（每行一个事件，按 time 升序）:
+    {"time": 0.0, "op": "deploy", "model_id": "m1", "gpu_count": 1, "memory_required": 8192}
+    {"time": 35.2, "op": "undeploy", "model_id": "m1"}
+
+用法:
+    python scheduler_simulator.py --generate trace.jsonl --events 2000
+    python scheduler_simulator.py --trace trace.jsonl [--cluster cluster.json] [--output result.json]
+    python scheduler_simulator.py --trace trace.jsonl --baseline result.json  # 指标退化时返回非0
+"""
+
+import argparse
+import copy
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from ClusterRegister import ClusterInfo, NodeInfo, GPUInfo, GPUType
+from gpu_scheduler import (
+    GPUScheduler, SingleNodeFirstScheduler, MemoryOptimizedScheduler, UtilizationAwareScheduler,
+    BinPackingScheduler, TopologyAwareScheduler, gpu_free_memory
+)
+from scheduler_benchmark import (
+    WORKLOAD_MIX, build_synthetic_cluster, apply_allocation, exclusive_view, _gpu_index
+)
+
+logger = logging.getLogger("scheduler_simulator")
+
+# 小于该值(MB)的空闲显存视为碎片（放不下最小的常见模型）
+FRAGMENT_THRESHOLD = 4096
+
+# 回归检查的容忍度
+REGRESSION_TOLERANCE = {
+    "rejection_rate": 0.02,  # 拒绝率最多上升2个百分点
+    "memory_util": 0.02,     # 平均显存利用率最多下降2个百分点
+    "fragmentation": 0.02    # 平均碎片率最多上升2个百分点
+}
+
+
+# ====================== 轨迹与集群 ======================
+
+def generate_trace(events: int, seed: int = 0, arrival_rate: float = 1.0,
+                   mean_lifetime: float = 60.0) -> List[Dict[str, Any]]:
+    """
+    生成合成轨迹：部署请求按泊松过程到达，按 WORKLOAD_MIX 选择规格，存活时间服从指数分布
+
+    Args:
+        events: 部署请求数量（下线事件另计）
+        seed: 随机种子
+        arrival_rate: 每秒到达的部署请求数
+        mean_lifetime: 平均存活时间(秒)
+    """
+    rng = random.Random(seed)
+    weights = [w for w, _, _ in WORKLOAD_MIX]
+    trace = []
+    now = 0.0
+    for i in range(events):
+        now += rng.expovariate(arrival_rate)
+        _, gpu_count, memory_required = rng.choices(WORKLOAD_MIX, weights=weights)[0]
+        model_id = f"model-{i}"
+        trace.append({"time": round(now, 3), "op": "deploy", "model_id": model_id,
+                      "gpu_count": gpu_count, "memory_required": memory_required})
+        trace.append({"time": round(now + rng.expovariate(1.0 / mean_lifetime), 3),
+                      "op": "undeploy", "model_id": model_id})
+    trace.sort(key=lambda e: e["time"])
+    return trace
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r") as f:
+        trace = [json.loads(line) for line in f if line.strip()]
+    trace.sort(key=lambda e: e.get("time", 0))
+    return trace
+
+
+def save_trace(trace: List[Dict[str, Any]], path: str):
+    with open(path, "w") as f:
+        for event in trace:
+            f.write(json.dumps(event) + "\n")
+
+
+def load_cluster_fixture(path: str) -> ClusterInfo:
+    """从JSON加载集群（格式与中心控制器保存到Redis的集群字典一致）"""
+    with open(path, "r") as f:
+        data = json.load(f)
+    cluster = ClusterInfo(id=data.get("id", "sim-cluster"), name=data.get("name", "模拟集群"),
+                          adapter_type=data.get("adapter_type", "nvidia"), config=data.get("config", {}))
+    for node_dict in data.get("nodes", []):
+        node = NodeInfo(id=node_dict["id"], name=node_dict.get("name", node_dict["id"]),
+                        ip=node_dict.get("ip", "127.0.0.1"), port=node_dict.get("port", 22),
+                        status=node_dict.get("status", "online"), metadata=node_dict.get("metadata", {}))
+        for gpu_dict in node_dict.get("gpus", []):
+            node.gpus.append(GPUInfo(
+                id=gpu_dict["id"],
+                name=gpu_dict.get("name", ""),
+                memory_total=int(gpu_dict["memory_total"]),
+                gpu_type=GPUType(gpu_dict.get("gpu_type", "nvidia")),
+                compute_capability=gpu_dict.get("compute_capability", ""),
+                extra_info=gpu_dict.get("extra_info", {})
+            ))
+        cluster.nodes.append(node)
+    return cluster
+
+
+# ====================== 模拟 ======================
+
+def cluster_metrics(cluster: ClusterInfo) -> Dict[str, float]:
+    """当前时刻的显存利用率、GPU占用率和碎片率（碎片显存 / 全部空闲显存）"""
+    gpus = [gpu for node in cluster.nodes for gpu in node.gpus]
+    total = sum(gpu.memory_total for gpu in gpus)
+    free = [max(gpu_free_memory(gpu), 0) for gpu in gpus]
+    free_total = sum(free)
+    fragments = sum(f for f in free if f < FRAGMENT_THRESHOLD)
+    return {
+        "memory_util": 1 - free_total / max(total, 1),
+        "gpu_occupancy": sum(1 for gpu, f in zip(gpus, free) if f < gpu.memory_total) / max(len(gpus), 1),
+        "fragmentation": fragments / max(free_total, 1)
+    }
+
+
+def release_allocation(cluster: ClusterInfo, allocation: Dict[str, List[str]], memory_required: int):
+    index = _gpu_index(cluster)
+    for node_id, gpu_ids in allocation.items():
+        for gpu_id in gpu_ids:
+            gpu = index[(node_id, gpu_id)]
+            gpu.extra_info["memory_used"] = gpu.extra_info.get("memory_used", 0) - memory_required
+
+
+def simulate(scheduler: GPUScheduler, cluster: ClusterInfo, trace: List[Dict[str, Any]],
+             exclusive: bool = False) -> Dict[str, Any]:
+    """
+    回放轨迹
+
+    Args:
+        scheduler: 被评估的调度器
+        cluster: 初始集群（不会被修改）
+        trace: 事件列表
+        exclusive: 独占整卡模式（不感知已用显存的调度器只能按整卡分配）
+
+    Returns:
+        Dict: 指标汇总，利用率和碎片率按时间加权平均
+    """
+    working = copy.deepcopy(cluster)
+    taken = set()
+    live: Dict[str, tuple] = {}  # model_id -> (allocation, memory_required)
+    latencies: List[float] = []
+    deploys = rejected = overcommitted = 0
+    weighted = {"memory_util": 0.0, "gpu_occupancy": 0.0, "fragmentation": 0.0}
+    peak_util = 0.0
+    last_time = trace[0]["time"] if trace else 0.0
+    metrics = cluster_metrics(working)
+
+    for event in trace:
+        elapsed = event["time"] - last_time
+        for name in weighted:
+            weighted[name] += metrics[name] * elapsed
+        last_time = event["time"]
+
+        if event["op"] == "deploy":
+            deploys += 1
+            view = exclusive_view(working, taken) if exclusive else working
+            started = time.perf_counter()
+            allocation = scheduler.allocate_gpus(view, event["gpu_count"], event["memory_required"])
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not allocation.success:
+                rejected += 1
+            elif not apply_allocation(working, allocation.allocation, event["memory_required"]):
+                overcommitted += 1
+                scheduler.release(allocation, event["memory_required"])
+            else:
+                live[event["model_id"]] = (allocation, event["memory_required"])
+                if exclusive:
+                    taken.update((node_id, gpu_id) for node_id, gpu_ids in allocation.allocation.items()
+                                 for gpu_id in gpu_ids)
+        elif event["op"] == "undeploy" and event["model_id"] in live:
+            allocation, memory_required = live.pop(event["model_id"])
+            release_allocation(working, allocation.allocation, memory_required)
+            if exclusive:
+                taken.difference_update((node_id, gpu_id) for node_id, gpu_ids in allocation.allocation.items()
+                                        for gpu_id in gpu_ids)
+            scheduler.release(allocation, memory_required)
+        metrics = cluster_metrics(working)
+        peak_util = max(peak_util, metrics["memory_util"])
+
+    duration = max(last_time - (trace[0]["time"] if trace else 0.0), 1e-9)
+    latencies.sort()
+    return {
+        "deploys": deploys,
+        "rejected": rejected,
+        "overcommitted": overcommitted,
+        "rejection_rate": (rejected + overcommitted) / max(deploys, 1),
+        "memory_util": weighted["memory_util"] / duration,
+        "peak_memory_util": peak_util,
+        "gpu_occupancy": weighted["gpu_occupancy"] / duration,
+        "fragmentation": weighted["fragmentation"] / duration,
+        "latency_mean_ms": statistics.mean(latencies) if latencies else 0.0,
+        "latency_p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+        "latency_p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] if latencies else 0.0
+    }
+
+
+def default_schedulers() -> Dict[str, tuple]:
+    """名称 -> (调度器工厂, 是否独占整卡)"""
+    schedulers = {
+        "SingleNodeFirst": (SingleNodeFirstScheduler, True),
+        "MemoryOptimized": (MemoryOptimizedScheduler, True),
+        "UtilizationAware": (UtilizationAwareScheduler, True),
+        "BinPacking": (BinPackingScheduler, False),
+        "TopologyAware": (TopologyAwareScheduler, False),
+    }
+    try:
+        from capacity_snapshot import VectorizedScheduler
+        schedulers["Vectorized"] = (VectorizedScheduler, False)
+    except ImportError:
+        pass
+    return schedulers
+
+
+# ====================== 报告与回归检查 ======================
+
+def print_report(results: Dict[str, Dict[str, Any]]):
+    header = (f"{'调度器':<18}{'拒绝率':>8}{'显存利用率':>12}{'峰值':>8}{'GPU占用':>9}"
+              f"{'碎片率':>8}{'平均(ms)':>10}{'P99(ms)':>9}")
+    print(header)
+    print("-" * len(header.encode("gbk", errors="ignore")))
+    for name, r in results.items():
+        print(f"{name:<21}{r['rejection_rate']:>8.1%}{r['memory_util']:>12.1%}{r['peak_memory_util']:>10.1%}"
+              f"{r['gpu_occupancy']:>10.1%}{r['fragmentation']:>10.1%}"
+              f"{r['latency_mean_ms']:>10.3f}{r['latency_p99_ms']:>9.3f}")
+
+
+def check_regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> List[str]:
+    """与基线结果比较，返回退化描述列表"""
+    problems = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["rejection_rate"] > base["rejection_rate"] + REGRESSION_TOLERANCE["rejection_rate"]:
+            problems.append(f"{name}: 拒绝率 {base['rejection_rate']:.1%} -> {current['rejection_rate']:.1%}")
+        if current["memory_util"] < base["memory_util"] - REGRESSION_TOLERANCE["memory_util"]:
+            problems.append(f"{name}: 显存利用率 {base['memory_util']:.1%} -> {current['memory_util']:.1%}")
+        if current["fragmentation"] > base["fragmentation"] + REGRESSION_TOLERANCE["fragmentation"]:
+            problems.append(f"{name}: 碎片率 {base['fragmentation']:.1%} -> {current['fragmentation']:.1%}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="GPU调度器离线模拟器")
+    parser.add_argument("--trace", help="回放的轨迹文件(JSONL)，为空时生成合成轨迹")
+    parser.add_argument("--generate", help="生成合成轨迹并写入该文件后退出")
+    parser.add_argument("--events", type=int, default=1000, help="合成轨迹的部署请求数")
+    parser.add_argument("--arrival-rate", type=float, default=1.0, help="合成轨迹每秒到达的部署数")
+    parser.add_argument("--mean-lifetime", type=float, default=60.0, help="合成轨迹的平均存活时间(秒)")
+    parser.add_argument("--cluster", help="集群描述文件(JSON)，为空时使用合成集群")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--scheduler", action="append", help="只评估指定调度器（可重复）")
+    parser.add_argument("--output", help="将结果写入JSON文件（可作为之后的基线）")
+    parser.add_argument("--baseline", help="基线结果JSON，指标超出容忍度时返回非0")
+    args = parser.parse_args()
+
+    if args.generate:
+        save_trace(generate_trace(args.events, args.seed, args.arrival_rate, args.mean_lifetime), args.generate)
+        print(f"已生成轨迹: {args.generate}")
+        return 0
+
+    trace = (load_trace(args.trace) if args.trace
+             else generate_trace(args.events, args.seed, args.arrival_rate, args.mean_lifetime))
+    cluster = load_cluster_fixture(args.cluster) if args.cluster else build_synthetic_cluster(args.seed, 0.0)
+
+    schedulers = default_schedulers()
+    if args.scheduler:
+        schedulers = {name: spec for name, spec in schedulers.items() if name in args.scheduler}
+
+    results = {}
+    for name, (factory, exclusive) in schedulers.items():
+        results[name] = simulate(factory(), cluster, trace, exclusive)
+
+    gpu_total = sum(len(node.gpus) for node in cluster.nodes)
+    print(f"\n=== 轨迹回放: {len(trace)} 个事件, 集群 {cluster.name} ({gpu_total} 张GPU) ===")
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            problems = check_regressions(results, json.load(f))
+        if problems:
+            print("\n指标退化:")
+            for problem in problems:
+                print(f"  - {problem}")
+            return 1
+        print("\n与基线相比没有指标退化")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    sys.exit(main())
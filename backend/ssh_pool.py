@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+SSH连接池与节点探测
+按 (主机, 端口, 用户) 复用SSH连接，节点的系统信息和GPU信息通过一个组合探测脚本一次往返获取，
+多个节点并发探测
+"""
+
+import logging
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("ssh_pool")
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+
+# 组合探测脚本：每段输出以 ===名称=== 开头，命令失败时该段为空
+PROBE_SCRIPT = """
+echo '===HOSTNAME==='; hostname
+echo '===UNAME==='; uname -a
+echo '===MEMORY==='; free -m | grep Mem
+echo '===LSCPU==='; lscpu 2>/dev/null
+echo '===GPUS==='; nvidia-smi --query-gpu=index,name,memory.total,driver_version,utilization.gpu,memory.used,memory.free --format=csv,noheader,nounits 2>/dev/null
+echo '===TOPOLOGY==='; nvidia-smi topo -m 2>/dev/null
+true
+"""
+
+
+class SSHConnectionPool:
+    """SSH连接池，空闲连接超时后关闭"""
+
+    def __init__(self, max_per_host: int = 4, idle_timeout: float = 300.0, connect_timeout: float = 10.0):
+        """
+        Args:
+            max_per_host: 每个 (主机, 端口, 用户) 保留的最大空闲连接数
+            idle_timeout: 空闲连接的保留时间(秒)
+            connect_timeout: 建立连接的超时时间(秒)
+        """
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._idle: Dict[Tuple[str, int, str], List[Tuple[Any, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, host: str, port: int, username: str, password: Optional[str],
+                 key_filename: Optional[str]):
+        import paramiko
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(host, port, username, password or None, key_filename=key_filename,
+                       timeout=self.connect_timeout, banner_timeout=self.connect_timeout,
+                       auth_timeout=self.connect_timeout)
+        return client
+
+    @staticmethod
+    def _is_alive(client) -> bool:
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    @contextmanager
+    def connection(self, host: str, port: int = 22, username: str = "root", password: Optional[str] = None,
+                   key_filename: Optional[str] = None):
+        """借出一个连接，使用完归还；使用中出错的连接会被关闭而不是归还"""
+        key = (host, int(port), username)
+        client = None
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, returned_at = idle.pop()
+                if now - returned_at < self.idle_timeout and self._is_alive(candidate):
+                    client = candidate
+                    break
+                candidate.close()
+        if client is None:
+            client = self._connect(host, int(port), username, password, key_filename)
+        try:
+            yield client
+        except Exception:
+            client.close()
+            raise
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_per_host and self._is_alive(client):
+                idle.append((client, time.time()))
+            else:
+                client.close()
+
+    def run(self, host: str, command: str, port: int = 22, username: str = "root",
+            password: Optional[str] = None, key_filename: Optional[str] = None,
+            timeout: float = 60.0) -> Tuple[str, str, int]:
+        """
+        在远程主机上执行命令
+
+        Returns:
+            (stdout, stderr, 退出码)
+        """
+        with self.connection(host, port, username, password, key_filename) as client:
+            stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+            out = stdout.read().decode("utf-8", errors="replace")
+            err = stderr.read().decode("utf-8", errors="replace")
+            return out, err, stdout.channel.recv_exit_status()
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            for idle in self._idle.values():
+                for client, _ in idle:
+                    client.close()
+            self._idle.clear()
+
+
+# 全局连接池
+ssh_pool = SSHConnectionPool()
+
+
+def split_sections(output: str) -> Dict[str, str]:
+    """按 ===名称=== 标记拆分探测脚本输出"""
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in output.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("===") and stripped.endswith("===") and len(stripped) > 6:
+            current = stripped.strip("=")
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    # 只去掉首尾空行，保留行首缩进（nvidia-smi topo -m 的表头以制表符开头）
+    return {name: "\n".join(lines).strip("\n").rstrip() for name, lines in sections.items()}
+
+
+def parse_probe_output(output: str) -> Dict[str, Any]:
+    """
+    解析探测脚本输出
+
+    Returns:
+        Dict: hostname, os, os_version, memory_total, memory_available(MB), cpu_info,
+              gpus([{index, name, memory_total, driver_version, utilization, memory_used, memory_free}]), topology(nvidia-smi topo -m 原始输出)
+    """
+    sections = split_sections(output)
+    result: Dict[str, Any] = {"hostname": sections.get("HOSTNAME", "")}
+
+    uname = sections.get("UNAME", "").split()
+    result["os"] = uname[0] if uname else ""
+    result["os_version"] = " ".join(uname[2:])
+
+    mem_parts = sections.get("MEMORY", "").split()
+    if len(mem_parts) >= 7:
+        result["memory_total"] = int(mem_parts[1])
+        result["memory_available"] = int(mem_parts[6])
+
+    cpu = {}
+    for line in sections.get("LSCPU", "").splitlines():
+        if ":" in line:
+            key, value = line.split(":", 1)
+            cpu[key.strip()] = value.strip()
+    result["cpu_info"] = {
+        "model": cpu.get("Model name", "Unknown"),
+        "cores": int(cpu.get("CPU(s)", 0) or 0),
+        "architecture": cpu.get("Architecture", "Unknown"),
+        "vendor": cpu.get("Vendor ID", "Unknown")
+    }
+
+    def to_int(value: str) -> Optional[int]:
+        return int(float(value)) if value.replace(".", "", 1).isdigit() else None
+
+    gpus = []
+    for line in sections.get("GPUS", "").splitlines():
+        parts = [p.strip() for p in line.split(",")]
+        if len(parts) < 3 or not parts[0].isdigit():
+            continue
+        gpus.append({
+            "index": parts[0],
+            "name": parts[1],
+            "memory_total": to_int(parts[2]) or 0,
+            "driver_version": parts[3] if len(parts) > 3 else "Unknown",
+            "utilization": int(parts[4]) if len(parts) > 4 and parts[4].isdigit() else None,
+            "memory_used": to_int(parts[5]) if len(parts) > 5 else None,
+            "memory_free": to_int(parts[6]) if len(parts) > 6 else None
+        })
+    result["gpus"] = gpus
+    result["topology"] = sections.get("TOPOLOGY", "")
+    return result
+
+
+def probe_node(host: str, port: int = 22, username: str = "root", password: Optional[str] = None,
+               key_filename: Optional[str] = None, pool: Optional[SSHConnectionPool] = None,
+               timeout: float = 60.0, local: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    一次往返获取节点的系统和GPU信息
+
+    Args:
+        local: 是否在本机直接执行探测脚本，默认按 host 是否为本机地址判断
+    """
+    if local is None:
+        local = host in LOCAL_HOSTS
+    if local:
+        output = subprocess.run(["bash", "-c", PROBE_SCRIPT], capture_output=True, text=True,
+                                timeout=timeout).stdout
+    else:
+        output, _, _ = (pool or ssh_pool).run(host, PROBE_SCRIPT, port, username, password,
+                                              key_filename, timeout)
+    return parse_probe_output(output)
+
+
+def probe_nodes(hosts: List[Dict[str, Any]], max_workers: int = 32,
+                pool: Optional[SSHConnectionPool] = None) -> List[Any]:
+    """
+    并发探测多个节点
+
+    Args:
+        hosts: [{"ip", "port", "username", "password", "key_filename", "local"}]
+        max_workers: 最大并发数
+
+    Returns:
+        List: 与 hosts 一一对应的探测结果；失败的节点对应异常对象
+    """
+    def probe(host: Dict[str, Any]):
+        try:
+            return probe_node(host["ip"], host.get("port", 22), host.get("username", "root"),
+                              host.get("password"), host.get("key_filename"), pool,
+                              local=host.get("local"))
+        except Exception as e:
+            logger.error(f"探测节点 {host['ip']} 失败: {e}")
+            return e
+
+    if not hosts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(hosts))) as executor:
+        return list(executor.map(probe, hosts))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+预热备用实例池
+为常用模型预先启动若干已加载权重但未注册的备用实例，部署请求到来时直接认领并注册，
+随后在后台补充新的备用实例；备用实例总内存受预算限制，长时间无部署需求的模型会被淘汰
+"""
+
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("standby_pool")
+
+
+@dataclass
+class StandbyInstance:
+    """备用实例"""
+    standby_id: str
+    model_name: str
+    memory_required: int  # MB
+    port: int = 0
+    gpu_ids: List[str] = field(default_factory=list)
+    process: Any = None
+    status: str = "loading"  # loading, ready, claimed, stopped
+    created_at: float = field(default_factory=time.time)
+    ready_at: float = 0.0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class StandbyPool:
+    """预热备用实例池
+
+    实际的启动、停止和就绪检查由调用方提供:
+        launcher(standby) -> bool        启动进程并填充 port / gpu_ids / process
+        stopper(standby) -> None         停止进程并释放GPU
+        health_checker(standby) -> bool  实例是否已加载完成
+    """
+
+    def __init__(self, launcher: Callable[[StandbyInstance], bool],
+                 stopper: Callable[[StandbyInstance], None],
+                 health_checker: Callable[[StandbyInstance], bool],
+                 models: Optional[Dict[str, Dict[str, Any]]] = None,
+                 memory_budget: int = 0, idle_timeout: float = 3600, check_interval: float = 10):
+        """
+        Args:
+            models: 模型名 -> {"count": 备用实例数, "memory_required": 每个实例内存(MB), ...}
+            memory_budget: 所有备用实例的内存预算(MB)，0表示不限制
+            idle_timeout: 模型超过该时间(秒)没有部署请求时淘汰其备用实例且不再补充
+            check_interval: 后台维护线程的运行间隔(秒)
+        """
+        self.launcher = launcher
+        self.stopper = stopper
+        self.health_checker = health_checker
+        self.models = models or {}
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+
+        self._standbys: Dict[str, StandbyInstance] = {}  # standby_id -> 实例
+        self._last_demand: Dict[str, float] = {name: time.time() for name in self.models}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------------- 对外接口 ----------------------
+
+    def start(self):
+        """启动后台维护线程（补充、就绪检查、空闲淘汰）"""
+        if self._thread or not self.models:
+            return
+        self._thread = threading.Thread(target=self._maintain_loop, name="standby-pool")
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info(f"备用实例池已启动: {self.models}, 内存预算 {self.memory_budget}MB")
+
+    def claim(self, model_name: str,
+              matches: Optional[Callable[[StandbyInstance], bool]] = None) -> Optional[StandbyInstance]:
+        """
+        认领一个已就绪的备用实例，没有时返回None；每次调用都记为一次部署需求
+
+        Args:
+            model_name: 模型名
+            matches: matches(standby) 判断备用实例的节点、GPU等是否满足请求，为空时不限制
+        """
+        with self._lock:
+            if model_name in self.models:
+                self._last_demand[model_name] = time.time()
+            candidates = [s for s in self._standbys.values()
+                          if s.model_name == model_name and s.status == "ready"
+                          and (matches is None or matches(s))]
+            if not candidates:
+                return None
+            standby = min(candidates, key=lambda s: s.ready_at)
+            standby.status = "claimed"
+            del self._standbys[standby.standby_id]
+
+        logger.info(f"认领备用实例 {standby.standby_id} ({model_name}), 端口 {standby.port}")
+        self._wakeup.set()
+        return standby
+
+    def status(self) -> Dict[str, Any]:
+        """备用池状态"""
+        with self._lock:
+            return {
+                "memory_budget": self.memory_budget,
+                "memory_used": self._memory_used_locked(),
+                "models": {
+                    name: {
+                        "target": spec.get("count", 0),
+                        "ready": sum(1 for s in self._standbys.values()
+                                     if s.model_name == name and s.status == "ready"),
+                        "loading": sum(1 for s in self._standbys.values()
+                                       if s.model_name == name and s.status == "loading"),
+                        "last_demand": self._last_demand.get(name)
+                    }
+                    for name, spec in self.models.items()
+                }
+            }
+
+    def shutdown(self):
+        """停止所有备用实例"""
+        with self._lock:
+            standbys = list(self._standbys.values())
+            self._standbys.clear()
+        for standby in standbys:
+            self._stop(standby)
+
+    # ---------------------- 维护 ----------------------
+
+    def _memory_used_locked(self) -> int:
+        return sum(s.memory_required for s in self._standbys.values())
+
+    def _is_idle_locked(self, model_name: str, now: float) -> bool:
+        return now - self._last_demand.get(model_name, 0) > self.idle_timeout
+
+    def _maintain_loop(self):
+        while True:
+            try:
+                self.maintain()
+            except Exception as e:
+                logger.error(f"备用实例池维护出错: {e}")
+            self._wakeup.wait(self.check_interval)
+            self._wakeup.clear()
+
+    def maintain(self):
+        """执行一轮维护：就绪检查 -> 空闲淘汰 -> 补充"""
+        self._check_loading()
+        self._evict_idle()
+        self._refill()
+
+    def _check_loading(self):
+        with self._lock:
+            loading = [s for s in self._standbys.values() if s.status == "loading"]
+        for standby in loading:
+            if standby.process is not None and standby.process.poll() is not None:
+                logger.warning(f"备用实例 {standby.standby_id} 进程已退出，移除")
+                with self._lock:
+                    self._standbys.pop(standby.standby_id, None)
+                self._stop(standby)
+                continue
+            if self.health_checker(standby):
+                standby.status = "ready"
+                standby.ready_at = time.time()
+                logger.info(f"备用实例 {standby.standby_id} ({standby.model_name}) 已就绪, "
+                            f"加载耗时 {standby.ready_at - standby.created_at:.1f}秒")
+
+    def _evict_idle(self):
+        now = time.time()
+        with self._lock:
+            idle = [s for s in self._standbys.values() if self._is_idle_locked(s.model_name, now)]
+            for standby in idle:
+                del self._standbys[standby.standby_id]
+        for standby in idle:
+            logger.info(f"模型 {standby.model_name} 超过 {self.idle_timeout}秒 没有部署需求，"
+                        f"淘汰备用实例 {standby.standby_id}")
+            self._stop(standby)
+
+    def _refill(self):
+        now = time.time()
+        to_launch = []
+        with self._lock:
+            memory_used = self._memory_used_locked()
+            for name, spec in self.models.items():
+                if self._is_idle_locked(name, now):
+                    continue
+                memory_required = int(spec.get("memory_required", 0))
+                current = sum(1 for s in self._standbys.values() if s.model_name == name)
+                for _ in range(int(spec.get("count", 0)) - current):
+                    if self.memory_budget and memory_used + memory_required > self.memory_budget:
+                        logger.warning(f"备用实例内存预算不足，跳过补充 {name}")
+                        break
+                    standby = StandbyInstance(
+                        standby_id=str(uuid.uuid4()),
+                        model_name=name,
+                        memory_required=memory_required,
+                        extra=dict(spec)
+                    )
+                    self._standbys[standby.standby_id] = standby
+                    memory_used += memory_required
+                    to_launch.append(standby)
+
+        for standby in to_launch:
+            try:
+                launched = self.launcher(standby)
+            except Exception as e:
+                logger.error(f"启动备用实例 {standby.standby_id} 失败: {e}")
+                launched = False
+            if launched:
+                logger.info(f"启动备用实例 {standby.standby_id} ({standby.model_name}), 端口 {standby.port}")
+            else:
+                with self._lock:
+                    self._standbys.pop(standby.standby_id, None)
+
+    def _stop(self, standby: StandbyInstance):
+        standby.status = "stopped"
+        try:
+            self.stopper(standby)
+        except Exception as e:
+            logger.error(f"停止备用实例 {standby.standby_id} 失败: {e}")
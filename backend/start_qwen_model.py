@@ -11,6 +11,7 @@ import uuid
 import argparse
 import requests
 import threading
+from collections import deque
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 
@@ -51,6 +52,33 @@ model_info = {
     "gpu_id": None
 }
 
+# 同时执行推理的请求数上限，超出的请求排队等待
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", 1))
+inference_slots = threading.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+# 请求统计，随实例信息上报，供自动扩缩容使用
+request_stats_lock = threading.Lock()
+request_stats = {
+    "in_flight": 0,             # 已接收未完成的请求数（含排队）
+    "requests_total": 0,
+    "last_request_at": 0.0,
+    "latencies": deque(maxlen=200)  # 最近请求的端到端延迟(ms)
+}
+
+def get_request_metrics():
+    """当前排队长度、处理中请求数和最近请求的p95延迟"""
+    with request_stats_lock:
+        in_flight = request_stats["in_flight"]
+        latencies = sorted(request_stats["latencies"])
+        metrics = {
+            "queue_length": max(in_flight - MAX_CONCURRENT_REQUESTS, 0),
+            "in_flight": in_flight,
+            "requests_total": request_stats["requests_total"],
+            "last_request_at": request_stats["last_request_at"]
+        }
+    metrics["latency_p95_ms"] = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] if latencies else 0.0
+    return metrics
+
 @app.route('/api/generate', methods=['POST'])
 def generate():
     """模型推理接口"""
@@ -63,7 +91,18 @@ def generate():
         max_length = data.get('max_length', 100)
         
         # 调用模型生成回复
-        response = model.generate(prompt, max_length)
+        started = time.time()
+        with request_stats_lock:
+            request_stats["in_flight"] += 1
+            request_stats["requests_total"] += 1
+            request_stats["last_request_at"] = started
+        try:
+            with inference_slots:
+                response = model.generate(prompt, max_length)
+        finally:
+            with request_stats_lock:
+                request_stats["in_flight"] -= 1
+                request_stats["latencies"].append((time.time() - started) * 1000)
         
         return jsonify({
             "status": "success",
@@ -90,10 +129,24 @@ def model_instances_info():
     """获取模型实例信息接口，供集群控制器轮询"""
     return jsonify({
         "status": "success",
-        "model_instances": [model_info],
+        "model_instances": [{**model_info, "metrics": get_request_metrics()}],
         "timestamp": time.time()
     })
 
+def apply_memory_limit(fraction):
+    """与其他实例共享GPU时，按集群控制器给出的比例限制本进程的显存占用（需要PyTorch）"""
+    if not fraction:
+        return
+    try:
+        import torch
+    except ImportError:
+        print(f"未安装PyTorch，忽略显存比例限制 {fraction}")
+        return
+    if torch.cuda.is_available():
+        for device in range(torch.cuda.device_count()):
+            torch.cuda.set_per_process_memory_fraction(float(fraction), device)
+        print(f"已将每张GPU的显存占用限制为 {float(fraction):.1%}")
+
 def register_with_cluster_controller(cluster_controller_url, model_data):
     """向集群控制器注册模型实例"""
     try:
@@ -119,34 +172,44 @@ def main():
     parser.add_argument('--model-name', type=str, default="Qwen/Qwen-7B-Chat", help='模型名称')
     parser.add_argument('--port', type=int, default=5010, help='服务器端口')
     parser.add_argument('--cluster-controller', type=str, default="http://localhost:5010", help='集群控制器URL')
-    parser.add_argument('--gpu-id', type=str, help='指定使用的GPU ID')
+    parser.add_argument('--gpu-id', type=str, help='指定使用的GPU ID，多卡时以逗号分隔')
     parser.add_argument('--memory-required', type=int, default=0, help='所需GPU内存(MB)')
+    parser.add_argument('--model-id', type=str, help='指定模型实例ID（默认随机生成）')
+    parser.add_argument('--standby', action='store_true', help='作为预热备用实例启动，不向集群控制器注册')
     args = parser.parse_args()
     
     global model, model_info
     
+    # 共享GPU时先限制显存占用，再加载模型
+    apply_memory_limit(os.environ.get("GPU_MEMORY_FRACTION"))
+    
     # 初始化模型
     model = QwenModel(model_name=args.model_name, gpu_id=args.gpu_id)
     
     # 设置模型信息
-    model_info["model_id"] = model.model_id
+    model_info["model_id"] = args.model_id or model.model_id
     model_info["model_name"] = model.model_name
     model_info["endpoint"] = f"http://localhost:{args.port}/api/generate"
     model_info["status"] = "online"
     model_info["gpu_id"] = args.gpu_id
     if args.memory_required > 0:
         model_info["memory_required"] = args.memory_required
+    if os.environ.get("GPU_MEMORY_LIMIT_MB"):
+        model_info["memory_limit_mb"] = int(os.environ["GPU_MEMORY_LIMIT_MB"])
     
     # 启动Flask服务器
     print(f"启动模型服务器在端口 {args.port}" + (f", 使用GPU {args.gpu_id}" if args.gpu_id else ""))
     
-    # 注册到集群控制器
-    register_thread = threading.Thread(
-        target=register_with_cluster_controller,
-        args=(args.cluster_controller, model_info)
-    )
-    register_thread.daemon = True
-    register_thread.start()
+    # 注册到集群控制器（备用实例由集群控制器在认领时注册）
+    if args.standby:
+        print("以备用实例模式启动，等待集群控制器认领")
+    else:
+        register_thread = threading.Thread(
+            target=register_with_cluster_controller,
+            args=(args.cluster_controller, model_info)
+        )
+        register_thread.daemon = True
+        register_thread.start()
     
     print(f"启动模型服务器，监听端口: {args.port}")
     app.run(host='0.0.0.0', port=args.port)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+异步流式转发（ASGI）
+Flask 的流式路由在生成器里用同步 requests 转发上游流，每个打开的对话占用一个服务线程直到生成结束。
+这里用纯 ASGI 应用和共享连接池的 httpx.AsyncClient 提供同样的流式路由：
+- POST /remote/generate/stream  与 model_schedule.router 相同的实例选择和统计
+- GET  /api/chat/stream          与 chat_api.stream_chat 相同的上游请求和SSE帧格式
+上游的每一行按字节加上 SSE 的 "data: " 帧直接转发，不解码；每次 send 完成后才读取下一块，
+客户端读得慢时上游连接也随之停止读取（背压），客户端断开时立即取消上游请求。
+
+运行: uvicorn stream_relay:app --host 0.0.0.0 --port 5003
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from model_schedule.router import DEFAULT_STRATEGY, ModelScheduler, affinity_key, instance_stats, routing_table
+
+logger = logging.getLogger("stream_relay")
+
+# 访问模型服务 /chat/stream 的令牌（与 chat_api.GradioModelClient 使用的令牌相同），未配置时 /api/chat/stream 不可用
+MODEL_API_TOKEN = os.environ.get("MODEL_API_TOKEN")
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+    (b"access-control-allow-origin", b"*"),
+]
+CONNECTING_EVENT = "data: {\"text\": \"正在连接模型...\"}\n\n".encode("utf-8")
+DONE_EVENT = b"data: [DONE]\n\n"
+
+
+def sse_frames(lines: List[bytes]) -> bytes:
+    """把上游的若干行（不含换行）包装为SSE事件，空行跳过"""
+    return b"".join(b"data: " + line.rstrip(b"\r") + b"\n\n" for line in lines if line.strip())
+
+
+def error_event(message: str) -> bytes:
+    return f"data: {json.dumps({'error': message}, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def chat_text_event(chunk: str) -> bytes:
+    """chat_api.stream_chat 的帧：把客户端产出的每个块包装为 {"text": 块}"""
+    return f"data: {json.dumps({'text': chunk})}\n\n".encode("utf-8")
+
+
+def chat_frames(lines: List[bytes]) -> bytes:
+    """
+    按 chat_api 的方式转换上游的JSON行：GradioModelClient 把带 text 的行转为
+    'data: {"text": ..., "done": true}' 字符串，stream_chat 再把该字符串包装为一个SSE事件；
+    无法解析或没有 text 的行跳过
+    """
+    frames = []
+    for line in lines:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(data, dict) or "text" not in data:
+            continue
+        event = {"text": data.get("text", "")}
+        if data.get("done", False):
+            event["done"] = True
+        frames.append(chat_text_event(f"data: {json.dumps(event)}"))
+    return b"".join(frames)
+
+
+def chat_error_event(message: str) -> bytes:
+    """chat_api 中上游出错时，错误信息作为普通文本块发送"""
+    return chat_text_event(message)
+
+
+def static_instances() -> Optional[List[Dict[str, Any]]]:
+    """STREAM_RELAY_INSTANCES 环境变量中配置的固定实例列表（JSON），未配置时返回None"""
+    value = os.environ.get("STREAM_RELAY_INSTANCES")
+    return json.loads(value) if value else None
+
+
+class StreamRelay:
+    """ASGI 流式转发应用"""
+
+    def __init__(self, instances_loader: Optional[Callable[[], List[Dict[str, Any]]]] = None,
+                 max_connections: int = 10000, connect_timeout: float = 10.0, read_timeout: float = 300.0):
+        """
+        Args:
+            instances_loader: 返回模型实例列表的函数，默认使用 STREAM_RELAY_INSTANCES 或路由表
+            max_connections: 连接池的最大上游连接数
+            connect_timeout: 连接上游的超时时间(秒)
+            read_timeout: 两次读取上游数据之间的最长间隔(秒)
+        """
+        fixed = static_instances()
+        self.instances_loader = instances_loader or ((lambda: fixed) if fixed is not None else routing_table.get)
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.client = None
+        self.active_streams = 0
+        self.total_streams = 0
+
+    def _create_client(self):
+        import httpx
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=min(self.max_connections, 1000)),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout, pool=self.connect_timeout)
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if self.client is None:
+            self.client = self._create_client()
+
+        route = (scope["method"], scope["path"])
+        if route == ("POST", "/remote/generate/stream"):
+            await self.remote_generate_stream(scope, receive, send)
+        elif route == ("GET", "/api/chat/stream"):
+            await self.chat_stream(scope, receive, send)
+        elif route == ("GET", "/relay/stats"):
+            await self._json(send, 200, {"status": "success", "data": self.stats()})
+        else:
+            await self._json(send, 404, {"status": "error", "message": "未找到"})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.client = self._create_client()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.client is not None:
+                    await self.client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _json(send, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"access-control-allow-origin", b"*")]})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    async def _instances(self) -> List[Dict[str, Any]]:
+        # 路由表冷启动时会同步刷新，放到线程中避免阻塞事件循环
+        return await asyncio.to_thread(self.instances_loader)
+
+    # ---------------------- 路由 ----------------------
+
+    async def remote_generate_stream(self, scope, receive, send):
+        """与 model_schedule.router.remote_generate_stream 相同的选择逻辑"""
+        try:
+            data = json.loads(await self._read_body(receive) or b"null")
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or not data:
+            await self._json(send, 400, {"status": "error", "message": "无效的请求数据"})
+            return
+
+        query = parse_qs(scope.get("query_string", b"").decode())
+        strategy = data.pop("strategy", None) or query.get("strategy", [None])[0]
+        if strategy and strategy not in ModelScheduler.STRATEGIES:
+            await self._json(send, 400, {"status": "error", "message": f"未知的调度策略: {strategy}"})
+            return
+        instances = await self._instances()
+        session_id = dict(scope.get("headers", [])).get(b"x-session-id", b"").decode() or None
+        key = affinity_key(data, session_id)
+        data.pop("session_id", None)
+        selected = (ModelScheduler.select(instances, strategy or DEFAULT_STRATEGY, data.get("model"), key=key)
+                    if instances else None)
+        if not selected:
+            await self._json(send, 503, {"status": "error", "message": "没有可用的模型实例"})
+            return
+        if not selected.get("port"):
+            await self._json(send, 500, {"status": "error", "message": "模型端口未知"})
+            return
+
+        if "prompt" in data and "messages" not in data:
+            data = {"messages": [{"role": "user", "content": data["prompt"]}],
+                    **{k: v for k, v in data.items() if k != "prompt"}}
+        url = f"http://{selected.get('server') or 'localhost'}:{selected['port']}/chat/stream"
+        instance_id = selected["id"]
+        started = time.time()
+
+        def on_first_chunk():
+            instance_stats.record_ttft(instance_id, (time.time() - started) * 1000)
+
+        instance_stats.begin(instance_id)
+        try:
+            await self.relay(receive, send, url, data, {"Accept": "*/*"}, on_first_chunk)
+        finally:
+            instance_stats.end(instance_id)
+
+    async def chat_stream(self, scope, receive, send):
+        """与 chat_api.stream_chat 相同的上游请求"""
+        query = parse_qs(scope.get("query_string", b"").decode())
+        model_id = query.get("model_id", [None])[0]
+        message = query.get("message", [None])[0]
+        if not model_id or not message:
+            await self._json(send, 400, {"status": "error", "message": "缺少必要参数"})
+            return
+
+        instances = await self._instances()
+        model = next((m for m in instances if m.get("id") == model_id), None)
+        if not model or model.get("status") != "running":
+            await self._json(send, 404, {"status": "error", "message": "模型不存在或未运行"})
+            return
+
+        if not MODEL_API_TOKEN:
+            await self._json(send, 503, {"status": "error", "message": "未配置模型服务令牌 MODEL_API_TOKEN"})
+            return
+
+        url = f"http://{model.get('server') or 'localhost'}:{model['port']}/chat/stream"
+        payload = {
+            "messages": [{"role": "user", "content": message}],
+            "max_length": 40,
+            "temperature": 0.7,
+            "top_p": 0.9
+        }
+        await self.relay(receive, send, url, payload, {"token": MODEL_API_TOKEN, "Accept": "*/*"},
+                         preamble=False, frames=chat_frames, error_frame=chat_error_event)
+
+    # ---------------------- 转发 ----------------------
+
+    async def relay(self, receive, send, url: str, payload: Dict[str, Any], headers: Dict[str, str],
+                    on_first_chunk: Optional[Callable[[], None]] = None, preamble: bool = True,
+                    frames: Callable[[List[bytes]], bytes] = sse_frames,
+                    error_frame: Callable[[str], bytes] = error_event):
+        """
+        把上游的逐行流转发为SSE
+
+        Args:
+            on_first_chunk: 收到上游第一块数据时的回调（用于记录TTFT）
+            preamble: 是否先发送"正在连接模型"事件
+            frames: 把若干完整的上游行转换为SSE事件
+            error_frame: 把错误信息转换为SSE事件
+        """
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+        self.active_streams += 1
+        self.total_streams += 1
+        forward = asyncio.ensure_future(self._forward(send, url, payload, headers, on_first_chunk, preamble,
+                                                      frames, error_frame))
+        disconnect = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            done, _ = await asyncio.wait({forward, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if forward in done:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            else:
+                # 客户端已断开，取消上游请求释放连接
+                forward.cancel()
+                await asyncio.gather(forward, return_exceptions=True)
+        finally:
+            disconnect.cancel()
+            self.active_streams -= 1
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def _forward(self, send, url: str, payload: Dict[str, Any], headers: Dict[str, str],
+                       on_first_chunk: Optional[Callable[[], None]], preamble: bool,
+                       frames: Callable[[List[bytes]], bytes], error_frame: Callable[[str], bytes]):
+        async def emit(body: bytes):
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+
+        if preamble:
+            await emit(CONNECTING_EVENT)
+        try:
+            # 按原始字节转发，要求上游不压缩
+            headers = {**headers, "Accept-Encoding": "identity"}
+            async with self.client.stream("POST", url, json=payload, headers=headers) as upstream:
+                if upstream.status_code != 200:
+                    await emit(error_frame(f"模型API返回错误: {upstream.status_code}") + DONE_EVENT)
+                    return
+                pending = b""
+                async for chunk in upstream.aiter_raw():
+                    if on_first_chunk is not None:
+                        on_first_chunk()
+                        on_first_chunk = None
+                    lines = (pending + chunk).split(b"\n")
+                    pending = lines.pop()
+                    body = frames(lines)
+                    if body:
+                        await emit(body)
+                await emit(frames([pending]) + DONE_EVENT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"转发 {url} 失败: {e}")
+            await emit(error_frame(f"连接模型API时发生错误: {str(e)}") + DONE_EVENT)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active_streams": self.active_streams, "total_streams": self.total_streams}
+
+
+app = StreamRelay()
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="异步流式转发服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5003)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+异步流式转发压测
+启动一个逐行慢速输出的模拟模型服务和一个 stream_relay 子进程，同时打开大量 /remote/generate/stream 流，
+统计完成数、峰值并发流数、首字节延迟，以及转发进程的线程数和内存占用
+
+用法: python stream_relay_loadtest.py --streams 2000 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_status(pid: int) -> Dict[str, int]:
+    """进程的线程数和常驻内存(MB)"""
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key == "Threads":
+                status["threads"] = int(value)
+            elif key == "VmRSS":
+                status["rss_mb"] = int(value.split()[0]) // 1024
+    return status
+
+
+async def fake_model_server(reader, writer, tokens: int, interval: float):
+    """模拟模型服务：每个请求按 interval 间隔输出 tokens 行JSON（chunked），支持keep-alive"""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                         b"Transfer-Encoding: chunked\r\n\r\n")
+            for i in range(tokens):
+                await asyncio.sleep(interval)
+                line = json.dumps({"text": f"token{i}", "done": i == tokens - 1}).encode() + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+        # 压测结束时仍保持的空闲连接会被取消
+        pass
+    finally:
+        writer.close()
+
+
+async def open_stream(port: int, results: List[Dict[str, float]], active: List[int]):
+    """打开一个流并读到 [DONE]"""
+    started = time.perf_counter()
+    body = json.dumps({"prompt": "hi", "strategy": "round_robin"}).encode()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"POST /remote/generate/stream HTTP/1.1\r\nHost: relay\r\nContent-Type: application/json\r\n"
+                     b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+        await writer.drain()
+        active[0] += 1
+        first_byte = None
+        events = 0
+        buffer = b""
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            buffer += chunk
+            events += chunk.count(b"data: {\"text\": \"token")
+            if b"data: [DONE]" in buffer[-64:]:
+                break
+            buffer = buffer[-64:]
+        active[0] -= 1
+        writer.close()
+        results.append({"ok": events > 0, "first_byte": first_byte or 0.0, "events": events,
+                        "total": time.perf_counter() - started})
+    except Exception:
+        results.append({"ok": False, "first_byte": 0.0, "events": 0, "total": time.perf_counter() - started})
+
+
+async def run(args):
+    upstream_port = free_port()
+    relay_port = free_port()
+    server = await asyncio.start_server(
+        lambda r, w: fake_model_server(r, w, args.tokens, args.duration / args.tokens),
+        "127.0.0.1", upstream_port, backlog=args.streams)
+
+    env = dict(os.environ, STREAM_RELAY_INSTANCES=json.dumps(
+        [{"id": "fake-model", "server": "127.0.0.1", "port": upstream_port, "status": "running"}]))
+    relay = subprocess.Popen([sys.executable, "-m", "uvicorn", "stream_relay:app", "--port", str(relay_port),
+                              "--log-level", "warning", "--backlog", str(args.streams)], cwd=HERE, env=env)
+    try:
+        for _ in range(100):
+            try:
+                _, w = await asyncio.open_connection("127.0.0.1", relay_port)
+                w.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        idle = process_status(relay.pid)
+
+        results: List[Dict[str, float]] = []
+        active = [0]
+        peak = {"streams": 0, "threads": 0, "rss_mb": 0}
+        started = time.perf_counter()
+        tasks = []
+        for i in range(args.streams):
+            tasks.append(asyncio.ensure_future(open_stream(relay_port, results, active)))
+            if args.ramp and i % 100 == 99:
+                await asyncio.sleep(args.ramp / (args.streams / 100))
+        while not all(t.done() for t in tasks):
+            status = process_status(relay.pid)
+            peak = {"streams": max(peak["streams"], active[0]),
+                    "threads": max(peak["threads"], status["threads"]),
+                    "rss_mb": max(peak["rss_mb"], status["rss_mb"])}
+            await asyncio.sleep(0.2)
+        elapsed = time.perf_counter() - started
+    finally:
+        relay.terminate()
+        relay.wait()
+        server.close()
+
+    ok = [r for r in results if r["ok"] and r["events"] == args.tokens]
+    first_bytes = sorted(r["first_byte"] * 1000 for r in ok) or [0.0]
+    print(f"流数 {args.streams}，每流 {args.tokens} 个事件，持续约 {args.duration}s")
+    print(f"完整完成: {len(ok)}/{args.streams}，总耗时 {elapsed:.1f}s，峰值并发流 {peak['streams']}")
+    print(f"首字节延迟(ms): P50 {statistics.median(first_bytes):.1f}  "
+          f"P99 {first_bytes[min(int(len(first_bytes) * 0.99), len(first_bytes) - 1)]:.1f}")
+    print(f"转发进程: 线程 {idle['threads']} -> 峰值 {peak['threads']}，"
+          f"内存 {idle['rss_mb']}MB -> 峰值 {peak['rss_mb']}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="异步流式转发压测")
+    parser.add_argument("--streams", type=int, default=2000, help="并发流数")
+    parser.add_argument("--tokens", type=int, default=20, help="每个流的事件数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个流的持续时间(秒)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="在多少秒内打开所有流")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
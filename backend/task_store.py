@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+部署任务存储
+按任务ID索引任务，维护按创建时间排序的索引以支持游标分页和状态过滤，
+并回收过期的已完成任务。可选使用本地SQLite(WAL)文件持久化，控制器重启后任务记录不丢失
+"""
+
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("task_store")
+
+# 任务终态，只有终态任务参与过期回收
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def encode_cursor(created_at: float, task_id: str) -> str:
+    """将排序键编码为游标"""
+    return f"{created_at!r}|{task_id}"
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[float, str]]:
+    """解析游标，格式错误时返回None"""
+    try:
+        created_at, task_id = cursor.split("|", 1)
+        return float(created_at), task_id
+    except (AttributeError, ValueError):
+        return None
+
+
+class TaskStore:
+    """部署任务存储
+
+    - tasks: task_id -> 任务字典，按ID查找为O(1)
+    - 时间索引: 按 (created_at, task_id) 排序的列表，分页时二分定位游标
+    - 完成队列: 按完成时间排列的已完成任务，过期回收只处理队首
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Args:
+            db_path: SQLite文件路径，为空时仅保存在内存中
+        """
+        self.db_path = db_path
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._index: List[Tuple[float, str]] = []
+        self._finished = deque()  # (finished_at, task_id)
+        self._finished_ids = set()
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if db_path:
+            self._open_db(db_path)
+            self._load_from_db()
+
+    @property
+    def persistent(self) -> bool:
+        return self._conn is not None
+
+    # ---------------------- SQLite ----------------------
+
+    def _open_db(self, db_path: str):
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS deployment_tasks ("
+            "task_id TEXT PRIMARY KEY, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "status TEXT NOT NULL, "
+            "data TEXT NOT NULL)"
+        )
+        logger.info(f"任务存储使用SQLite文件: {db_path}")
+
+    def _load_from_db(self):
+        rows = self._conn.execute("SELECT data FROM deployment_tasks ORDER BY created_at").fetchall()
+        finished = []
+        for (data,) in rows:
+            try:
+                task = json.loads(data)
+            except ValueError:
+                continue
+            self._tasks[task["task_id"]] = task
+            self._index.append(self._sort_key(task))
+            if task.get("status") in FINISHED_STATUSES:
+                finished.append((task.get("updated_at", 0), task["task_id"]))
+        self._index.sort()
+        finished.sort()
+        self._finished.extend(finished)
+        self._finished_ids.update(task_id for _, task_id in finished)
+        logger.info(f"从SQLite加载了 {len(self._tasks)} 个部署任务")
+
+    def _write_db(self, task: Dict[str, Any]):
+        if not self._conn:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO deployment_tasks (task_id, created_at, updated_at, status, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (task["task_id"], task.get("created_at", 0), task.get("updated_at", 0),
+                 task.get("status", ""), json.dumps(task, default=str))
+            )
+        except sqlite3.Error as e:
+            logger.error(f"保存任务 {task['task_id']} 到SQLite失败: {e}")
+
+    def _delete_db(self, task_ids: List[str]):
+        if not self._conn or not task_ids:
+            return
+        try:
+            self._conn.executemany("DELETE FROM deployment_tasks WHERE task_id = ?",
+                                   [(task_id,) for task_id in task_ids])
+        except sqlite3.Error as e:
+            logger.error(f"从SQLite删除任务失败: {e}")
+
+    # ---------------------- 读写 ----------------------
+
+    @staticmethod
+    def _sort_key(task: Dict[str, Any]) -> Tuple[float, str]:
+        return task.get("created_at", 0), task["task_id"]
+
+    def put(self, task: Dict[str, Any]):
+        """新增或更新任务；任务进入终态时登记到完成队列"""
+        with self._lock:
+            task_id = task["task_id"]
+            if task_id not in self._tasks:
+                bisect.insort(self._index, self._sort_key(task))
+            self._tasks[task_id] = task
+
+            if task.get("status") in FINISHED_STATUSES and task_id not in self._finished_ids:
+                self._finished.append((task.get("updated_at") or time.time(), task_id))
+                self._finished_ids.add(task_id)
+
+            self._write_db(task)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """按ID获取任务"""
+        return self._tasks.get(task_id)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def delete(self, task_id: str) -> bool:
+        """删除任务"""
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+            if task is None:
+                return False
+            self._remove_from_index(task)
+            self._finished_ids.discard(task_id)
+            self._delete_db([task_id])
+            return True
+
+    def _remove_from_index(self, task: Dict[str, Any]):
+        key = self._sort_key(task)
+        pos = bisect.bisect_left(self._index, key)
+        if pos < len(self._index) and self._index[pos] == key:
+            del self._index[pos]
+
+    def list(self, limit: int = 100, cursor: Optional[str] = None,
+             statuses: Optional[Iterable[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按创建时间倒序分页列出任务
+
+        Args:
+            limit: 每页最大数量
+            cursor: 上一页返回的游标，为空时从最新任务开始
+            statuses: 只返回这些状态的任务
+
+        Returns:
+            (任务列表, 下一页游标)，没有更多数据时游标为None
+        """
+        statuses = set(statuses) if statuses else None
+        limit = max(1, int(limit))
+
+        with self._lock:
+            end = len(self._index)
+            if cursor:
+                key = decode_cursor(cursor)
+                if key is not None:
+                    end = bisect.bisect_left(self._index, key)
+
+            page = []
+            pos = end - 1
+            while pos >= 0 and len(page) < limit:
+                task = self._tasks.get(self._index[pos][1])
+                if task is not None and (statuses is None or task.get("status") in statuses):
+                    page.append(task)
+                pos -= 1
+
+            next_cursor = None
+            if pos >= 0 and page:
+                next_cursor = encode_cursor(*self._sort_key(page[-1]))
+            return page, next_cursor
+
+    # ---------------------- 回收 ----------------------
+
+    def expire(self, ttl: float, now: Optional[float] = None) -> int:
+        """删除完成时间超过ttl秒的任务，返回删除数量"""
+        now = now or time.time()
+        expired = []
+        with self._lock:
+            while self._finished and self._finished[0][0] + ttl <= now:
+                _, task_id = self._finished.popleft()
+                self._finished_ids.discard(task_id)
+                task = self._tasks.pop(task_id, None)
+                if task is not None:
+                    self._remove_from_index(task)
+                    expired.append(task_id)
+            self._delete_db(expired)
+        return len(expired)
+
+    def mark_unfinished_failed(self, reason: str) -> int:
+        """将未进入终态的任务标记为失败（用于重启后恢复）"""
+        count = 0
+        with self._lock:
+            for task in list(self._tasks.values()):
+                if task.get("status") not in FINISHED_STATUSES:
+                    task["status"] = "failed"
+                    task["error"] = reason
+                    task["updated_at"] = time.time()
+                    self.put(task)
+                    count += 1
+        return count
+
+    def close(self):
+        """关闭SQLite连接"""
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,126 @@
+"""
+DockerInventory 测试：通过注入的 list_containers / events 驱动清单，不需要Docker守护进程
+"""
+
+import queue
+import threading
+import time
+import unittest
+
+from docker_inventory import DockerInventory
+
+
+def make_container(container_id, name, port=18000):
+    return {
+        "Id": container_id,
+        "Names": [f"/{name}"],
+        "Image": "transformers:apple-lite-v1",
+        "Ports": [{"PrivatePort": 8000, "PublicPort": port, "Type": "tcp"}]
+    }
+
+
+def make_event(action, container_id, name):
+    return {"Type": "container", "Action": action, "id": container_id,
+            "Actor": {"ID": container_id, "Attributes": {"name": name}}}
+
+
+class FakeDocker:
+    """可编程的 Docker Engine 替身：containers 为当前运行的容器，events 通过队列逐个推送"""
+
+    def __init__(self, containers=None):
+        self.containers = list(containers or [])
+        self.list_calls = 0
+        self.streams = queue.Queue()  # 每个元素为一次事件订阅的事件队列，队列中的 None 表示断开
+
+    def list_containers(self, name_prefix, container_id=None):
+        self.list_calls += 1
+        return [c for c in self.containers
+                if c["Names"][0].lstrip("/").startswith(name_prefix)
+                and (container_id is None or c["Id"] == container_id)]
+
+    def events(self, name_prefix, since=None):
+        stream = self.streams.get(timeout=5)
+        while True:
+            event = stream.get(timeout=5)
+            if event is None:
+                return
+            yield event
+
+
+class DockerInventoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.docker = FakeDocker([make_container("a1", "qwen-model-a", 18001),
+                                  make_container("x1", "other-service", 18002)])
+        self.inventory = DockerInventory(self.docker.list_containers, self.docker.events,
+                                         retry_interval=0.01)
+
+    def test_resync_lists_prefixed_containers(self):
+        self.inventory.resync()
+
+        self.assertTrue(self.inventory.ready)
+        instances = self.inventory.list()
+        self.assertEqual([m["id"] for m in instances], ["qwen-model-a"])
+        self.assertEqual(instances[0]["port"], "18001")
+
+    def test_start_event_adds_container(self):
+        self.inventory.resync()
+        self.docker.containers.append(make_container("b1", "qwen-model-b", 18003))
+
+        self.inventory.handle_event(make_event("start", "b1", "qwen-model-b"))
+
+        self.assertEqual([m["id"] for m in self.inventory.list()], ["qwen-model-a", "qwen-model-b"])
+
+    def test_die_event_removes_container(self):
+        self.inventory.resync()
+
+        self.inventory.handle_event(make_event("die", "a1", "qwen-model-a"))
+
+        self.assertEqual(self.inventory.list(), [])
+
+    def test_kill_and_oom_events_keep_container(self):
+        self.inventory.resync()
+
+        self.inventory.handle_event(make_event("kill", "a1", "qwen-model-a"))
+        self.inventory.handle_event(make_event("oom", "a1", "qwen-model-a"))
+
+        self.assertEqual([m["id"] for m in self.inventory.list()], ["qwen-model-a"])
+
+    def test_events_for_other_containers_are_ignored(self):
+        self.inventory.resync()
+        calls = self.docker.list_calls
+
+        self.inventory.handle_event(make_event("start", "x1", "other-service"))
+        self.inventory.handle_event(make_event("die", "x1", "other-service"))
+
+        self.assertEqual(self.docker.list_calls, calls)
+        self.assertEqual([m["id"] for m in self.inventory.list()], ["qwen-model-a"])
+
+    def test_stream_disconnect_triggers_resync(self):
+        first, second = queue.Queue(), queue.Queue()
+        self.docker.streams.put(first)
+        self.docker.streams.put(second)
+        thread = threading.Thread(target=self.inventory._run, daemon=True)
+        thread.start()
+
+        # 第一次订阅期间容器a退出、b启动，但事件流在送达之前断开
+        self.docker.containers = [make_container("b1", "qwen-model-b", 18003)]
+        first.put(None)
+
+        # 重连后全量同步，清单反映断开期间的变化
+        second.put(make_event("die", "zz", "qwen-model-z"))
+        for _ in range(500):
+            if [m["id"] for m in self.inventory.list()] == ["qwen-model-b"] and self.docker.list_calls >= 2:
+                break
+            time.sleep(0.01)
+
+        self.inventory.stop()
+        second.put(None)
+        thread.join(timeout=5)
+        self.assertGreaterEqual(self.docker.list_calls, 2)
+        self.assertEqual([m["id"] for m in self.inventory.list()], ["qwen-model-b"])
+        self.assertTrue(self.inventory.ready)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+GPU拓扑测试：解析 nvidia-smi topo -m 输出，以及拓扑感知调度器在NVLink域内的放置
+"""
+
+import os
+import unittest
+
+from ClusterRegister import ClusterInfo, NodeInfo, GPUInfo, GPUType
+from gpu_scheduler import TopologyAwareScheduler
+from gpu_topology import (
+    NVLINK_BASE_SCORE, parse_topology_matrix, attach_topology, gpu_link, gpu_numa_node, group_score, link_score
+)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def make_node(node_id, topology, gpu_count, memory_total=81920):
+    node = NodeInfo(id=node_id, name=node_id, ip="10.0.0.1", port=22, status="online")
+    node.gpus = [GPUInfo(id=f"{node_id}-gpu-{i}", name="A100-SXM4-80GB", memory_total=memory_total,
+                         gpu_type=GPUType.NVIDIA, extra_info={"memory_used": 0})
+                 for i in range(gpu_count)]
+    attach_topology(node.gpus, topology, f"{node_id}-gpu-")
+    return node
+
+
+class ParseTopologyTest(unittest.TestCase):
+
+    def test_parse_nvlink_islands(self):
+        topology = parse_topology_matrix(load_fixture("nvidia_smi_topo_8gpu_nvlink.txt"))
+
+        self.assertEqual(sorted(topology), [str(i) for i in range(8)])
+        self.assertEqual(topology["0"]["links"], {"1": "NV4", "2": "NV4", "3": "NV4",
+                                                  "4": "SYS", "5": "SYS", "6": "SYS", "7": "SYS"})
+        self.assertEqual(topology["5"]["links"]["4"], "NV4")
+        self.assertEqual(topology["5"]["links"]["3"], "SYS")
+        self.assertEqual(topology["0"]["cpu_affinity"], "0-23")
+        self.assertEqual([topology[str(i)]["numa_node"] for i in range(8)], [0] * 4 + [1] * 4)
+
+    def test_parse_skips_nic_columns_and_color_codes(self):
+        topology = parse_topology_matrix(load_fixture("nvidia_smi_topo_4gpu_pcie_nic.txt"))
+
+        self.assertEqual(sorted(topology), ["0", "1", "2", "3"])
+        self.assertEqual(topology["0"]["links"], {"1": "PIX", "2": "SYS", "3": "SYS"})
+        self.assertEqual(topology["2"]["links"]["3"], "NODE")
+        self.assertEqual(topology["3"]["cpu_affinity"], "16-31")
+        self.assertEqual(topology["3"]["numa_node"], 1)
+
+    def test_parse_output_without_matrix(self):
+        self.assertEqual(parse_topology_matrix(""), {})
+        self.assertEqual(parse_topology_matrix("NVIDIA-SMI has failed because it couldn't communicate"), {})
+
+    def test_link_score(self):
+        self.assertEqual(link_score("NV12"), NVLINK_BASE_SCORE + 12)
+        self.assertGreater(link_score("PIX"), link_score("NODE"))
+        self.assertGreater(link_score("NODE"), link_score("SYS"))
+        self.assertEqual(link_score(None), link_score("unknown"))
+
+
+class AttachTopologyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.node = make_node("node1", parse_topology_matrix(load_fixture("nvidia_smi_topo_8gpu_nvlink.txt")), 8)
+
+    def test_links_use_gpu_ids(self):
+        gpus = self.node.gpus
+        self.assertEqual(gpu_link(gpus[0], gpus[3]), "NV4")
+        self.assertEqual(gpu_link(gpus[3], gpus[4]), "SYS")
+        self.assertEqual(gpu_numa_node(gpus[6]), 1)
+
+    def test_group_score_prefers_single_island(self):
+        gpus = self.node.gpus
+        island = group_score(gpus[4:8])
+        split = group_score(gpus[2:6])
+        self.assertEqual(island[:2], (NVLINK_BASE_SCORE + 4, 1))
+        self.assertGreater(island, split)
+
+
+class TopologyPlacementTest(unittest.TestCase):
+
+    def setUp(self):
+        self.topology = parse_topology_matrix(load_fixture("nvidia_smi_topo_8gpu_nvlink.txt"))
+        self.node = make_node("node1", self.topology, 8)
+        self.cluster = ClusterInfo(id="topo-cluster", name="拓扑测试集群", adapter_type="nvidia", nodes=[self.node])
+        self.scheduler = TopologyAwareScheduler()
+
+    def test_tensor_parallel_group_stays_in_nvlink_island(self):
+        allocation = self.scheduler.allocate_gpus(self.cluster, 4, 60000)
+
+        self.assertTrue(allocation.success)
+        gpu_ids = allocation.allocation["node1"]
+        islands = {int(gpu_id.rsplit("-", 1)[1]) // 4 for gpu_id in gpu_ids}
+        self.assertEqual(len(gpu_ids), 4)
+        self.assertEqual(len(islands), 1)
+
+    def test_busy_gpu_moves_group_to_other_island(self):
+        # GPU1 只剩一半显存，4卡张量并行只能完整落在 GPU4-7
+        self.node.gpus[1].extra_info["memory_used"] = 40960
+
+        allocation = self.scheduler.allocate_gpus(self.cluster, 4, 60000)
+
+        self.assertTrue(allocation.success)
+        self.assertEqual(sorted(allocation.allocation["node1"]), [f"node1-gpu-{i}" for i in range(4, 8)])
+
+    def test_two_gpu_group_avoids_cross_numa_pair(self):
+        # 只剩 GPU3、GPU4、GPU7 空闲：GPU3 与另外两张跨NUMA，应选同一NVLink域的 GPU4、GPU7
+        for i in (0, 1, 2, 5, 6):
+            self.node.gpus[i].extra_info["memory_used"] = 40960
+
+        allocation = self.scheduler.allocate_gpus(self.cluster, 2, 60000)
+
+        self.assertTrue(allocation.success)
+        self.assertEqual(sorted(allocation.allocation["node1"]), ["node1-gpu-4", "node1-gpu-7"])
+
+
+if __name__ == "__main__":
+    unittest.main()
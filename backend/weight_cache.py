@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+节点本地模型权重缓存
+按内容(sha256)寻址存储从对象存储(OSS/S3)下载的模型文件，超出磁盘配额时按LRU淘汰；
+下载时按范围并行分块读取并校验checksum，同一对象的并发部署共享一次下载
+"""
+
+import abc
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger("weight_cache")
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "WEIGHT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "model-deploy", "weights")
+)
+DEFAULT_QUOTA_BYTES = int(float(os.environ.get("WEIGHT_CACHE_QUOTA_GB", 200)) * 1024 ** 3)
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024  # 16MB
+DEFAULT_FETCH_WORKERS = 8
+
+# 需要解包后才能作为模型目录使用的归档格式
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz")
+
+
+class WeightCacheError(Exception):
+    """权重缓存错误"""
+    pass
+
+
+def parse_object_url(url: str) -> Tuple[str, str]:
+    """解析 oss://bucket/key 或 s3://bucket/key，返回 (bucket, key)"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("oss", "s3") or not parsed.netloc:
+        raise WeightCacheError(f"不支持的对象存储地址: {url}")
+    return parsed.netloc, parsed.path.lstrip("/")
+
+
+# ====================== 对象存储 ======================
+
+class ObjectStore(abc.ABC):
+    """对象存储读取接口"""
+
+    @abc.abstractmethod
+    def head(self, bucket: str, key: str) -> Dict[str, Any]:
+        """
+        获取对象元数据
+
+        Returns:
+            Dict: size(字节), etag, sha256(若存储提供)
+        """
+        pass
+
+    @abc.abstractmethod
+    def read_range(self, bucket: str, key: str, start: int, end: int) -> bytes:
+        """读取 [start, end] 闭区间的字节"""
+        pass
+
+
+class HTTPObjectStore(ObjectStore):
+    """通过HTTP访问的对象存储（路径风格: {endpoint}/{bucket}/{key}）
+
+    适用于公开读或预签名访问的OSS/S3、MinIO，以及本地的S3/OSS替身服务
+    """
+
+    def __init__(self, endpoint: str, headers: Optional[Dict[str, str]] = None, timeout: float = 60):
+        self.endpoint = endpoint.rstrip("/")
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=DEFAULT_FETCH_WORKERS,
+                                                pool_maxsize=DEFAULT_FETCH_WORKERS * 2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _url(self, bucket: str, key: str) -> str:
+        return f"{self.endpoint}/{bucket}/{key}"
+
+    def head(self, bucket: str, key: str) -> Dict[str, Any]:
+        response = self.session.head(self._url(bucket, key), headers=self.headers, timeout=self.timeout)
+        if response.status_code != 200:
+            raise WeightCacheError(f"获取对象元数据失败: {bucket}/{key}, 状态码: {response.status_code}")
+        return {
+            "size": int(response.headers.get("Content-Length", 0)),
+            "etag": response.headers.get("ETag", "").strip('"'),
+            "sha256": (response.headers.get("x-oss-meta-sha256")
+                       or response.headers.get("x-amz-meta-sha256"))
+        }
+
+    def read_range(self, bucket: str, key: str, start: int, end: int) -> bytes:
+        headers = dict(self.headers)
+        headers["Range"] = f"bytes={start}-{end}"
+        response = self.session.get(self._url(bucket, key), headers=headers, timeout=self.timeout)
+        if response.status_code not in (200, 206):
+            raise WeightCacheError(f"读取对象失败: {bucket}/{key} [{start}-{end}], 状态码: {response.status_code}")
+        data = response.content
+        # 服务端不支持Range时会返回整个对象
+        if response.status_code == 200 and len(data) != end - start + 1:
+            data = data[start:end + 1]
+        return data
+
+
+class LocalObjectStore(ObjectStore):
+    """本地目录模拟的对象存储（{root}/{bucket}/{key}），用于测试和离线环境"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, key)
+
+    def head(self, bucket: str, key: str) -> Dict[str, Any]:
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise WeightCacheError(f"对象不存在: {bucket}/{key}")
+        stat = os.stat(path)
+        return {"size": stat.st_size, "etag": f"{stat.st_size}-{int(stat.st_mtime)}", "sha256": None}
+
+    def read_range(self, bucket: str, key: str, start: int, end: int) -> bytes:
+        with open(self._path(bucket, key), "rb") as f:
+            f.seek(start)
+            return f.read(end - start + 1)
+
+
+def object_store_from_env() -> Optional[ObjectStore]:
+    """根据环境变量创建对象存储：OSS_LOCAL_ROOT 优先，其次 OSS_ENDPOINT"""
+    local_root = os.environ.get("OSS_LOCAL_ROOT")
+    if local_root:
+        return LocalObjectStore(local_root)
+    endpoint = os.environ.get("OSS_ENDPOINT")
+    if endpoint:
+        headers = {}
+        if os.environ.get("OSS_AUTH_HEADER"):
+            headers["Authorization"] = os.environ["OSS_AUTH_HEADER"]
+        return HTTPObjectStore(endpoint, headers=headers)
+    return None
+
+
+# ====================== 权重缓存 ======================
+
+class WeightCache:
+    """节点本地权重缓存
+
+    目录结构:
+        {cache_dir}/blobs/{sha256}        对象内容
+        {cache_dir}/extracted/{sha256}/   归档解包后的模型目录
+        {cache_dir}/index.json            来源URL与缓存条目索引
+    """
+
+    def __init__(self, store: ObjectStore, cache_dir: str = DEFAULT_CACHE_DIR,
+                 quota_bytes: int = DEFAULT_QUOTA_BYTES, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_workers: int = DEFAULT_FETCH_WORKERS):
+        self.store = store
+        self.cache_dir = cache_dir
+        self.quota_bytes = quota_bytes
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.extract_dir = os.path.join(cache_dir, "extracted")
+        self.tmp_dir = os.path.join(cache_dir, "tmp")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        for path in (self.blob_dir, self.extract_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}  # 来源键 -> 进行中的下载
+        self._pinned: Dict[str, int] = {}  # digest -> 正在使用的引用数，不参与淘汰
+        self._reserved_bytes = 0  # 进行中的下载和解包已预留、尚未计入条目的空间
+        self._sources: Dict[str, str] = {}  # "url#etag" -> digest
+        self._entries: Dict[str, Dict[str, Any]] = {}  # digest -> {size, last_access, extracted}
+        self._load_index()
+
+    # ---------------------- 索引 ----------------------
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取权重缓存索引失败，将重新建立: {e}")
+            return
+        for digest, entry in index.get("entries", {}).items():
+            if os.path.exists(os.path.join(self.blob_dir, digest)):
+                self._entries[digest] = entry
+        self._sources = {k: v for k, v in index.get("sources", {}).items() if v in self._entries}
+
+    def _save_index_locked(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"entries": self._entries, "sources": self._sources}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def usage(self) -> Dict[str, Any]:
+        """缓存使用情况"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "used_bytes": sum(e["size"] for e in self._entries.values()),
+                "quota_bytes": self.quota_bytes,
+                "reserved_bytes": self._reserved_bytes,
+                "pinned": len(self._pinned),
+                "inflight": len(self._inflight)
+            }
+
+    # ---------------------- 获取 ----------------------
+
+    def fetch(self, url: str, expected_sha256: Optional[str] = None) -> str:
+        """
+        获取对象在本地缓存中的文件路径，未命中时下载
+
+        Args:
+            url: 对象地址，如 oss://bucket/models/qwen-7b.tar
+            expected_sha256: 期望的内容sha256，为空时使用对象存储提供的值（若有）
+
+        Returns:
+            str: 本地blob文件路径
+        """
+        return os.path.join(self.blob_dir, self._fetch_digest(url, expected_sha256))
+
+    def materialize(self, url: str, expected_sha256: Optional[str] = None) -> str:
+        """
+        获取可直接用作模型路径的本地路径，归档文件会解包为目录
+
+        返回的路径在调用 release 之前保持引用，不会被淘汰；部署使用该路径时应在模型停止后调用 release
+        """
+        digest = self._fetch_digest(url, expected_sha256, pin=True)
+        try:
+            blob_path = os.path.join(self.blob_dir, digest)
+            if not url.endswith(ARCHIVE_SUFFIXES):
+                return blob_path
+            return self._extract(digest, blob_path)
+        except Exception:
+            self._unpin(digest)
+            raise
+
+    def release(self, path: str):
+        """释放 materialize 返回的路径的引用，之后该条目可以被淘汰"""
+        digest = os.path.basename(os.path.normpath(path))
+        with self._lock:
+            if digest not in self._pinned:
+                logger.warning(f"释放未被引用的缓存路径: {path}")
+                return
+        self._unpin(digest)
+
+    def _fetch_digest(self, url: str, expected_sha256: Optional[str], pin: bool = False) -> str:
+        bucket, key = parse_object_url(url)
+        meta = self.store.head(bucket, key)
+        source_key = f"{url}#{meta.get('etag', '')}"
+        expected = expected_sha256 or meta.get("sha256")
+
+        with self._lock:
+            digest = self._sources.get(source_key)
+            if digest and digest in self._entries:
+                self._touch_locked(digest, pin)
+                logger.info(f"权重缓存命中: {url} -> {digest[:12]}")
+                return digest
+
+            # 同一对象已有下载在进行，等待其结果
+            future = self._inflight.get(source_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[source_key] = future
+
+        if not owner:
+            logger.info(f"等待进行中的下载: {url}")
+            digest = future.result()
+            with self._lock:
+                self._touch_locked(digest, pin)
+            return digest
+
+        try:
+            digest = self._download(bucket, key, meta["size"], expected)
+            with self._lock:
+                self._sources[source_key] = digest
+                self._touch_locked(digest, pin)
+                self._save_index_locked()
+            future.set_result(digest)
+            return digest
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(source_key, None)
+
+    def _touch_locked(self, digest: str, pin: bool):
+        self._entries[digest]["last_access"] = time.time()
+        if pin:
+            self._pinned[digest] = self._pinned.get(digest, 0) + 1
+
+    def _unpin(self, digest: str):
+        with self._lock:
+            count = self._pinned.get(digest, 0) - 1
+            if count > 0:
+                self._pinned[digest] = count
+            else:
+                self._pinned.pop(digest, None)
+
+    def _download(self, bucket: str, key: str, size: int, expected_sha256: Optional[str]) -> str:
+        """并行分块下载到临时文件，校验后移入blob目录，返回sha256"""
+        started = time.time()
+        self._reserve_space(size)
+        reserved = size
+
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+
+            ranges = [(start, min(start + self.chunk_size, size) - 1)
+                      for start in range(0, size, self.chunk_size)]
+            fd = os.open(tmp_path, os.O_WRONLY)
+            try:
+                def fetch_chunk(byte_range):
+                    start, end = byte_range
+                    data = self.store.read_range(bucket, key, start, end)
+                    if len(data) != end - start + 1:
+                        raise WeightCacheError(f"分块长度不符: {bucket}/{key} [{start}-{end}], 收到 {len(data)} 字节")
+                    os.pwrite(fd, data, start)
+
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    list(pool.map(fetch_chunk, ranges))
+            finally:
+                os.close(fd)
+
+            digest = self._sha256_file(tmp_path)
+            if expected_sha256 and digest != expected_sha256.lower():
+                raise WeightCacheError(f"校验失败: {bucket}/{key}, 期望 {expected_sha256}, 实际 {digest}")
+
+            blob_path = os.path.join(self.blob_dir, digest)
+            with self._lock:
+                self._reserved_bytes -= reserved
+                reserved = 0
+                if digest in self._entries:
+                    # 内容相同的对象已经缓存（来源不同），直接复用
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, blob_path)
+                    self._entries[digest] = {"size": size, "last_access": time.time(), "extracted": False}
+
+            elapsed = max(time.time() - started, 1e-6)
+            logger.info(f"下载完成: {bucket}/{key}, {size / 1024 ** 2:.1f}MB, "
+                        f"{len(ranges)} 个分块, {size / 1024 ** 2 / elapsed:.1f}MB/s")
+            return digest
+        except Exception:
+            if reserved:
+                with self._lock:
+                    self._reserved_bytes -= reserved
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _sha256_file(path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(4 * 1024 * 1024), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def _extract(self, digest: str, blob_path: str) -> str:
+        target = os.path.join(self.extract_dir, digest)
+        with self._lock:
+            extracted = self._entries[digest].get("extracted")
+        if extracted and os.path.isdir(target):
+            return target
+
+        tmp_target = os.path.join(self.tmp_dir, f"extract-{uuid.uuid4().hex}")
+        with tarfile.open(blob_path, "r:*") as archive:
+            members = archive.getmembers()
+            reserved = sum(m.size for m in members if m.isfile())
+            self._reserve_space(reserved, exclude=digest)
+            try:
+                self._extract_members(archive, members, tmp_target)
+            except Exception:
+                with self._lock:
+                    self._reserved_bytes -= reserved
+                shutil.rmtree(tmp_target, ignore_errors=True)
+                raise
+        extracted_size = sum(os.path.getsize(os.path.join(root, name))
+                             for root, _, names in os.walk(tmp_target) for name in names)
+
+        with self._lock:
+            self._reserved_bytes -= reserved
+            if os.path.isdir(target):
+                shutil.rmtree(tmp_target, ignore_errors=True)
+            else:
+                os.replace(tmp_target, target)
+                self._entries[digest]["size"] += extracted_size
+                self._entries[digest]["extracted"] = True
+                self._save_index_locked()
+        logger.info(f"已解包 {digest[:12]} 到 {target}")
+        return target
+
+    @staticmethod
+    def _extract_members(archive: tarfile.TarFile, members: List[tarfile.TarInfo], target: str):
+        """解包归档，拒绝绝对路径、越出目标目录的路径和链接以及设备文件"""
+        if hasattr(tarfile, "data_filter"):
+            archive.extractall(target, members=members, filter="data")
+            return
+        root = os.path.realpath(target)
+
+        def inside(path: str) -> bool:
+            return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+        for member in members:
+            path = os.path.join(root, member.name)
+            unsafe = os.path.isabs(member.name) or not inside(path) or member.isdev()
+            if member.issym():
+                unsafe = unsafe or not inside(os.path.join(os.path.dirname(path), member.linkname))
+            elif member.islnk():
+                unsafe = unsafe or not inside(os.path.join(root, member.linkname))
+            if unsafe:
+                raise WeightCacheError(f"归档包含不安全的路径: {member.name}")
+        archive.extractall(target, members=members)
+
+    # ---------------------- 淘汰 ----------------------
+
+    def _reserve_space(self, size: int, exclude: Optional[str] = None):
+        """
+        按LRU淘汰未被使用的条目，直到能放下size字节
+
+        进行中的下载和解包已预留的空间一并计入；预留成功后size计入预留，由调用方在写入条目时扣除
+        """
+        if size > self.quota_bytes:
+            raise WeightCacheError(f"对象大小 {size} 超过缓存配额 {self.quota_bytes}")
+        with self._lock:
+            used = sum(e["size"] for e in self._entries.values()) + self._reserved_bytes
+            candidates = sorted(
+                (d for d in self._entries if d not in self._pinned and d != exclude),
+                key=lambda d: self._entries[d]["last_access"]
+            )
+            for digest in candidates:
+                if used + size <= self.quota_bytes:
+                    break
+                used -= self._evict_locked(digest)
+            if used + size > self.quota_bytes:
+                raise WeightCacheError("缓存空间不足，所有条目都在使用中")
+            self._reserved_bytes += size
+            self._save_index_locked()
+
+    def _evict_locked(self, digest: str) -> int:
+        entry = self._entries.pop(digest)
+        self._sources = {k: v for k, v in self._sources.items() if v != digest}
+        blob_path = os.path.join(self.blob_dir, digest)
+        if os.path.exists(blob_path):
+            os.remove(blob_path)
+        shutil.rmtree(os.path.join(self.extract_dir, digest), ignore_errors=True)
+        logger.info(f"淘汰权重缓存条目 {digest[:12]}, 释放 {entry['size'] / 1024 ** 2:.1f}MB")
+        return entry["size"]
+
+
+# 全局权重缓存（根据环境变量延迟创建）
+_weight_cache: Optional[WeightCache] = None
+_weight_cache_lock = threading.Lock()
+
+
+def get_weight_cache() -> Optional[WeightCache]:
+    """获取全局权重缓存，未配置对象存储时返回None"""
+    global _weight_cache
+    with _weight_cache_lock:
+        if _weight_cache is None:
+            store = object_store_from_env()
+            if store is not None:
+                _weight_cache = WeightCache(store)
+        return _weight_cache
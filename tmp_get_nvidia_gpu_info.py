@@ -1,68 +1,25 @@
 #!/usr/bin/env python3
-import paramiko
 import json
-import re
+import os
 import sys
 
+# 复用 backend 中的SSH连接池和节点探测脚本
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from ssh_pool import probe_node
+
 def get_gpu_info(hostname, port, username, password):
     """获取远程服务器上的NVIDIA GPU信息"""
     try:
-        # 创建SSH客户端
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        # 连接到远程服务器
-        print(f"正在连接到远程服务器 {hostname}...")
-        ssh.connect(hostname, port, username, password)
-        print("连接成功！")
-        
-        # 执行nvidia-smi命令获取GPU信息
-        print("正在获取GPU信息...")
-        stdin, stdout, stderr = ssh.exec_command("nvidia-smi --query-gpu=index,name,memory.total,driver_version --format=csv,noheader")
-        output = stdout.read().decode("utf-8")
-        error = stderr.read().decode("utf-8")
-        
-        if error:
-            print(f"执行命令时出错: {error}")
-            
-        # 解析输出
-        gpus = []
-        lines = output.strip().split("\n")
-        print(f"原始输出: {lines}")
-        
-        for line in lines:
-            if not line.strip():
-                continue
-                
-            parts = line.split(", ")
-            if len(parts) >= 3:
-                index = parts[0].strip()
-                name = parts[1].strip()
-                memory = parts[2].strip()
-                driver_version = parts[3].strip() if len(parts) > 3 else "Unknown"
-                cuda_version = parts[4].strip() if len(parts) > 4 else "Unknown"
-                
-                # 提取内存大小（去除MiB或MB后缀）
-                memory_match = re.search(r'(\d+)', memory)
-                memory_total = int(memory_match.group(1)) if memory_match else 0
-                
-                # 创建GPU信息字典
-                gpu = {
-                    "index": index,
-                    "name": name,
-                    "memory_total": memory_total,
-                    "driver_version": driver_version,
-                    "cuda_version": cuda_version
-                }
-                gpus.append(gpu)
+        # 一次SSH往返获取节点信息
+        print(f"正在探测远程服务器 {hostname}...")
+        probe = probe_node(hostname, port, username, password, local=False)
+        print(f"原始GPU信息: {probe['gpus']}")
         
-        return gpus
+        return [{**gpu, "cuda_version": "Unknown"} for gpu in probe["gpus"]]
         
     except Exception as e:
         print(f"获取GPU信息时出错: {e}")
         return []
-    finally:
-        ssh.close()
 
 def main():
     # 远程服务器信息
@@ -1,109 +1,34 @@
 #!/usr/bin/env python3
 import requests
 import json
+import os
 import sys
-import paramiko
-import time
-import re
+
+# 复用 backend 中的SSH连接池和节点探测脚本
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from ssh_pool import probe_node
 
 def get_system_info(hostname, port, username, password):
-    """获取远程服务器的系统信息，包括内存、CPU和GPU"""
+    """获取远程服务器的系统信息，包括内存、CPU和GPU（一次SSH往返）"""
     try:
-        # 创建SSH客户端
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        # 连接到远程服务器
-        print(f"正在连接到远程服务器 {hostname}...")
-        ssh.connect(hostname, port, username, password)
-        print("连接成功！")
-        
-        # 获取系统信息
-        system_info = {}
-        
-        # 获取内存信息
-        print("正在获取内存信息...")
-        stdin, stdout, stderr = ssh.exec_command("free -m | grep Mem")
-        mem_output = stdout.read().decode("utf-8")
-        mem_parts = mem_output.split()
-        if len(mem_parts) >= 7:
-            system_info["memory_total"] = int(mem_parts[1])
-            system_info["memory_available"] = int(mem_parts[6])
-        
-        # 获取CPU信息
-        print("正在获取CPU信息...")
-        stdin, stdout, stderr = ssh.exec_command("lscpu")
-        cpu_output = stdout.read().decode("utf-8")
-        
-        # 解析CPU信息
-        cpu_info = {}
-        for line in cpu_output.split("\n"):
-            if ":" in line:
-                key, value = line.split(":", 1)
-                cpu_info[key.strip()] = value.strip()
-        
-        # 提取关键信息
-        system_info["cpu_info"] = {
-            "model": cpu_info.get("Model name", "Unknown"),
-            "cores": int(cpu_info.get("CPU(s)", 0)),
-            "architecture": cpu_info.get("Architecture", "Unknown"),
-            "vendor": cpu_info.get("Vendor ID", "Unknown")
+        print(f"正在探测远程服务器 {hostname}...")
+        probe = probe_node(hostname, port, username, password, local=False)
+        print("探测完成！")
+        
+        return {
+            "memory_total": probe.get("memory_total", 0),
+            "memory_available": probe.get("memory_available", 0),
+            "cpu_info": probe["cpu_info"],
+            "gpus": [{k: gpu[k] for k in ("index", "name", "memory_total", "driver_version")}
+                     for gpu in probe["gpus"]],
+            "hostname": probe["hostname"],
+            "os": probe["os"],
+            "os_version": probe["os_version"]
         }
         
-        # 获取GPU信息
-        print("正在获取GPU信息...")
-        stdin, stdout, stderr = ssh.exec_command("nvidia-smi --query-gpu=index,name,memory.total,driver_version --format=csv,noheader")
-        gpu_output = stdout.read().decode("utf-8")
-        gpu_error = stderr.read().decode("utf-8")
-        
-        if gpu_error:
-            print(f"获取GPU信息时出错: {gpu_error}")
-        
-        # 解析GPU信息
-        gpus = []
-        for line in gpu_output.strip().split("\n"):
-            if not line.strip():
-                continue
-                
-            parts = line.split(", ")
-            if len(parts) >= 3:
-                index = parts[0].strip()
-                name = parts[1].strip()
-                memory = parts[2].strip()
-                driver_version = parts[3].strip() if len(parts) > 3 else "Unknown"
-                
-                # 提取内存大小（去除MiB或MB后缀）
-                memory_match = re.search(r'(\d+)', memory)
-                memory_total = int(memory_match.group(1)) if memory_match else 0
-                
-                # 创建GPU信息
-                gpu = {
-                    "index": index,
-                    "name": name,
-                    "memory_total": memory_total,
-                    "driver_version": driver_version
-                }
-                gpus.append(gpu)
-        
-        system_info["gpus"] = gpus
-        
-        # 获取主机名和操作系统信息
-        stdin, stdout, stderr = ssh.exec_command("hostname")
-        hostname = stdout.read().decode("utf-8").strip()
-        system_info["hostname"] = hostname
-        
-        stdin, stdout, stderr = ssh.exec_command("uname -a")
-        os_info = stdout.read().decode("utf-8").strip()
-        system_info["os"] = os_info.split()[0]
-        system_info["os_version"] = " ".join(os_info.split()[2:])
-        
-        return system_info
-        
     except Exception as e:
         print(f"获取系统信息时出错: {e}")
         return None
-    finally:
-        ssh.close()
 
 def update_cluster_node(cluster_id, node_id, system_info, center_controller_url):
     """更新集群节点信息"""
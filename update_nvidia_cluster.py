@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import requests
 import json
+import os
 import sys
-import paramiko
-import time
+
+# 复用 backend 中的SSH连接池和节点探测脚本
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from ssh_pool import probe_node
 
 def main():
     # 集群ID
@@ -27,32 +30,21 @@ def main():
     cluster_info = response.json()["data"]
     print(f"集群信息: {json.dumps(cluster_info, indent=2, ensure_ascii=False)}")
     
-    # 连接到远程服务器
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     try:
-        ssh.connect(hostname, port, username, password)
-        print(f"成功连接到远程服务器 {hostname}")
-        
-        # 获取NVIDIA GPU信息
-        stdin, stdout, stderr = ssh.exec_command("nvidia-smi --query-gpu=index,name,memory.total,utilization.gpu --format=csv,noheader")
-        gpu_info_lines = stdout.read().decode().strip().split("\n")
+        # 一次SSH往返获取节点的系统和GPU信息
+        probe = probe_node(hostname, port, username, password, local=False)
+        print(f"成功探测远程服务器 {hostname}")
         
         # 解析GPU信息
-        gpus = []
-        for line in gpu_info_lines:
-            parts = line.split(", ")
-            if len(parts) >= 3:
-                index = parts[0].strip()
-                name = parts[1].strip()
-                memory = parts[2].strip().replace(" MiB", "")
-                gpu = {
-                    "id": f"gpu-{index}",
-                    "name": name,
-                    "memory": int(memory),
-                    "status": "available"
-                }
-                gpus.append(gpu)
+        gpus = [
+            {
+                "id": f"gpu-{gpu['index']}",
+                "name": gpu["name"],
+                "memory": gpu["memory_total"],
+                "status": "available"
+            }
+            for gpu in probe["gpus"]
+        ]
         
         print(f"发现 {len(gpus)} 个NVIDIA GPU: {json.dumps(gpus, indent=2, ensure_ascii=False)}")
         
@@ -78,8 +70,6 @@ def main():
         
     except Exception as e:
         print(f"操作失败: {str(e)}")
-    finally:
-        ssh.close()
 
 if __name__ == "__main__":
     main()